@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for the YouTube Shorts pipeline.
+
+Generates synthetic source videos with ffmpeg test sources and matching
+transcripts in the captions.txt.json shape, replaces the YouTube and Ollama
+backends with local stand-ins, scores keywords with an offline trend backend
+(a replay fixture of the topic words by default, or the synthetic scorer),
+runs the full pipeline for every (length, resolution) case and reports
+per-stage throughput. Source sections are cut by ffmpeg from a local HTTP
+server with range support, as they would be from YouTube; --source-download
+full copies the whole fixture instead. Clips are cut with keyframe-aware
+stream copy, or with moviepy under --cutter moviepy. Results are written as
+JSON to benchmarks/results/ so runs, trend backends, download modes and
+cutters can be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--compare results/old.json]
+    python benchmarks/run_benchmarks.py --trend-backend synthetic --source-download full
+    python benchmarks/run_benchmarks.py --quick --cutter moviepy --output moviepy.json
+    python benchmarks/run_benchmarks.py --quick --compare moviepy.json
+    python benchmarks/run_benchmarks.py --check-formats
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import socket
+import argparse
+import platform
+import threading
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'core'))
+
+import cv2
+
+import pipeline
+import title_generation
+import trend_analyzer
+from trend_backends import make_trend_backend, record_replay, DEFAULT_REGIONS, DEFAULT_TIMEFRAMES
+from trend_fetcher import DEFAULT_ANCHOR
+from clip_cutter import CUTTER_BACKENDS
+from source_format import select_source_format
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, '.fixtures')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+WORK_DIR = os.path.join(BENCH_DIR, '.work')
+TREND_REPLAY_FIXTURE = os.path.join(FIXTURES_DIR, 'trend_replay.jsonl')
+FORMAT_FIXTURES = os.path.join(BENCH_DIR, 'format_fixtures.json')
+
+DEFAULT_LENGTHS = [60, 300]
+DEFAULT_RESOLUTIONS = ['640x360', '1280x720', '1920x1080']
+QUICK_LENGTHS = [30]
+QUICK_RESOLUTIONS = ['640x360']
+
+# Words that the synthetic transcript repeats so the keyword stages have something to find
+TOPIC_WORDS = [
+    'python', 'football', 'election', 'bitcoin', 'guitar', 'galaxy', 'recipe',
+    'vaccine', 'startup', 'wildlife', 'marathon', 'satellite', 'festival', 'robotics'
+]
+FILLER_WORDS = [
+    'so', 'today', 'we', 'are', 'going', 'to', 'talk', 'about', 'the', 'really',
+    'interesting', 'part', 'of', 'this', 'story', 'and', 'what', 'happens', 'next'
+]
+
+def generate_video(path, seconds, resolution, fps=25):
+    """Render a synthetic H.264/AAC source with ffmpeg's testsrc2 and a sine tone"""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cmd = [
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate={fps}',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(fps * 2), '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', path
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+def generate_transcript(seconds, seed=0, entry_seconds=3.0):
+    """Build a deterministic transcript whose topic words follow a skewed distribution"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(TOPIC_WORDS))]
+    transcript = []
+    start = 0.0
+    while start < seconds - entry_seconds:
+        words = rng.choices(FILLER_WORDS, k=6)
+        if rng.random() < 0.6:
+            words.insert(rng.randrange(len(words)), rng.choices(TOPIC_WORDS, weights=weights)[0])
+        transcript.append({'text': ' '.join(words), 'start': round(start, 3), 'duration': entry_seconds})
+        start += entry_seconds
+    return transcript
+
+def make_bench_trend_backend(name):
+    """Offline trend backend; the replay fixture scores topic words by their transcript weight"""
+    if name == 'replay':
+        scores = {word: round(100.0 / (rank + 1), 2) for rank, word in enumerate(TOPIC_WORDS)}
+        if DEFAULT_ANCHOR:
+            scores[DEFAULT_ANCHOR] = 50.0
+        record_replay([(region, timeframe, scores) for region in DEFAULT_REGIONS for timeframe in DEFAULT_TIMEFRAMES],
+                      TREND_REPLAY_FIXTURE)
+        return make_trend_backend('replay', path=TREND_REPLAY_FIXTURE)
+    return make_trend_backend(name)
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that honours single byte-range requests and counts bytes sent"""
+
+    bytes_sent = 0
+
+    def setup(self):
+        super().setup()
+        # A small send buffer keeps bytes_sent close to what the client actually read
+        # before closing a connection it no longer needs
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        range_header = self.headers.get('Range', '')
+        path = self.translate_path(self.path)
+        if not range_header.startswith('bytes=') or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first, _, last = range_header[len('bytes='):].split(',')[0].partition('-')
+        start = int(first) if first else max(0, size - int(last))
+        end = min(int(last), size - 1) if first and last else size - 1
+        if start >= size:
+            self.send_error(416, 'Requested Range Not Satisfiable')
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, '_remaining', None)
+        while remaining is None or remaining > 0:
+            chunk = source.read(65536 if remaining is None else min(65536, remaining))
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                break
+            RangeRequestHandler.bytes_sent += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+@contextmanager
+def serve_fixtures():
+    """Serve FIXTURES_DIR over HTTP on a free local port; yields the base URL"""
+    handler = lambda *args, **kwargs: RangeRequestHandler(*args, directory=FIXTURES_DIR, **kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def local_llm_metadata(caption, trending_words, frequent_names, word):
+    """Stand-in for Ollama that returns deterministic metadata"""
+    return {
+        'title': f"{word.title()} in 15 seconds",
+        'description': caption[:120],
+        'tags': [word] + list(trending_words)[:4]
+    }
+
+@contextmanager
+def offline_backends(transcript, source_path, source_url):
+    """Swap network-bound stage functions for local fixtures while benchmarking"""
+    originals = {
+        'download_captions': pipeline.download_captions,
+        'download_youtube_video': pipeline.download_youtube_video,
+        'download_video_sections': pipeline.download_video_sections,
+        'generate_youtube_metadata': title_generation.generate_youtube_metadata,
+    }
+
+    def fixture_captions(video_url, output_file=None, languages=['en']):
+        if output_file:
+            pipeline.save_transcript(transcript, output_file)
+        return transcript
+
+    def fixture_download(url, output_dir='.', on_progress=None):
+        target = os.path.join(output_dir, 'source_video.mp4')
+        shutil.copy(source_path, target)
+        return target
+
+    def fixture_sections(url, timestamps, output_dir='.', **kwargs):
+        return originals['download_video_sections'](source_url, timestamps, output_dir, **kwargs)
+
+    pipeline.download_captions = fixture_captions
+    pipeline.download_youtube_video = fixture_download
+    pipeline.download_video_sections = fixture_sections
+    title_generation.generate_youtube_metadata = local_llm_metadata
+    try:
+        yield
+    finally:
+        pipeline.download_captions = originals['download_captions']
+        pipeline.download_youtube_video = originals['download_youtube_video']
+        pipeline.download_video_sections = originals['download_video_sections']
+        title_generation.generate_youtube_metadata = originals['generate_youtube_metadata']
+
+def count_frames(clips_dir):
+    total = 0
+    for name in os.listdir(clips_dir):
+        if name.endswith('.mp4'):
+            cap = cv2.VideoCapture(os.path.join(clips_dir, name))
+            total += int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+    return total
+
+def run_case(seconds, resolution, top_n, time_range, trend_backend, source_download, cutter, fixtures_url):
+    """Run the full pipeline once for a synthetic source and return its measurements"""
+    source_path = generate_video(os.path.join(FIXTURES_DIR, f'source_{seconds}s_{resolution}.mp4'), seconds, resolution)
+    transcript = generate_transcript(seconds, seed=seconds)
+    output_dir = os.path.join(WORK_DIR, f'{seconds}s_{resolution}')
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    source_url = f"{fixtures_url}/{os.path.basename(source_path)}"
+    with offline_backends(transcript, source_path, source_url):
+        bench_pipeline = pipeline.Pipeline(output_dir, trend_backend=trend_backend, source_download=source_download,
+                                           clip_cutter=cutter)
+        bytes_before = RangeRequestHandler.bytes_sent
+        wall_start = time.perf_counter()
+        results = bench_pipeline.run('bench', top_n=top_n, time_range=time_range, generate_titles=True)
+        wall = time.perf_counter() - wall_start
+    source_bytes = RangeRequestHandler.bytes_sent - bytes_before if source_download == 'sections' \
+        else os.path.getsize(source_path)
+
+    summary = results['metrics']['summary']
+    clips = len([name for name in os.listdir(results['clips_dir']) if name.endswith('.mp4')])
+    frames = count_frames(results['clips_dir'])
+
+    def stage_seconds(name):
+        return summary.get(name, {}).get('wall_seconds', 0.0)
+
+    render_seconds = stage_seconds('trim') + stage_seconds('reframe') + stage_seconds('caption_overlay')
+    return {
+        'source_seconds': seconds,
+        'resolution': resolution,
+        'clips': clips,
+        'frames': frames,
+        'trend_backend': trend_backend.name,
+        'source_download': results['stages']['source']['mode'],
+        'cutter': bench_pipeline.clip_cutter,
+        'source_bytes': source_bytes,
+        'source_file_bytes': os.path.getsize(source_path),
+        'keywords': results['keywords']['Item'].head(top_n).tolist(),
+        'wall_seconds': round(wall, 3),
+        'clips_per_minute': round(clips / (wall / 60), 3) if wall else None,
+        'render_clips_per_minute': round(clips / (render_seconds / 60), 3) if render_seconds else None,
+        'trim_seconds_per_clip': round(stage_seconds('trim') / clips, 3) if clips else None,
+        'reframe_seconds_per_clip': round(stage_seconds('reframe') / clips, 3) if clips else None,
+        'caption_frames_per_second': round(frames / stage_seconds('caption_overlay'), 2) if stage_seconds('caption_overlay') else None,
+        'trends_seconds': round(stage_seconds('trends'), 3),
+        'download_seconds': round(stage_seconds('download'), 3),
+        'stages': summary
+    }
+
+def compare(current, previous_path):
+    """Print the relative change of the headline numbers against an earlier results file"""
+    with open(previous_path, 'r') as f:
+        previous = {(case['source_seconds'], case['resolution']): case for case in json.load(f)['cases']}
+    keys = ['wall_seconds', 'clips_per_minute', 'trim_seconds_per_clip', 'reframe_seconds_per_clip',
+            'caption_frames_per_second',
+            'trends_seconds', 'download_seconds', 'source_bytes']
+    print(f"\nComparison against {previous_path}:")
+    for case in current['cases']:
+        old = previous.get((case['source_seconds'], case['resolution']))
+        if not old:
+            continue
+        changes = []
+        for key in keys:
+            if case.get(key) and old.get(key):
+                changes.append(f"{key} {100 * (case[key] - old[key]) / old[key]:+.1f}%")
+        print(f"  {case['source_seconds']}s {case['resolution']}: " + ', '.join(changes))
+
+def check_formats(path=FORMAT_FIXTURES):
+    """
+    Check select_source_format against the expected format ids in the fixtures.
+
+    Each fixture lists 'expected_formats': output width -> '<video id>' or
+    '<video id>+<audio id>'.
+
+    Returns:
+        int: Number of mismatches
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        infos = json.load(f)
+    mismatches = 0
+    for info in infos:
+        for width, expected in info.get('expected_formats', {}).items():
+            video, audio = select_source_format(info['formats'], int(width))
+            chosen = '+'.join(fmt['format_id'] for fmt in (video, audio) if fmt)
+            if chosen != expected:
+                mismatches += 1
+                print(f"  {info['id']} @ {width}px: expected {expected}, got {chosen or 'nothing'}")
+    checked = sum(len(info.get('expected_formats', {})) for info in infos)
+    print(f"Source format selection: {checked - mismatches}/{checked} expected choices match")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline pipeline benchmark')
+    parser.add_argument('--lengths', type=int, nargs='+', help='Source lengths in seconds')
+    parser.add_argument('--resolutions', nargs='+', help='Source resolutions, e.g. 1280x720')
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--time-range', type=int, default=15)
+    parser.add_argument('--quick', action='store_true', help='Single short low-resolution case')
+    parser.add_argument('--trend-backend', choices=['replay', 'synthetic'], default='replay',
+                        help='Offline trend backend that scores keywords')
+    parser.add_argument('--source-download', choices=list(pipeline.SOURCE_DOWNLOAD_MODES), default='sections',
+                        help='Fetch only the clip windows from the fixture server, or copy the whole source')
+    parser.add_argument('--cutter', choices=list(CUTTER_BACKENDS), default='copy',
+                        help='Cut clips with keyframe-aware stream copy or re-encode them with moviepy')
+    parser.add_argument('--check-formats', action='store_true',
+                        help='Only check the source format selection against format_fixtures.json')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--output', help='Where to write the results JSON')
+    args = parser.parse_args()
+    if args.check_formats:
+        sys.exit(1 if check_formats() else 0)
+    trend_analyzer.enable_parallel_tagging()
+
+    lengths = args.lengths or (QUICK_LENGTHS if args.quick else DEFAULT_LENGTHS)
+    resolutions = args.resolutions or (QUICK_RESOLUTIONS if args.quick else DEFAULT_RESOLUTIONS)
+
+    trend_backend = make_bench_trend_backend(args.trend_backend)
+    cases = []
+    with serve_fixtures() as fixtures_url:
+        for seconds in lengths:
+            for resolution in resolutions:
+                print(f"\n=== {seconds}s @ {resolution} ===")
+                case = run_case(seconds, resolution, args.top_n, args.time_range, trend_backend,
+                                args.source_download, args.cutter, fixtures_url)
+                cases.append(case)
+                print(f"{case['clips']} clips in {case['wall_seconds']}s "
+                      f"({case['clips_per_minute']} clips/min, "
+                      f"{case['trim_seconds_per_clip']} s/trim ({case['cutter']}), "
+                      f"{case['reframe_seconds_per_clip']} s/reframe, "
+                      f"{case['caption_frames_per_second']} caption fps, "
+                      f"{case['source_bytes'] / 1e6:.1f} of {case['source_file_bytes'] / 1e6:.1f} MB source "
+                      f"via {case['source_download']})")
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {'top_n': args.top_n, 'time_range': args.time_range, 'trend_backend': args.trend_backend,
+                       'source_download': args.source_download, 'cutter': args.cutter},
+        'cases': cases
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_path = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved benchmark results to {output_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
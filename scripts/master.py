@@ -1,52 +1,12 @@
 import os
 import sys
-import subprocess
-import pandas as pd
-import glob
 
-def process_all_clips(folder):
-    """
-    Processes all mp4 files in the given folder by applying the scaling and padding filter
-    (scale to 3:4 then pad to 9:16) using ffmpeg. The processed video replaces the original file.
-    """
-    # Define the ffmpeg filter
-    vf_filter = (
-        "scale='if(gt(a,4/3),ih*4/3,iw)':'if(lt(a,4/3),iw*3/4,ih)',"
-        "pad=w=iw:h=iw*16/9:x=0:y=(oh-ih)/2:color=black"
-    )
-    
-    mp4_files = glob.glob(os.path.join(folder, "*.mp4"))
-    if not mp4_files:
-        print("No mp4 files found in the folder to process for reframing.")
-        return
-    
-    for file_path in mp4_files:
-        directory, filename = os.path.split(file_path)
-        name, ext = os.path.splitext(filename)
-        temp_output = os.path.join(directory, f"{name}_temp{ext}")
-        
-        cmd = [
-            "ffmpeg",
-            "-i", file_path,
-            "-vf", vf_filter,
-            "-c:a", "copy",
-            temp_output
-        ]
-        
-        print(f"Reframing {file_path}...")
-        try:
-            subprocess.run(cmd, capture_output=True, text=True, check=True)
-            # Replace the original file with the reframed video.
-            os.replace(temp_output, file_path)
-            print(f"Replaced original clip with meme-style video: {file_path}")
-        except subprocess.CalledProcessError as e:
-            print("An error occurred during reframing:")
-            print("Return code:", e.returncode)
-            print("Standard Output:", e.stdout)
-            print("Error Output:", e.stderr)
-        except Exception as e:
-            print(f"Error replacing file {file_path}: {str(e)}")
-            
+# Add the src/core directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'core'))
+
+from pipeline import Pipeline, PipelineError, cache_from_env
+from trend_cache import trend_cache_from_env
+from trend_analyzer import enable_parallel_tagging
 
 def main():
     print("=" * 50)
@@ -81,107 +41,30 @@ def main():
         os.makedirs(output_dir)
     
     caption_output = os.path.join(output_dir, "captions.txt")
-    
-    # Step 1: Run caption_extractor.py
-    print("\n📝 Step 1: Extracting captions...")
-    try:
-        subprocess.run([sys.executable, "model/caption_extractor.py", youtube_url, caption_output], check=True)
-        print("✅ Caption extraction complete")
-    except subprocess.CalledProcessError:
-        print("❌ Caption extraction failed. Exiting.")
-        return
-    
-    # Check if custom_stop_words.txt exists, if not create it
-    custom_stop_words_path = os.path.join(output_dir, "custom_stop_words.txt")
-    if not os.path.exists(custom_stop_words_path):
-        with open(custom_stop_words_path, 'w') as f:
-            default_stop_words = [
-                "the", "and", "a", "to", "of", "in", "is", "it", "that", "you", 
-                "for", "on", "with", "as", "are", "be", "this", "was", "have", "by",
-                "um", "uh", "ah", "oh", "mm", "hmm", "gonna", "wanna", "like", "just"
-            ]
-            f.write("\n".join(default_stop_words))
-        print("📄 Created default custom stop words file")
-    
-    # Step 2: Run trend_analyzer.py
-    print("\n📊 Step 2: Analyzing keyword trends...")
-    json_path = os.path.join(output_dir, "captions.txt.json")  
+    json_path = os.path.join(output_dir, "captions.txt.json")
     output_csv = os.path.join(output_dir, "keywords.csv")
-    try:
-        subprocess.run([
-            sys.executable, 
-            "model/trend_analyzer.py",
-            json_path,
-            custom_stop_words_path,
-            output_csv
-        ], check=True)
-        print("✅ Trend analysis complete")
-    except subprocess.CalledProcessError:
-        print("❌ Trend analysis failed. Exiting.")
-        return
-    
-    # Display top keywords from output.csv
-    try:
-        df = pd.read_csv(output_csv)
-        top_keywords = df.nlargest(top_n, 'Value')
-        print("\nTop keywords found:")
-        for i, (_, row) in enumerate(top_keywords.iterrows(), 1):
-            print(f"{i}. {row['Item']} (score: {row['Value']:.2f})")
-    except Exception as e:
-        print(f"Could not read keyword results: {str(e)}")
-    
-    # Step 3: Run timestamp.py with all parameters
     clips_dir = os.path.join(output_dir, "clips")
-    print(f"\n🎬 Step 3: Processing video segments...")
-    try:
-        subprocess.run([
-            sys.executable, 
-            "model/timestamp.py",
-            youtube_url,
-            str(time_range),
-            clips_dir,
-            output_csv,
-            json_path,
-            str(top_n)
-        ], check=True)
-        print("✅ Video processing complete")
-    except subprocess.CalledProcessError:
-        print("❌ Video processing failed. Exiting.")
-        return
-    
-    # Step 4: Reframe all clips to meme-style (overwrite original files)
-    print(f"\n🔄 Step 4: Reframing video clips to meme-style...")
-    process_all_clips(clips_dir)
-    
-    # Step 5: Add captions to all reframed clips (new step)
-    print(f"\n📑 Step 5: Adding captions to video clips...")
-    try:
-        subprocess.run([sys.executable, "model/captions.py"], check=True)
-        print("✅ Captioning complete")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Captioning failed: {e}")
-    except Exception as e:
-        print(f"❌ Captioning failed with error: {str(e)}")
-    
-    # Step 6: Generate titles and metadata for clips (now step 6 instead of 5)
-    print(f"\n📝 Step 6: Generating titles and metadata for clips...")
     adjusted_timestamps_csv = os.path.join(output_dir, "adjusted_timestamps.csv")
     metadata_dir = os.path.join(output_dir, "metadata")
     
+    # Run every stage in this process; intermediate data stays in memory
+    pipeline = Pipeline(
+        output_dir,
+        stop_words_path=os.path.join(output_dir, "custom_stop_words.txt"),
+        cache=cache_from_env(),
+        trend_cache=trend_cache_from_env()
+    )
     try:
-        subprocess.run([
-            sys.executable,
-            "model/title_generation.py",
-            adjusted_timestamps_csv,
-            json_path,
-            output_csv,
-            metadata_dir
-        ], check=True)
-        print("✅ Title generation complete")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Title generation failed: {e}")
-    except Exception as e:
-        print(f"❌ Title generation failed with error: {str(e)}")
+        results = pipeline.run(youtube_url, top_n=top_n, time_range=time_range)
+    except PipelineError as e:
+        print(f"❌ {e}. Exiting.")
+        return
+    
+    # Display top keywords
+    top_keywords = results['keywords'].nlargest(top_n, 'Value')
+    print("\nTop keywords found:")
+    for i, (_, row) in enumerate(top_keywords.iterrows(), 1):
+        print(f"{i}. {row['Item']} (score: {row['Value']:.2f})")
     
     print("\n" + "=" * 50)
     print("✅ Process completed successfully!")
@@ -195,4 +78,5 @@ def main():
     print(f"- Metadata: {metadata_dir}")
 
 if __name__ == "__main__":
+    enable_parallel_tagging()
     main()
\ No newline at end of file
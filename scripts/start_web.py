@@ -19,25 +19,21 @@ def check_python_version():
     return True
 
 def check_dependencies():
-    """Check if required Python packages are installed"""
-    required_packages = [
-        'flask', 'flask_cors', 'moviepy', 'numpy', 'opencv_python',
-        'pandas', 'PIL', 'pymongo', 'pytrends', 'spacy',
-        'youtube_transcript_api', 'yt_dlp'
-    ]
+    """Check if required Python packages are installed, without importing them"""
+    # Package name -> importable module name
+    required_packages = {
+        'flask': 'flask', 'flask_cors': 'flask_cors', 'moviepy': 'moviepy', 'numpy': 'numpy',
+        'opencv_python': 'cv2', 'pandas': 'pandas', 'PIL': 'PIL', 'pymongo': 'pymongo',
+        'pytrends': 'pytrends', 'spacy': 'spacy',
+        'youtube_transcript_api': 'youtube_transcript_api', 'yt_dlp': 'yt_dlp'
+    }
     
     missing_packages = []
     
-    for package in required_packages:
-        try:
-            if package == 'PIL':
-                import PIL
-            elif package == 'opencv_python':
-                import cv2
-            else:
-                importlib.import_module(package)
+    for package, module in required_packages.items():
+        if importlib.util.find_spec(module) is not None:
             print(f"✅ {package}")
-        except ImportError:
+        else:
             print(f"❌ {package} - Missing")
             missing_packages.append(package)
     
@@ -49,16 +45,13 @@ def check_dependencies():
     return True
 
 def check_spacy_model():
-    """Check if spaCy English model is installed"""
-    try:
-        import spacy
-        nlp = spacy.load("en_core_web_sm")
+    """Check if spaCy English model is installed (the model is loaded later by the workers)"""
+    if importlib.util.find_spec("en_core_web_sm") is not None:
         print("✅ spaCy English model")
         return True
-    except OSError:
-        print("❌ spaCy English model not found")
-        print("Please install with: python -m spacy download en_core_web_sm")
-        return False
+    print("❌ spaCy English model not found")
+    print("Please install with: python -m spacy download en_core_web_sm")
+    return False
 
 def check_ffmpeg():
     """Check if FFmpeg is available"""
@@ -2,6 +2,7 @@ import os
 import subprocess
 import sys
 import glob
+from tracing import run_command
 
 # Define the folder containing the clips.
 clips_folder = os.path.join(".", ".output", "clips")
@@ -33,7 +34,7 @@ def process_and_replace(file_path):
     
     print(f"Processing {file_path}...")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = run_command(cmd, name='ffmpeg reframe', capture_output=True, text=True, check=True)
         print(f"Processed video saved temporarily to: {temp_output}")
     except subprocess.CalledProcessError as e:
         print("An error occurred during processing:")
@@ -51,21 +52,24 @@ def process_and_replace(file_path):
         return False
     return True
 
-def process_all_clips(folder):
+def process_all_clips(folder, on_progress=None):
     """
     Processes all mp4 files in the given folder.
+    Calls on_progress(files_done, files_total) after each file when given.
     """
     mp4_files = glob.glob(os.path.join(folder, "*.mp4"))
     if not mp4_files:
         print("No mp4 files found in the folder.")
         return
     
-    for mp4_file in mp4_files:
+    for i, mp4_file in enumerate(mp4_files, 1):
         success = process_and_replace(mp4_file)
         if not success:
             print(f"Failed processing: {mp4_file}")
         else:
             print(f"Successfully processed: {mp4_file}")
+        if on_progress:
+            on_progress(i, len(mp4_files))
 
 if __name__ == '__main__':
     process_all_clips(clips_folder)
@@ -0,0 +1,197 @@
+"""
+Content-addressed on-disk cache for per-video pipeline artifacts.
+
+Entries live under <root>/<video_id>/<kind>-<fingerprint>/ where the
+fingerprint is a hash of the stage parameters that produced the artifact.
+Reading an entry refreshes its modification time, and the cache evicts the
+least recently used entries once its total size exceeds max_bytes.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+# Project root is 2 levels up from src/core/
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "artifacts"
+)
+
+def fingerprint(params):
+    """Stable short hash of a JSON-serialisable parameter dictionary"""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def file_fingerprint(path):
+    """Hash of a file's contents, or None if it does not exist"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class ArtifactCache:
+    """
+    Cache of transcripts, keyword tables and source media keyed by video ID.
+
+    Args:
+        root (str): Cache directory
+        max_bytes (int): Size limit enforced with LRU eviction after every write
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pinned = {}
+        os.makedirs(root, exist_ok=True)
+
+    def entry_dir(self, video_id, kind, params):
+        return os.path.join(self.root, video_id, f"{kind}-{fingerprint(params)}")
+
+    def get(self, video_id, kind, params, filename, max_age=None):
+        """
+        Look up a cached file.
+
+        Args:
+            video_id (str): YouTube video ID
+            kind (str): Artifact kind, e.g. 'transcript', 'keywords' or 'source'
+            params (dict): Stage parameters the artifact depends on
+            filename (str): File name inside the entry
+            max_age (float, optional): Treat entries older than this many seconds as missing
+
+        Returns:
+            str: Path of the cached file, or None on a miss
+        """
+        entry = self.entry_dir(video_id, kind, params)
+        path = os.path.join(entry, filename)
+        if not os.path.exists(path):
+            return None
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            return None
+        # Entry directory mtime tracks last access for LRU eviction
+        try:
+            os.utime(entry)
+        except OSError:
+            return None
+        return path
+
+    def put(self, video_id, kind, params, src_path, filename=None, move=False):
+        """
+        Store src_path in the cache and return the cached path.
+
+        The file is staged in a temporary directory and renamed into place so
+        concurrent jobs never observe a partially written entry. An existing
+        entry that another job has pinned is kept and the new file discarded:
+        the fingerprint is the same, and that job may be reading or linking it.
+        """
+        filename = filename or os.path.basename(src_path)
+        entry = self.entry_dir(video_id, kind, params)
+        staging = os.path.join(self.root, video_id, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        staged_path = os.path.join(staging, filename)
+        if move:
+            shutil.move(src_path, staged_path)
+        else:
+            shutil.copy2(src_path, staged_path)
+
+        with self._lock:
+            if entry in self._pinned and os.path.exists(os.path.join(entry, filename)):
+                shutil.rmtree(staging, ignore_errors=True)
+                return os.path.join(entry, filename)
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.rename(staging, entry)
+        self.evict()
+        return os.path.join(entry, filename)
+
+    def get_json(self, video_id, kind, params, max_age=None):
+        path = self.get(video_id, kind, params, f"{kind}.json", max_age=max_age)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put_json(self, video_id, kind, params, data):
+        staging = os.path.join(self.root, video_id)
+        os.makedirs(staging, exist_ok=True)
+        tmp_path = os.path.join(staging, f".{kind}-{uuid.uuid4().hex}.json")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return self.put(video_id, kind, params, tmp_path, filename=f"{kind}.json", move=True)
+
+    @contextmanager
+    def pin(self, path):
+        """Keep the entry containing path from being evicted while in use"""
+        entry = os.path.dirname(path)
+        with self._lock:
+            self._pinned[entry] = self._pinned.get(entry, 0) + 1
+        try:
+            yield path
+        finally:
+            with self._lock:
+                self._pinned[entry] -= 1
+                if not self._pinned[entry]:
+                    del self._pinned[entry]
+
+    def entries(self):
+        """Return (last_access, size, path) for every complete entry"""
+        result = []
+        for video_id in os.listdir(self.root):
+            video_dir = os.path.join(self.root, video_id)
+            if not os.path.isdir(video_dir):
+                continue
+            for name in os.listdir(video_dir):
+                entry = os.path.join(video_dir, name)
+                if name.startswith('.') or not os.path.isdir(entry):
+                    continue
+                result.append((os.path.getmtime(entry), _dir_size(entry), entry))
+        return result
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry in self._pinned:
+                    continue
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                try:
+                    os.rmdir(os.path.dirname(entry))
+                except OSError:
+                    pass
+
+def cache_from_env():
+    """
+    Build the artifact cache from ARTIFACT_CACHE_DIR / ARTIFACT_CACHE_MAX_BYTES.
+    Setting ARTIFACT_CACHE_DIR to an empty string disables caching.
+    """
+    root = os.environ.get('ARTIFACT_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if not root:
+        return None
+    max_bytes = int(os.environ.get('ARTIFACT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+    return ArtifactCache(root, max_bytes=max_bytes)
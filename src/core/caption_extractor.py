@@ -2,6 +2,8 @@ from youtube_transcript_api._api import YouTubeTranscriptApi
 import json
 import sys
 import re
+from urllib.parse import urlparse, urlencode, quote
+from urllib.request import urlopen
 
 def extract_video_id(url):
     """
@@ -22,7 +24,72 @@ def extract_video_id(url):
     
     return None
 
-def download_captions(video_url, output_file=None, languages=['en']):
+def resolve_video_id(video_url):
+    """
+    Return the video ID for a URL or bare ID, or None if it cannot be determined.
+    """
+    video_id = extract_video_id(video_url)
+    if video_id:
+        return video_id
+    if re.fullmatch(r'[0-9A-Za-z_-]{11}', video_url.strip()):
+        return video_url.strip()
+    return None
+
+class YouTubeTranscriptFetcher:
+    """Fetches transcripts from YouTube with youtube_transcript_api"""
+
+    host = 'www.youtube.com'
+
+    def fetch(self, video_id, languages=['en']):
+        return YouTubeTranscriptApi.get_transcript(video_id, languages=languages)
+
+class HttpTranscriptFetcher:
+    """
+    Fetches transcripts as JSON from GET <base_url>/<video_id>?languages=en,...
+
+    Lets a local fixture server stand in for YouTube in tests and benchmarks.
+
+    Args:
+        base_url (str): Service URL, e.g. http://localhost:8000/transcripts
+        timeout (float): Request timeout in seconds
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.host = urlparse(self.base_url).netloc
+        self.timeout = timeout
+
+    def fetch(self, video_id, languages=['en']):
+        url = f"{self.base_url}/{quote(video_id)}?{urlencode({'languages': ','.join(languages)})}"
+        with urlopen(url, timeout=self.timeout) as response:
+            return json.load(response)
+
+DEFAULT_FETCHER = YouTubeTranscriptFetcher()
+
+def format_transcript(transcript):
+    """
+    Format transcript entries as "[mm:ss] text" lines.
+    """
+    lines = []
+    for entry in transcript:
+        start_time = entry['start']
+        minutes = int(start_time // 60)
+        seconds = int(start_time % 60)
+        lines.append(f"[{minutes:02d}:{seconds:02d}] {entry['text']}\n")
+    return ''.join(lines)
+
+def save_transcript(transcript, output_file):
+    """
+    Save a transcript as formatted text to output_file and as raw JSON to output_file.json.
+    """
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(format_transcript(transcript))
+        
+    # Also save the raw JSON for potential further processing
+    with open(f"{output_file}.json", 'w', encoding='utf-8') as f:
+        json.dump(list(transcript), f, ensure_ascii=False)
+
+def download_captions(video_url, output_file=None, languages=['en'], fetcher=None):
     """
     Download captions from a YouTube video.
     
@@ -30,6 +97,7 @@ def download_captions(video_url, output_file=None, languages=['en']):
         video_url (str): The YouTube video URL or ID
         output_file (str, optional): File to save captions to. If None, prints to console.
         languages (list, optional): List of language codes to try, in order of preference.
+        fetcher (optional): Object with fetch(video_id, languages); defaults to YouTube
     
     Returns:
         list: The transcript as a list of dictionaries.
@@ -42,29 +110,14 @@ def download_captions(video_url, output_file=None, languages=['en']):
         video_id = video_url
     
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=languages)
-        
-        # Format the transcript
-        formatted_transcript = ""
-        for entry in transcript:
-            start_time = entry['start']
-            minutes = int(start_time // 60)
-            seconds = int(start_time % 60)
-            text = entry['text']
-            formatted_transcript += f"[{minutes:02d}:{seconds:02d}] {text}\n"
+        transcript = (fetcher or DEFAULT_FETCHER).fetch(video_id, languages=languages)
         
         # Output the transcript
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(formatted_transcript)
-                
-            # Also save the raw JSON for potential further processing
-            with open(f"{output_file}.json", 'w', encoding='utf-8') as f:
-                json.dump(transcript, f, ensure_ascii=False, indent=2)
-                
+            save_transcript(transcript, output_file)
             print(f"Captions saved to {output_file} and {output_file}.json")
         else:
-            print(formatted_transcript)
+            print(format_transcript(transcript))
             
         return transcript
     
@@ -74,7 +127,10 @@ def download_captions(video_url, output_file=None, languages=['en']):
 
 if __name__ == "__main__":
     # If run from command line
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        from transcript_batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    elif len(sys.argv) > 1:
         video_url = sys.argv[1]
         output_file = sys.argv[2] if len(sys.argv) > 2 else None
         download_captions(video_url, output_file)
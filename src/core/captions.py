@@ -1,43 +1,85 @@
 import os
 import re
+import sys
 import csv
-import json
-import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import shutil
+from transcript_store import load_transcript, STORE_SUFFIX
+from tracing import run_command
 
-def main():
+def load_word_timestamps(timestamps_file):
+    """
+    Load clip windows from an adjusted_timestamps.csv file.
+    Returns a dictionary mapping each clip name (<word>_clip_<n>) to its lower
+    and upper bound. Files without a 'clip' column number clips per word in
+    row order, as the trimmer names them.
+    """
+    word_timestamps = {}
+    clip_counts = {}
+    with open(timestamps_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            clip_counts[row['word']] = clip_counts.get(row['word'], 0) + 1
+            clip_name = row.get('clip') or f"{row['word']}_clip_{clip_counts[row['word']]}"
+            word_timestamps[clip_name] = {
+                'lower_bound': float(row['lower_bound']),
+                'upper_bound': float(row['upper_bound'])
+            }
+    return word_timestamps
+
+def main(workspace=".output"):
+    """
+    Caption the clips of a job workspace using the artifacts written there.
+    
+    Args:
+        workspace (str): Directory containing clips/, adjusted_timestamps.csv and
+            captions.ysgt (or captions.txt.json)
+    """
     # Define paths
-    clips_folder = ".output/clips"
-    timestamps_file = ".output/adjusted_timestamps.csv"
-    captions_file = ".output/captions.txt.json"
+    clips_folder = os.path.join(workspace, "clips")
+    timestamps_file = os.path.join(workspace, "adjusted_timestamps.csv")
+    captions_file = os.path.join(workspace, "captions" + STORE_SUFFIX)
+    if not os.path.exists(captions_file):
+        captions_file = os.path.join(workspace, "captions.txt.json")
 
     # Create output directory if it doesn't exist
     os.makedirs(clips_folder, exist_ok=True)
 
     # Load timestamps
-    word_timestamps = {}
     try:
-        with open(timestamps_file, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                word_timestamps[row['word']] = {
-                    'lower_bound': float(row['lower_bound']),
-                    'upper_bound': float(row['upper_bound'])
-                }
+        word_timestamps = load_word_timestamps(timestamps_file)
     except FileNotFoundError:
         print(f"Error: Timestamps file not found at {timestamps_file}")
         exit(1)
 
     # Load captions
     try:
-        with open(captions_file, 'r', encoding='utf-8') as f:
-            captions_data = json.load(f)
+        captions_data = load_transcript(captions_file)
     except FileNotFoundError:
         print(f"Error: Captions file not found at {captions_file}")
         exit(1)
 
+    return caption_clips(clips_folder, word_timestamps, captions_data)
+
+def caption_clips(clips_folder, word_timestamps, captions_data, on_progress=None):
+    """
+    Burn captions into every <word>_clip_<n>.mp4 in clips_folder.
+    
+    Args:
+        clips_folder (str): Directory containing the reframed clips
+        word_timestamps (dict): Mapping of clip name (<word>_clip_<n>) to
+            {'lower_bound', 'upper_bound'}; a bare word key applies to all of its clips
+        captions_data (list): Transcript entries with 'text', 'start' and 'duration'
+        on_progress (callable, optional): Called as on_progress(done, total) where done
+            counts finished clips plus the fraction of the current clip's frames
+    
+    Returns:
+        int: Number of clips that received captions
+    """
+    # OpenCV is imported here so loading this module does not pay for it
+    import cv2
+
     # Font for subtitles
     font_path = "arial.ttf"  # Change to an existing font path on your system
     font_size = 24  # Increased font size for better visibility
@@ -52,20 +94,33 @@ def main():
     # Define colors for poppy effect - using more vibrant colors
     colors = ["#FF3366", "#33CCFF", "#FFCC00", "#66FF33", "#FF9900"]
 
+    # Report frame progress roughly once per second of video
+    progress_interval = 25
+
     # Process each clip
     processed_count = 0
-    for clip in os.listdir(clips_folder):
+    clip_files = [clip for clip in os.listdir(clips_folder) if clip.endswith('.mp4')]
+    for clip_index, clip in enumerate(clip_files):
+        if on_progress:
+            on_progress(clip_index, len(clip_files))
         if clip.endswith('.mp4'):
             word_match = re.match(r'(\w+)_clip_\d+\.mp4', clip)
             if word_match:
                 word = word_match.group(1)
-                if word in word_timestamps:
-                    lower_bound = word_timestamps[word]['lower_bound']
-                    upper_bound = word_timestamps[word]['upper_bound']
+                # Each clip of a word has its own window
+                window = word_timestamps.get(os.path.splitext(clip)[0]) or word_timestamps.get(word)
+                if window:
+                    lower_bound = window['lower_bound']
+                    upper_bound = window['upper_bound']
 
                     # Extract relevant captions
                     relevant_captions = []
-                    for caption in captions_data:
+                    if hasattr(captions_data, 'window'):
+                        # Memory-mapped store: only look at the entries around the window
+                        candidates = [captions_data[i] for i in captions_data.window(lower_bound, upper_bound)]
+                    else:
+                        candidates = captions_data
+                    for caption in candidates:
                         caption_start = caption['start']
                         caption_end = caption_start + caption['duration']
 
@@ -98,10 +153,12 @@ def main():
                         fps = int(cap.get(cv2.CAP_PROP_FPS))
                         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                        frame_count = max(1, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
                         
                         # Use ffmpeg to extract audio from the original video
                         temp_audio_path = os.path.join(clips_folder, f"temp_audio_{os.path.splitext(clip)[0]}.aac")
-                        os.system(f'ffmpeg -i "{input_video_path}" -vn -acodec copy "{temp_audio_path}" -y')
+                        run_command(['ffmpeg', '-i', input_video_path, '-vn', '-acodec', 'copy', temp_audio_path, '-y'],
+                                    name='ffmpeg extract_audio')
 
                         # Create video writer
                         fourcc = cv2.VideoWriter.fourcc('m', 'p', '4', 'v')
@@ -177,6 +234,8 @@ def main():
 
                             out.write(frame)
                             frame_idx += 1
+                            if on_progress and frame_idx % progress_interval == 0:
+                                on_progress(clip_index + min(1.0, frame_idx / frame_count), len(clip_files))
 
                         # Close video writers and readers
                         cap.release()
@@ -184,7 +243,9 @@ def main():
                         
                         # Combine the video with the audio using ffmpeg
                         final_output_path = input_video_path  # Overwrite the original
-                        os.system(f'ffmpeg -i "{temp_output_path}" -i "{temp_audio_path}" -c:v copy -c:a aac -map 0:v:0 -map 1:a:0 "{final_output_path}" -y')
+                        run_command(['ffmpeg', '-i', temp_output_path, '-i', temp_audio_path, '-c:v', 'copy', '-c:a', 'aac',
+                                     '-map', '0:v:0', '-map', '1:a:0', final_output_path, '-y'],
+                                    name='ffmpeg mux_audio')
                         
                         # Clean up temporary files
                         if os.path.exists(temp_output_path):
@@ -201,7 +262,10 @@ def main():
             else:
                 print(f"Filename format not recognized for {clip}")
     
+    if on_progress:
+        on_progress(len(clip_files), len(clip_files))
     print(f"Caption processing complete. Added captions to {processed_count} clips.")
+    return processed_count
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1] if len(sys.argv) > 1 else ".output")
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Keyframe-aware clip cutting with ffmpeg stream copy.
+
+The moviepy trimmer decodes and re-encodes every frame of every clip, and
+the reframe stage then does it again. This cutter probes the keyframes of
+each source file once and cuts each window [lower, upper] like this:
+
+    lower and upper on keyframes   the whole window is stream copied
+    otherwise                      the whole GOPs inside the window are stream
+                                   copied, the partial GOPs before the first and
+                                   after the last keyframe are re-encoded, and
+                                   the parts are joined with the concat demuxer
+    no whole GOP in the window,    the window is re-encoded with ffmpeg
+    not H.264, or no frame rate
+
+Stream copy cannot stop at a timestamp inside a GOP: with B-frames the next
+GOP's first packets are decoded before the last frames are shown. Copied
+GOPs are therefore cut by frame count, using the probed frame rate, so
+cuts are frame accurate at both ends and captions line up as with moviepy.
+All video parts carry their SPS/PPS in-band, so the joined stream decodes
+even though the re-encoded parts were produced with different encoder
+settings. Audio is re-encoded for the whole window in the final mux, which
+is cheap and keeps it in sync.
+"""
+
+import os
+import re
+import json
+import shutil
+import subprocess
+import numpy as np
+
+from tracing import run_command
+
+# 'copy' cuts with stream copy, 'moviepy' re-encodes every clip through moviepy
+CUTTER_BACKENDS = ('copy', 'moviepy')
+DEFAULT_CUTTER = os.environ.get('CLIP_CUTTER', 'copy')
+# Codecs whose packets can be stream copied next to a libx264 lead-in
+COPY_CODECS = ('h264',)
+# Encoder settings for re-encoded parts; the reframe stage encodes the clip again
+ENCODE_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18']
+
+_STREAM_PATTERN = re.compile(r'Stream #\d+:\d+.*?: Video: (\w+).*')
+_FPS_PATTERN = re.compile(r'([\d.]+) (?:fps|tbr)')
+_DURATION_PATTERN = re.compile(r'Duration: (\d+):(\d+):([\d.]+)')
+_PTS_PATTERN = re.compile(r'pts_time:(-?[\d.]+)')
+
+def normalize_cutter(value):
+    """Validate a cutter backend name; None and '' mean CLIP_CUTTER"""
+    if value is None or value == '':
+        value = DEFAULT_CUTTER
+    name = str(value).strip().lower()
+    if name not in CUTTER_BACKENDS:
+        raise ValueError(f"Unknown clip cutter '{value}'; expected one of: {', '.join(CUTTER_BACKENDS)}")
+    return name
+
+def _frame_rate(value):
+    """'30000/1001' or '25' -> frames per second, or None"""
+    numerator, _, denominator = str(value or '').partition('/')
+    try:
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+def probe_media(path):
+    """
+    Video codec, frame rate and duration of a media file.
+
+    Uses ffprobe when it is installed, otherwise reads ffmpeg's input summary.
+
+    Returns:
+        dict: codec (None when there is no video stream), fps (None if unknown)
+            and duration in seconds (0.0 if unknown)
+    """
+    if shutil.which('ffprobe'):
+        result = run_command(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+             'stream=codec_name,avg_frame_rate,r_frame_rate:format=duration', '-of', 'json', path],
+            name='ffprobe media', capture_output=True, text=True
+        )
+        try:
+            info = json.loads(result.stdout or '{}')
+        except json.JSONDecodeError:
+            info = {}
+        stream = (info.get('streams') or [{}])[0]
+        try:
+            duration = float((info.get('format') or {}).get('duration') or 0)
+        except ValueError:
+            duration = 0.0
+        return {
+            'codec': stream.get('codec_name'),
+            'fps': _frame_rate(stream.get('avg_frame_rate')) or _frame_rate(stream.get('r_frame_rate')),
+            'duration': duration
+        }
+    # Without an output ffmpeg exits non-zero, but prints the input summary first
+    stderr = run_command(['ffmpeg', '-hide_banner', '-i', path], name='ffmpeg probe',
+                         capture_output=True, text=True).stderr
+    stream = _STREAM_PATTERN.search(stderr)
+    fps = _FPS_PATTERN.search(stream.group(0)) if stream else None
+    duration = _DURATION_PATTERN.search(stderr)
+    return {
+        'codec': stream.group(1) if stream else None,
+        'fps': _frame_rate(fps.group(1)) if fps else None,
+        'duration': int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+        if duration else 0.0
+    }
+
+def probe_keyframes(path):
+    """
+    Keyframe times of a media file's first video stream.
+
+    Uses ffprobe's packet flags when ffprobe is installed, otherwise decodes
+    only the keyframes with ffmpeg.
+
+    Returns:
+        ndarray: Sorted keyframe times in seconds
+    """
+    if shutil.which('ffprobe'):
+        packets = run_command(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+             '-of', 'csv=p=0', path],
+            name='ffprobe keyframes', capture_output=True, text=True
+        ).stdout.splitlines()
+        times = [
+            float(pts) for pts, _, flags in (line.partition(',') for line in packets)
+            # 'D' marks packets an edit list discards
+            if 'K' in flags and 'D' not in flags and pts not in ('', 'N/A')
+        ]
+    else:
+        result = run_command(
+            ['ffmpeg', '-hide_banner', '-skip_frame', 'nokey', '-i', path, '-map', '0:v:0',
+             '-vf', 'showinfo', '-f', 'null', '-'],
+            name='ffmpeg keyframes', capture_output=True, text=True
+        )
+        times = [float(pts) for pts in _PTS_PATTERN.findall(result.stderr)]
+    return np.unique(np.array(times, dtype=float))
+
+def _encode_window(source_path, start, duration, output_file):
+    cmd = ['ffmpeg', '-loglevel', 'error', '-y', '-ss', f"{start:.3f}", '-i', source_path, '-t', f"{duration:.3f}",
+           '-map', '0:v:0', '-map', '0:a:0?'] + ENCODE_ARGS + ['-c:a', 'aac', output_file]
+    run_command(cmd, name='ffmpeg trim encode', capture_output=True, text=True, check=True)
+
+def _encode_part(source_path, start, frames, output_file, name):
+    # Without a global header libx264 writes SPS/PPS in-band, like the copied parts
+    run_command(['ffmpeg', '-loglevel', 'error', '-y', '-ss', f"{start:.3f}", '-i', source_path,
+                 '-map', '0:v:0', '-an', '-frames:v', str(frames)] + ENCODE_ARGS +
+                ['-flags', '-global_header', output_file],
+                name=name, capture_output=True, text=True, check=True)
+
+def cut_clip(source_path, lower_bound, upper_bound, output_file, media, keyframes):
+    """
+    Cut [lower_bound, upper_bound] of source_path into output_file.
+
+    Args:
+        source_path (str): Media file to cut from
+        lower_bound, upper_bound (float): Window in the file's time
+        output_file (str): Clip to write (mp4)
+        media (dict): codec and fps of the source, from probe_media
+        keyframes (ndarray): Keyframe times of the source, from probe_keyframes
+
+    Returns:
+        str: 'copy', 'partial' (re-encoded lead-in or tail) or 'encode'
+    """
+    duration = upper_bound - lower_bound
+    fps = media.get('fps')
+    if media.get('codec') not in COPY_CODECS or not fps:
+        _encode_window(source_path, lower_bound, duration, output_file)
+        return 'encode'
+    # A keyframe within half a frame of a bound counts as on it
+    half_frame = 0.5 / fps
+    first = int(np.searchsorted(keyframes, lower_bound - half_frame))
+    last = int(np.searchsorted(keyframes, upper_bound + half_frame, side='right')) - 1
+    if first >= last:
+        _encode_window(source_path, lower_bound, duration, output_file)
+        return 'encode'
+    copy_start, copy_end = float(keyframes[first]), float(keyframes[last])
+    lead_frames = round((copy_start - lower_bound) * fps)
+    copy_frames = round((copy_end - copy_start) * fps)
+    tail_frames = round((upper_bound - copy_end) * fps)
+
+    base = os.path.splitext(output_file)[0]
+    parts = []
+    concat_list = f"{base}.parts.txt"
+    try:
+        if lead_frames > 0:
+            parts.append(f"{base}.lead.mp4")
+            _encode_part(source_path, lower_bound, lead_frames, parts[-1], 'ffmpeg trim lead')
+        parts.append(f"{base}.body.mp4")
+        run_command(['ffmpeg', '-loglevel', 'error', '-y', '-ss', f"{copy_start:.3f}", '-i', source_path,
+                     '-map', '0:v:0', '-an', '-frames:v', str(copy_frames), '-c', 'copy',
+                     '-bsf:v', 'h264_mp4toannexb', parts[-1]],
+                    name='ffmpeg trim copy', capture_output=True, text=True, check=True)
+        if tail_frames > 0:
+            parts.append(f"{base}.tail.mp4")
+            _encode_part(source_path, copy_end, tail_frames, parts[-1], 'ffmpeg trim tail')
+
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            for part in parts:
+                f.write(f"file '{os.path.abspath(part)}'\n")
+        run_command(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list,
+                     '-ss', f"{lower_bound:.3f}", '-t', f"{duration:.3f}", '-i', source_path,
+                     '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy', '-c:a', 'aac', output_file],
+                    name='ffmpeg trim join', capture_output=True, text=True, check=True)
+    finally:
+        for path in parts + [concat_list]:
+            if os.path.exists(path):
+                os.remove(path)
+    return 'copy' if len(parts) == 1 else 'partial'
+
+def cut_clips(source, timestamps_dict, output_dir='.', on_progress=None):
+    """
+    Cut every clip window with stream copy where the keyframes allow it.
+
+    Args:
+        source (str or list): Path to the source video, or the sections
+            returned by download_video_sections
+        timestamps_dict (dict): Dictionary of timestamps for each keyword
+        output_dir (str): Directory to save the clips as <word>_clip_<n>.mp4
+        on_progress (callable, optional): Called as on_progress(clips_done, clips_total)
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    # Imported here: timestamp imports this module for its cutter backends
+    from timestamp import locate_window
+    probes = {}
+    modes = {'copy': 0, 'partial': 0, 'encode': 0}
+    total = sum(len(timestamps) for timestamps in timestamps_dict.values())
+    done = 0
+    try:
+        for word, timestamps in timestamps_dict.items():
+            for i, timestamp in enumerate(timestamps):
+                path, start_time, end_time = locate_window(source, timestamp['lower_bound'], timestamp['upper_bound'])
+                output_file = os.path.join(output_dir, f"{word}_clip_{i + 1}.mp4")
+                # One probe per source file, shared by all its clips
+                if path not in probes:
+                    probes[path] = probe_media(path), probe_keyframes(path)
+                media, keyframes = probes[path]
+                try:
+                    mode = cut_clip(path, start_time, end_time, output_file, media, keyframes)
+                except subprocess.CalledProcessError as e:
+                    print(f"Stream copy cut failed for {output_file}, re-encoding: {e.stderr.strip()}")
+                    _encode_window(path, start_time, end_time - start_time, output_file)
+                    mode = 'encode'
+                modes[mode] += 1
+                print(f"Created {output_file} ({mode})")
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+        print(f"Cut {total} clips: {modes['copy']} stream copied, {modes['partial']} with re-encoded "
+              f"partial GOPs, {modes['encode']} re-encoded")
+        return True
+
+    except Exception as e:
+        print(f"Error creating trimmed videos: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
@@ -0,0 +1,147 @@
+"""
+Local ranking of candidate keywords before any trend query.
+
+Trend requests are budgeted, so which candidates get scored matters. Every
+cleaned word of a transcript is scored here from cheap local signals, and
+only the best top_k are sent to the trend backend:
+
+    frequency    1 + log(count) of the word in this video
+    specificity  IDF against a background document-frequency table built
+                 from other transcripts, so words common to every video weigh
+                 little; without one, IDF across fixed-length segments of this
+                 video, which favours words concentrated in a few moments
+    entities     a boost for keywords that spaCy tagged as part of a named entity
+
+A candidate can stand for several surface forms of one lemma ("runs",
+"running"); its counts cover all of them. The counts come from the
+transcript's WordIndex and are computed with numpy over all candidates at
+once.
+
+Build a background table from transcripts you have already processed:
+    python keyword_ranker.py transcript1.ysgt transcript2.json ... [--output path]
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from transcript_store import build_word_index, load_transcript
+
+# Project root is 2 levels up from src/core/
+DEFAULT_BACKGROUND_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "config", "keyword_background.json"
+)
+# Candidates sent to the trend backend per job
+DEFAULT_TOP_K = 100
+# Segment length used for in-video IDF when there is no background table
+SEGMENT_SECONDS = 60.0
+# Score multiplier for keywords that are part of a named entity
+ENTITY_BOOST = 0.5
+
+_background_cache = {}
+
+def load_background(path=DEFAULT_BACKGROUND_PATH):
+    """Background table {'documents': N, 'df': {word: documents}} or None if path is missing"""
+    if not path or not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _background_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = _background_cache[path] = (mtime, json.load(f))
+    return cached[1]
+
+def build_background(transcripts):
+    """
+    Document frequencies over transcripts, one document per transcript.
+
+    Args:
+        transcripts (iterable): TranscriptStores or lists of entries
+
+    Returns:
+        dict: {'documents': N, 'df': {word: number of transcripts containing it}}
+    """
+    df = {}
+    documents = 0
+    for transcript in transcripts:
+        documents += 1
+        for word in build_word_index(transcript).words():
+            df[word] = df.get(word, 0) + 1
+    return {'documents': documents, 'df': df}
+
+def rank_keywords(transcript, candidates, top_k=DEFAULT_TOP_K, background=None, entities=None,
+                  segment_seconds=SEGMENT_SECONDS):
+    """
+    Score candidate keywords from local signals and keep the best.
+
+    Args:
+        transcript (TranscriptStore or list): Transcript the candidates come from
+        candidates (iterable or dict): Cleaned, normalized candidate words, or
+            keyword -> list of the normalized surface forms it covers
+        top_k (int, optional): Number of candidates to return; None returns all
+        background (dict, optional): Table from build_background / load_background
+        entities (set, optional): Keywords that appeared inside named entities
+        segment_seconds (float): Segment length for in-video IDF
+
+    Returns:
+        list: (keyword, score) pairs, best first; ties are broken alphabetically
+    """
+    if not isinstance(candidates, dict):
+        candidates = {word: [word] for word in candidates}
+    keywords = sorted(candidates)
+    if not keywords:
+        return []
+    index = build_word_index(transcript)
+    words, word_ids = index.occurrence_words()
+    position = {word: i for i, word in enumerate(words)}
+    # Map every surface form to its keyword; other words and missing forms
+    # point at an extra, always-zero bin
+    word_keyword = np.full(len(words) + 1, len(keywords))
+    for k, keyword in enumerate(keywords):
+        for form in candidates[keyword]:
+            if form in position:
+                word_keyword[position[form]] = k
+    occurrence_keyword = word_keyword[word_ids]
+
+    counts = np.bincount(occurrence_keyword, minlength=len(keywords) + 1)[:-1]
+    tf = np.where(counts > 0, 1 + np.log(np.maximum(counts, 1)), 0.0)
+
+    if background and background.get('documents'):
+        documents = background['documents']
+        df = np.array([
+            max((background['df'].get(form, 0) for form in candidates[keyword]), default=0) for keyword in keywords
+        ], dtype=float)
+    else:
+        segment = (index.times // segment_seconds).astype(np.int64) if len(index.times) else np.zeros(0, np.int64)
+        documents = int(segment.max()) + 1 if len(segment) else 1
+        pairs = np.unique(occurrence_keyword * documents + segment)
+        df = np.bincount(pairs // documents, minlength=len(keywords) + 1)[:-1]
+    idf = np.log((1 + documents) / (1 + df)) + 1
+
+    entities = entities or set()
+    boost = 1 + ENTITY_BOOST * np.array([keyword in entities for keyword in keywords], dtype=float)
+
+    scores = tf * idf * boost
+    order = np.lexsort((np.arange(len(keywords)), -scores))
+    if top_k is not None:
+        order = order[:top_k]
+    return [(keywords[i], round(float(scores[i]), 4)) for i in order]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the background document-frequency table for keyword ranking')
+    parser.add_argument('transcripts', nargs='+', help='Transcript files (.ysgt or JSON)')
+    parser.add_argument('--output', default=DEFAULT_BACKGROUND_PATH, help='Where to write the table')
+    args = parser.parse_args(argv)
+
+    background = build_background(load_transcript(path) for path in args.transcripts)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(background, f)
+    print(f"Wrote document frequencies for {len(background['df'])} words "
+          f"from {background['documents']} transcripts to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
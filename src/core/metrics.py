@@ -0,0 +1,202 @@
+"""
+Per-stage resource metrics for pipeline runs.
+
+Each stage records wall time, CPU time, peak RSS and bytes read/written.
+CPU time is the worker thread's own time plus the CPU of child processes
+(ffmpeg) reaped during the stage. RSS is sampled from /proc while the stage
+runs and I/O is read from /proc/self/io, which includes reaped children.
+Child-process and I/O figures are process-wide, so they include overlapping
+work when several jobs run at once.
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RSS_SAMPLE_INTERVAL = 0.05
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def _children_cpu_seconds():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _maxrss_bytes(who):
+    if resource is None:
+        return 0
+    maxrss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def current_rss_bytes():
+    """Resident set size of this process, or 0 if it cannot be read"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def io_counters():
+    """(bytes_read, bytes_written) for this process including reaped children"""
+    counters = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                counters[key] = int(value)
+    except (OSError, ValueError):
+        return 0, 0
+    return counters.get('rchar', 0), counters.get('wchar', 0)
+
+class _RssSampler(threading.Thread):
+    """Background thread tracking the highest RSS seen while a stage runs"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = current_rss_bytes()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss_bytes())
+        return self.peak
+
+class MetricsRegistry:
+    """Process-wide aggregate of stage metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, record):
+        with self._lock:
+            totals = self._stages.setdefault(record['stage'], {
+                'count': 0, 'errors': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'io_read_bytes': 0, 'io_write_bytes': 0, 'peak_rss_bytes': 0, 'last_wall_seconds': 0.0
+            })
+            totals['count'] += 1
+            totals['errors'] += record['status'] != 'ok'
+            totals['wall_seconds'] += record['wall_seconds']
+            totals['cpu_seconds'] += record['cpu_seconds']
+            totals['io_read_bytes'] += record['io_read_bytes']
+            totals['io_write_bytes'] += record['io_write_bytes']
+            totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'], record['peak_rss_bytes'])
+            totals['last_wall_seconds'] = record['wall_seconds']
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: dict(totals) for stage, totals in self._stages.items()}
+
+    def render_prometheus(self, extra_gauges=None):
+        """
+        Render all stage metrics in the Prometheus text exposition format.
+
+        Args:
+            extra_gauges (dict, optional): name -> (help, {label_value_tuple or None: value})
+        """
+        series = [
+            ('ysg_stage_runs_total', 'counter', 'Number of times a stage ran', 'count'),
+            ('ysg_stage_errors_total', 'counter', 'Number of stage runs that raised', 'errors'),
+            ('ysg_stage_wall_seconds_total', 'counter', 'Wall-clock time spent in a stage', 'wall_seconds'),
+            ('ysg_stage_cpu_seconds_total', 'counter', 'CPU time spent in a stage including child processes', 'cpu_seconds'),
+            ('ysg_stage_io_read_bytes_total', 'counter', 'Bytes read while a stage ran', 'io_read_bytes'),
+            ('ysg_stage_io_write_bytes_total', 'counter', 'Bytes written while a stage ran', 'io_write_bytes'),
+            ('ysg_stage_peak_rss_bytes', 'gauge', 'Highest resident set size observed during a stage', 'peak_rss_bytes'),
+            ('ysg_stage_last_wall_seconds', 'gauge', 'Wall-clock time of the most recent run of a stage', 'last_wall_seconds'),
+        ]
+        stages = self.snapshot()
+        lines = []
+        for name, kind, help_text, key in series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage in sorted(stages):
+                lines.append(f'{name}{{stage="{stage}"}} {stages[stage][key]}')
+        for name, (help_text, labelled_values) in (extra_gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in labelled_values.items():
+                label_text = '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}' if labels else ''
+                lines.append(f"{name}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+# Shared by every pipeline in this process
+REGISTRY = MetricsRegistry()
+
+class StageMetrics:
+    """
+    Collects one record per stage run for a single job.
+
+    Args:
+        registry (MetricsRegistry, optional): Aggregate that also receives each record
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.records = []
+
+    @contextmanager
+    def measure(self, stage):
+        sampler = _RssSampler()
+        sampler.start()
+        read_start, write_start = io_counters()
+        children_start = _children_cpu_seconds()
+        thread_start = time.thread_time()
+        started_at = time.time()
+        wall_start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = (time.thread_time() - thread_start) + (_children_cpu_seconds() - children_start)
+            read_end, write_end = io_counters()
+            record = {
+                'stage': stage,
+                'status': status,
+                'started_at': started_at,
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(cpu, 6),
+                'peak_rss_bytes': sampler.stop(),
+                # Lifetime high-water mark of the largest child process (ffmpeg)
+                'children_max_rss_bytes': _maxrss_bytes(resource.RUSAGE_CHILDREN) if resource else 0,
+                'io_read_bytes': read_end - read_start,
+                'io_write_bytes': write_end - write_start
+            }
+            self.records.append(record)
+            if self.registry:
+                self.registry.observe(record)
+
+    def summary(self):
+        """Totals per stage name for this job"""
+        totals = {}
+        for record in self.records:
+            stage = totals.setdefault(record['stage'], {
+                'runs': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'peak_rss_bytes': 0, 'io_read_bytes': 0, 'io_write_bytes': 0
+            })
+            stage['runs'] += 1
+            stage['wall_seconds'] += record['wall_seconds']
+            stage['cpu_seconds'] += record['cpu_seconds']
+            stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], record['peak_rss_bytes'])
+            stage['io_read_bytes'] += record['io_read_bytes']
+            stage['io_write_bytes'] += record['io_write_bytes']
+        return totals
+
+    def to_dict(self):
+        return {'stages': self.records, 'summary': self.summary()}
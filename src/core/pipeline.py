@@ -0,0 +1,656 @@
+"""
+In-process pipeline for YouTube Shorts generation.
+
+Every stage (caption extraction, trend analysis, clip windows, download,
+trimming, reframing, caption overlay and metadata) runs as a plain function
+call inside the current worker, so heavy libraries are imported once and the
+transcript, keyword table and timestamp list are handed from stage to stage
+in memory. The transcript is encoded once into a memory-mapped
+TranscriptStore that every stage reads. Files in the output directory are
+written only as artifacts.
+
+Stages are declared in a fingerprinted StageGraph, so a rerun of the same
+video with a different top_n or time_range recomputes only the invalidated
+stages, and only clips whose window or captions changed are re-rendered.
+"""
+
+import os
+import json
+import shutil
+import pandas as pd
+from contextlib import nullcontext
+
+from caption_extractor import download_captions, resolve_video_id, save_transcript
+from trend_analyzer import analyze_trends, load_nlp, mix_region_scores, TREND_COMPLETE
+from keyword_ranker import DEFAULT_BACKGROUND_PATH, DEFAULT_TOP_K
+from trend_backends import make_trend_backend, parse_regions, parse_timeframes, DEFAULT_REGIONS, DEFAULT_TIMEFRAMES
+from trend_fetcher import DEFAULT_ANCHOR
+from timestamp import compute_adjusted_timestamps, group_timestamps_by_word, download_youtube_video, create_trimmed_videos
+from timestamp import download_video_sections
+from clip_cutter import normalize_cutter
+from source_format import source_format_params
+from adjust_aspect import process_all_clips, vf_filter as REFRAME_FILTER
+from captions import caption_clips
+from title_generation import generate_metadata_for_clips
+from artifact_cache import fingerprint, file_fingerprint, cache_from_env
+from stage_graph import StageGraph
+from metrics import StageMetrics
+from profiling import StageProfiler, normalize_profile_mode, profile_mode_from_env
+from tracing import Tracer, activate
+from transcript_batch import captions_stage_params, TRANSCRIPT_LANGUAGES
+from transcript_store import TranscriptStore, write_transcript_store, STORE_SUFFIX
+
+# Project root is 2 levels up from src/core/
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_STOP_WORDS_PATH = os.path.join(PROJECT_ROOT, "config", "custom_stop_words.txt")
+# Trend scores drift, so cached keyword tables are only reused for a day
+KEYWORDS_MAX_AGE = 24 * 3600
+# Source rendition policy; part of the download fingerprint
+SOURCE_FORMAT = source_format_params()
+# 'sections' downloads only the padded clip windows, 'full' the whole source video
+SOURCE_DOWNLOAD_MODES = ('sections', 'full')
+DEFAULT_SOURCE_DOWNLOAD = os.environ.get('SOURCE_DOWNLOAD', 'sections')
+# Bump when the clip window algorithm changes so cached windows are recomputed
+WINDOW_METHOD = 'density'
+# Likewise for keyword extraction (lemma grouping and local ranking)
+KEYWORD_METHOD = 'lemma-rank'
+DEFAULT_STOP_WORDS = [
+    "the", "and", "a", "to", "of", "in", "is", "it", "that", "you",
+    "for", "on", "with", "as", "are", "be", "this", "was", "have", "by",
+    "um", "uh", "ah", "oh", "mm", "hmm", "gonna", "wanna", "like", "just"
+]
+
+class PipelineError(Exception):
+    """Raised when a required pipeline stage fails."""
+
+def normalize_source_download(value):
+    """Validate a source download mode; None and '' mean SOURCE_DOWNLOAD"""
+    if value is None or value == '':
+        value = DEFAULT_SOURCE_DOWNLOAD
+    mode = str(value).strip().lower()
+    if mode not in SOURCE_DOWNLOAD_MODES:
+        raise ValueError(f"Unknown source download mode '{value}'; expected one of: {', '.join(SOURCE_DOWNLOAD_MODES)}")
+    return mode
+
+def ensure_stop_words_file(path=DEFAULT_STOP_WORDS_PATH):
+    """Create the custom stop words file with defaults if it does not exist"""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write("\n".join(DEFAULT_STOP_WORDS))
+    return path
+
+def write_basic_metadata(clips_dir, metadata_dir):
+    """Write template metadata for every clip when Ollama is not available"""
+    os.makedirs(metadata_dir, exist_ok=True)
+    if not os.path.exists(clips_dir):
+        return {}
+
+    all_metadata = {}
+    for clip_file in os.listdir(clips_dir):
+        if clip_file.endswith('.mp4'):
+            clip_name = clip_file.replace('.mp4', '')
+            metadata = {
+                "title": f"YouTube Short - {clip_name.replace('_', ' ').title()}",
+                "description": f"Generated YouTube Short from {clip_name}",
+                "tags": ["youtube shorts", "generated", clip_name.lower()]
+            }
+
+            metadata_file = os.path.join(metadata_dir, f"{clip_name}_metadata.json")
+            with open(metadata_file, 'w') as f:
+                json.dump(metadata, f, indent=2)
+            all_metadata[clip_name] = metadata
+    return all_metadata
+
+def warm_up():
+    """
+    Import the heavy stage libraries and load the spaCy model once, so the
+    first job in a worker process does not pay for them.
+    """
+    import cv2
+    import yt_dlp
+    import pytrends.request
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    try:
+        load_nlp()
+    except OSError as e:
+        print(f"spaCy model not preloaded: {str(e)}")
+
+def clip_fingerprint(source_fp, entry, transcript, cutter):
+    """
+    Fingerprint of everything that determines a rendered clip: the source,
+    the window, the cutter, the reframe filter and the captions burned into it.
+    """
+    lower_bound = float(entry['lower_bound'])
+    upper_bound = float(entry['upper_bound'])
+    if isinstance(transcript, TranscriptStore):
+        caption_set = [
+            (caption['text'], caption['start'], caption['duration'])
+            for caption in (transcript[i] for i in transcript.window(lower_bound, upper_bound))
+        ]
+    else:
+        caption_set = [
+            (caption['text'], caption['start'], caption['duration'])
+            for caption in transcript
+            if caption['start'] <= upper_bound and caption['start'] + caption['duration'] >= lower_bound
+        ]
+    return fingerprint({
+        'source': source_fp,
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+        'cutter': cutter,
+        'filter': REFRAME_FILTER,
+        'captions': caption_set
+    })
+
+class Pipeline:
+    """
+    Runs the shorts generation stages in-process for one video.
+
+    Args:
+        output_dir (str): Directory that receives clips, metadata and artifacts
+        write_artifacts (bool): Also write captions, keywords and timestamps to disk
+        on_progress (callable, optional): Called as on_progress(step, progress)
+        stop_words_path (str): Path to the custom stop words file
+        cache (ArtifactCache, optional): Reuse transcripts, keyword tables and
+            source media from earlier runs of the same video
+        trend_cache (TrendCache, optional): Per-keyword trend scores shared across videos
+        trend_budget (TrendBudget, optional): Trend requests and seconds allowed per run;
+            defaults to TREND_MAX_REQUESTS / TREND_TIME_BUDGET
+        trend_backend (optional): Backend object or name ('pytrends', 'replay',
+            'synthetic') that scores keywords; defaults to TREND_BACKEND
+        trend_regions (list, optional): Google Trends regions to score keywords in;
+            defaults to TREND_REGIONS
+        trend_timeframes (list, optional): Trends timeframes; defaults to TREND_TIMEFRAMES
+        source_download (str, optional): 'sections' to download only the clip windows
+            of the source, 'full' for the whole video; defaults to SOURCE_DOWNLOAD.
+            A cached full download is always used when there is one.
+        clip_cutter (str, optional): 'copy' to cut clips with keyframe-aware stream
+            copy, 'moviepy' to re-encode them; defaults to CLIP_CUTTER
+        metrics (StageMetrics, optional): Collector for per-stage resource usage
+        profile (str, optional): 'sample' or 'cprofile' to profile every stage into
+            output_dir/profiles; defaults to the YSG_PROFILE environment variable
+    """
+
+    def __init__(self, output_dir, write_artifacts=True, on_progress=None,
+                 stop_words_path=DEFAULT_STOP_WORDS_PATH, cache=None, metrics=None, profile=None,
+                 trend_cache=None, trend_budget=None, trend_backend=None, trend_regions=None,
+                 trend_timeframes=None, source_download=None, clip_cutter=None):
+        self.cache = cache
+        self.trend_cache = trend_cache
+        self.trend_budget = trend_budget
+        if trend_backend is None or isinstance(trend_backend, str):
+            trend_backend = make_trend_backend(trend_backend)
+        self.trend_backend = trend_backend
+        self.trend_regions = parse_regions(trend_regions or DEFAULT_REGIONS)
+        self.trend_timeframes = parse_timeframes(trend_timeframes or DEFAULT_TIMEFRAMES)
+        self.source_download = normalize_source_download(source_download)
+        self.clip_cutter = normalize_cutter(clip_cutter)
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        profile_mode = profile_mode_from_env() if profile is None else normalize_profile_mode(profile)
+        self.profiler = StageProfiler(os.path.join(output_dir, "profiles"), profile_mode) if profile_mode else None
+        self.tracer = Tracer(os.path.basename(os.path.normpath(output_dir)))
+        self.output_dir = output_dir
+        self.write_artifacts = write_artifacts
+        self.on_progress = on_progress
+        self.stop_words_path = stop_words_path
+        self.clips_dir = os.path.join(output_dir, "clips")
+        self.metadata_dir = os.path.join(output_dir, "metadata")
+        self.sections_dir = os.path.join(output_dir, "sections")
+        self._last_step = None
+
+    def artifact_path(self, filename):
+        """Return the artifact path for filename, or None when artifacts are disabled"""
+        if not self.write_artifacts:
+            return None
+        return os.path.join(self.output_dir, filename)
+
+    def report(self, step, progress):
+        """Forward a progress update to the registered callback"""
+        progress = round(progress, 1)
+        if step != self._last_step:
+            print(f"[{progress:5.1f}%] {step}")
+            self._last_step = step
+        if self.on_progress:
+            self.on_progress(step, progress)
+
+    def progress_range(self, step, start, end):
+        """
+        Return a callback(done, total) that maps a stage's own progress onto
+        the [start, end] slice of the overall job progress.
+        """
+        def callback(done, total):
+            fraction = min(1.0, done / total) if total else 1.0
+            self.report(step, start + (end - start) * fraction)
+        return callback
+
+    def run_stage(self, name, func, *args, **kwargs):
+        """Run a single stage function. Central hook for stage-level instrumentation."""
+        profile_guard = self.profiler.profile(name) if self.profiler else nullcontext()
+        with self.metrics.measure(name), profile_guard, self.tracer.span(name, 'stage'):
+            return func(*args, **kwargs)
+
+    def save_metrics(self):
+        """
+        Write the per-stage metrics of this run to metrics.json and the
+        span timeline to trace.json (Chrome trace-event format)
+        """
+        with open(os.path.join(self.output_dir, "metrics.json"), 'w') as f:
+            json.dump(self.metrics.to_dict(), f, indent=2)
+        self.tracer.save(os.path.join(self.output_dir, "trace.json"))
+
+    def _load_json(self, video_id, kind, max_age=None):
+        def load(stage_fp):
+            if not self.cache or not video_id:
+                return None
+            return self.cache.get_json(video_id, kind, {'fingerprint': stage_fp}, max_age=max_age)
+        return load
+
+    def _store_json(self, video_id, kind):
+        def store(stage_fp, result):
+            if self.cache and video_id:
+                self.cache.put_json(video_id, kind, {'fingerprint': stage_fp}, result)
+            return result
+        return store
+
+    def _load_transcript(self, video_id):
+        def load(stage_fp):
+            if not self.cache or not video_id:
+                return None
+            path = self.cache.get(video_id, 'transcript', {'fingerprint': stage_fp}, 'transcript' + STORE_SUFFIX)
+            return TranscriptStore(path) if path else None
+        return load
+
+    def _store_transcript(self, video_id):
+        """
+        Encode the fetched transcript once into the compact store; every later
+        stage reads the memory-mapped copy instead of the list or a JSON file.
+        """
+        def store(stage_fp, transcript):
+            path = os.path.join(self.output_dir, "captions" + STORE_SUFFIX)
+            write_transcript_store(transcript, path)
+            if self.cache and video_id:
+                path = self.cache.put(video_id, 'transcript', {'fingerprint': stage_fp}, path,
+                                      filename='transcript' + STORE_SUFFIX, move=True)
+            return TranscriptStore(path)
+        return store
+
+    def _load_keywords(self, video_id):
+        def load(stage_fp):
+            if not self.cache or not video_id:
+                return None
+            path = self.cache.get(video_id, 'keywords', {'fingerprint': stage_fp}, 'keywords.csv',
+                                  max_age=KEYWORDS_MAX_AGE)
+            return pd.read_csv(path) if path else None
+        return load
+
+    def _store_keywords(self, video_id):
+        """
+        Cache only tables with every trend query answered; a fallback or partial
+        table from an outage or an exhausted budget is recomputed next run.
+        """
+        def store(stage_fp, keywords_df):
+            status = keywords_df.attrs.get('trend_status', TREND_COMPLETE)
+            if status != TREND_COMPLETE:
+                print(f"Keyword table is {status}; not caching it")
+            elif self.cache and video_id and not keywords_df.empty:
+                tmp_csv = os.path.join(self.output_dir, ".keywords_cache.csv")
+                keywords_df.to_csv(tmp_csv, index=False)
+                self.cache.put(video_id, 'keywords', {'fingerprint': stage_fp}, tmp_csv,
+                               filename='keywords.csv', move=True)
+            return keywords_df
+        return store
+
+    def _load_source(self, video_id):
+        def load(stage_fp):
+            if not self.cache or not video_id:
+                return None
+            params = {'fingerprint': stage_fp}
+            entry = self.cache.entry_dir(video_id, 'source', params)
+            if not os.path.isdir(entry):
+                return None
+            for name in os.listdir(entry):
+                if name.startswith('source_video.'):
+                    return self.cache.get(video_id, 'source', params, name)
+            return None
+        return load
+
+    def _store_source(self, video_id):
+        def store(stage_fp, source_path):
+            if self.cache and video_id:
+                return self.cache.put(video_id, 'source', {'fingerprint': stage_fp}, source_path, move=True)
+            return source_path
+        return store
+
+    def build_graph(self, youtube_url, video_id, top_n, time_range, region_weights=None):
+        """
+        Declare the data stages and what each depends on. Changing top_n,
+        time_range or region_weights only invalidates 'windows'; the transcript,
+        keyword scores and source download are reused from the cache. 'windows'
+        is keyed on the content of the keyword table, so recomputed trend scores
+        invalidate it too.
+        """
+        graph = StageGraph(run_stage=self.run_stage)
+        video_key = video_id or youtube_url
+
+        graph.add(
+            'captions',
+            lambda: download_captions(youtube_url, self.artifact_path("captions.txt"), languages=TRANSCRIPT_LANGUAGES),
+            # Same key as transcript_batch, so batch-ingested transcripts are reused
+            params=captions_stage_params(video_key, TRANSCRIPT_LANGUAGES),
+            load=self._load_transcript(video_id),
+            store=self._store_transcript(video_id)
+        )
+        graph.add(
+            'trends',
+            lambda captions: analyze_trends(
+                custom_stop_words_path=self.stop_words_path, output_path=None, caption_data=captions,
+                on_progress=self.progress_range('Analyzing keyword trends...', 30, 40),
+                trend_cache=self.trend_cache, budget=self.trend_budget, backend=self.trend_backend,
+                regions=self.trend_regions, timeframes=self.trend_timeframes
+            ),
+            deps=['captions'],
+            params={
+                'stop_words': file_fingerprint(self.stop_words_path),
+                'top_k': DEFAULT_TOP_K,
+                'method': KEYWORD_METHOD,
+                'backend': self.trend_backend.name,
+                'anchor': DEFAULT_ANCHOR,
+                'regions': self.trend_regions,
+                'timeframes': self.trend_timeframes,
+                'background': file_fingerprint(DEFAULT_BACKGROUND_PATH)
+            },
+            load=self._load_keywords(video_id),
+            store=self._store_keywords(video_id),
+            # Trend scores expire, so windows are keyed on the table itself
+            content=lambda keywords_df: keywords_df.to_csv(index=False)
+        )
+        graph.add(
+            'windows',
+            lambda captions, trends: compute_adjusted_timestamps(trends, captions, time_range, top_n, region_weights),
+            deps=['captions', 'trends'],
+            params={'top_n': top_n, 'time_range': time_range, 'region_weights': region_weights, 'method': WINDOW_METHOD},
+            load=self._load_json(video_id, 'windows'),
+            store=self._store_json(video_id, 'windows')
+        )
+        graph.add(
+            'download',
+            lambda: download_youtube_video(
+                youtube_url, self.clips_dir,
+                on_progress=self.progress_range('Downloading source video...', 45, 50)
+            ),
+            params={'video': video_key, 'format': SOURCE_FORMAT},
+            load=self._load_source(video_id),
+            store=self._store_source(video_id)
+        )
+        return graph
+
+    def fetch_source(self, graph, youtube_url, timestamps):
+        """
+        Source media to render the clips from: a cached full download when there
+        is one, otherwise only the padded clip windows in 'sections' mode. Falls
+        back to the full download stage when sections cannot be downloaded.
+        timestamps are the windows still to render, so sections cover only those.
+
+        Returns:
+            str, list or None: Source path, or sections from download_video_sections
+        """
+        if self.source_download == 'sections' and graph.cached('download') is None:
+            sections = self.run_stage(
+                'download', download_video_sections, youtube_url, timestamps, self.sections_dir,
+                on_progress=self.progress_range('Downloading source video...', 45, 50)
+            )
+            if sections:
+                return sections
+            print("Section download failed; downloading the full source video")
+            shutil.rmtree(self.sections_dir, ignore_errors=True)
+        return graph.get('download')
+
+    def _place_clip(self, src, dst):
+        """Expose a finished clip in the clips directory, hard-linking when possible"""
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def reuse_clips(self, source_fp, timestamps, transcript, video_id):
+        """
+        Place every clip whose (source, lower_bound, upper_bound, cutter, filter,
+        caption set) was rendered before, and collect the windows still to render.
+
+        Returns:
+            tuple: (counts of 'reused' and 'rendered' clips, pending) where pending
+                maps word -> [(final_path, clip_fingerprint, entry)]
+        """
+        use_cache = self.cache is not None and video_id is not None
+        counts = {'reused': 0, 'rendered': 0}
+        pending = {}
+
+        for word, entries in group_timestamps_by_word(timestamps).items():
+            for i, entry in enumerate(entries):
+                final_path = os.path.join(self.clips_dir, f"{entry.get('clip') or f'{word}_clip_{i + 1}'}.mp4")
+                clip_fp = clip_fingerprint(source_fp, entry, transcript, self.clip_cutter)
+                cached = self.cache.get(video_id, 'clip', {'fingerprint': clip_fp}, 'clip.mp4') if use_cache else None
+                if cached:
+                    # Pinned so a concurrent job storing the same clip cannot replace it mid-link
+                    with self.cache.pin(cached):
+                        self._place_clip(cached, final_path)
+                    counts['reused'] += 1
+                else:
+                    pending.setdefault(word, []).append((final_path, clip_fp, entry))
+        return counts, pending
+
+    def render_clips(self, source_path, pending, transcript, video_id, counts):
+        """
+        Render the pending windows from reuse_clips and store them in the cache.
+        source_path is the full source video or its downloaded sections.
+
+        Returns:
+            dict: counts, with 'rendered' updated
+        """
+        use_cache = self.cache is not None and video_id is not None
+
+        # Render only the new windows in a staging directory
+        staging_dir = os.path.join(self.clips_dir, '.render')
+        os.makedirs(staging_dir, exist_ok=True)
+        grouped = {word: [entry for _, _, entry in items] for word, items in pending.items()}
+
+        self.report('Processing video segments...', 50)
+        trimmed = self.run_stage(
+            'trim', create_trimmed_videos, source_path, grouped, staging_dir,
+            on_progress=self.progress_range('Processing video segments...', 50, 65), cutter=self.clip_cutter
+        )
+        if not trimmed:
+            raise PipelineError("Video processing failed: could not create clips")
+
+        self.report('Reframing video clips...', 65)
+        self.run_stage(
+            'reframe', process_all_clips, staging_dir,
+            on_progress=self.progress_range('Reframing video clips...', 65, 75)
+        )
+
+        self.report('Adding captions to clips...', 75)
+        # Keyed by the staged clip name, so every clip of a word gets its own captions
+        clip_windows = {
+            f"{word}_clip_{j + 1}": {'lower_bound': float(entry['lower_bound']), 'upper_bound': float(entry['upper_bound'])}
+            for word, entries in grouped.items() for j, entry in enumerate(entries)
+        }
+        captioned = True
+        try:
+            self.run_stage(
+                'caption_overlay', caption_clips, staging_dir, clip_windows, transcript,
+                on_progress=self.progress_range('Adding captions to clips...', 75, 90)
+            )
+        except Exception as e:
+            print(f"Captioning failed: {str(e)}")
+            captioned = False
+
+        for word, items in pending.items():
+            for j, (final_path, clip_fp, _) in enumerate(items):
+                staged_path = os.path.join(staging_dir, f"{word}_clip_{j + 1}.mp4")
+                # Uncaptioned clips must not be cached under the captioned fingerprint
+                if use_cache and captioned:
+                    cached = self.cache.put(video_id, 'clip', {'fingerprint': clip_fp}, staged_path,
+                                            filename='clip.mp4', move=True)
+                    self._place_clip(cached, final_path)
+                else:
+                    os.replace(staged_path, final_path)
+                counts['rendered'] += 1
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return counts
+
+    def run(self, youtube_url, top_n=5, time_range=15, generate_titles=True, region_weights=None):
+        """
+        Run every stage for youtube_url, reusing unchanged stage results.
+        Stage metrics and the job trace are saved even when a stage fails.
+        region_weights (region -> weight) ranks keywords by a weighted mix of
+        their per-region trend scores.
+
+        Returns:
+            dict: In-memory results (transcript, keywords, timestamps, metadata)
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        try:
+            with activate(self.tracer), self.tracer.span('job', 'pipeline', url=youtube_url):
+                return self._run(youtube_url, top_n, time_range, generate_titles, region_weights)
+        finally:
+            self.save_metrics()
+
+    def _run(self, youtube_url, top_n, time_range, generate_titles, region_weights=None):
+        os.makedirs(self.clips_dir, exist_ok=True)
+        video_id = resolve_video_id(youtube_url)
+
+        # Step 1: Custom stop words (part of the trend stage fingerprint)
+        ensure_stop_words_file(self.stop_words_path)
+        graph = self.build_graph(youtube_url, video_id, top_n, time_range, region_weights)
+
+        # Step 2: Extract captions
+        self.report('Extracting captions...', 10)
+        transcript = graph.get('captions')
+        if not transcript:
+            raise PipelineError("Caption extraction failed: no transcript available")
+        caption_output = self.artifact_path("captions.txt")
+        if caption_output and graph.status['captions'] == 'reused':
+            save_transcript(transcript, caption_output)
+
+        # Step 3: Analyze trends
+        self.report('Analyzing keyword trends...', 30)
+        keywords_df = graph.get('trends')
+        if keywords_df is None or keywords_df.empty:
+            raise PipelineError("Trend analysis failed: no keywords found")
+        keywords_csv = self.artifact_path("keywords.csv")
+        if keywords_csv:
+            keywords_df.to_csv(keywords_csv, index=False)
+
+        # Step 4: Compute clip windows
+        self.report('Finding key moments...', 40)
+        timestamps = graph.get('windows')
+        timestamps_csv = self.artifact_path("adjusted_timestamps.csv")
+        if timestamps_csv:
+            pd.DataFrame(timestamps).to_csv(timestamps_csv, index=False)
+        if not timestamps:
+            raise PipelineError("Video processing failed: no keyword occurrences in transcript")
+
+        # Step 5: Reuse cached clips, then download the source only for the windows left
+        clip_counts, pending = self.reuse_clips(graph.fingerprint('download'), timestamps, transcript, video_id)
+        if pending:
+            self.report('Downloading source video...', 45)
+            pending_windows = [entry for items in pending.values() for _, _, entry in items]
+            source = self.fetch_source(graph, youtube_url, pending_windows)
+            if not source:
+                raise PipelineError("Video processing failed: could not download source video")
+            sections = not isinstance(source, str)
+            source_cached = not sections and self.cache is not None and video_id is not None
+
+            source_guard = self.cache.pin(source) if source_cached else nullcontext()
+            try:
+                with source_guard:
+                    self.render_clips(source, pending, transcript, video_id, clip_counts)
+            finally:
+                # Cached sources are kept for the next job on the same video
+                if sections:
+                    shutil.rmtree(self.sections_dir, ignore_errors=True)
+                elif not source_cached:
+                    try:
+                        os.remove(source)
+                    except OSError as e:
+                        print(f"Could not remove source file: {str(e)}")
+            source_stage = {'mode': 'sections' if sections else 'full', 'files': len(source) if sections else 1}
+        else:
+            self.report('Reusing previously rendered clips...', 90)
+            source_stage = {'mode': 'none', 'files': 0}
+
+        # Step 6: Generate titles and metadata
+        if generate_titles:
+            self.report('Generating titles and metadata...', 90)
+            trending_words = mix_region_scores(keywords_df, region_weights).nlargest(5, 'Value')['Item'].tolist()
+            try:
+                metadata = self.run_stage(
+                    'metadata', generate_metadata_for_clips,
+                    timestamps, transcript, trending_words, self.metadata_dir,
+                    on_progress=self.progress_range('Generating titles and metadata...', 90, 99)
+                )
+            except Exception as e:
+                print(f"Title generation failed: {str(e)}")
+                metadata = {}
+        else:
+            self.report('Skipping metadata generation (Ollama not available)...', 90)
+            metadata = self.run_stage('metadata', write_basic_metadata, self.clips_dir, self.metadata_dir)
+
+        stages = graph.manifest()
+        stages['clips'] = clip_counts
+        stages['source'] = source_stage
+        stages_json = self.artifact_path("stages.json")
+        if stages_json:
+            with open(stages_json, 'w') as f:
+                json.dump(stages, f, indent=2)
+
+        self.report('Processing complete!', 100)
+        return {
+            'transcript': transcript,
+            'keywords': keywords_df,
+            'timestamps': timestamps,
+            'metadata': metadata,
+            'stages': stages,
+            'metrics': self.metrics.to_dict(),
+            'profiles': self.profiler.files if self.profiler else [],
+            'clips_dir': self.clips_dir,
+            'metadata_dir': self.metadata_dir
+        }
+
+def run_pipeline(youtube_url, top_n=5, time_range=15, output_dir='.output',
+                 generate_titles=True, on_progress=None, write_artifacts=True, cache=None, trend_cache=None,
+                 trend_budget=None, trend_backend=None, trend_regions=None, trend_timeframes=None,
+                 region_weights=None, source_download=None, clip_cutter=None):
+    """
+    Convenience wrapper that builds a Pipeline and runs it once.
+
+    Args:
+        youtube_url (str): YouTube video URL or ID
+        top_n (int): Number of top keywords to process
+        time_range (int): Time range in seconds to capture around keywords
+        output_dir (str): Directory that receives clips, metadata and artifacts
+        generate_titles (bool): Use Ollama for titles; otherwise write basic metadata
+        on_progress (callable, optional): Called as on_progress(step, progress)
+        write_artifacts (bool): Also write intermediate files to output_dir
+        cache (ArtifactCache, optional): Artifact cache shared between runs
+        trend_cache (TrendCache, optional): Per-keyword trend score cache
+        trend_budget (TrendBudget, optional): Trend requests and seconds allowed
+        trend_backend (optional): Trend backend object or name
+        trend_regions (list, optional): Google Trends regions
+        trend_timeframes (list, optional): Google Trends timeframes
+        region_weights (dict, optional): region -> weight for ranking keywords
+        source_download (str, optional): 'sections' or 'full'; defaults to SOURCE_DOWNLOAD
+        clip_cutter (str, optional): 'copy' or 'moviepy'; defaults to CLIP_CUTTER
+
+    Returns:
+        dict: In-memory results of the run
+    """
+    pipeline = Pipeline(output_dir, write_artifacts=write_artifacts, on_progress=on_progress, cache=cache,
+                        trend_cache=trend_cache, trend_budget=trend_budget, trend_backend=trend_backend,
+                        trend_regions=trend_regions, trend_timeframes=trend_timeframes,
+                        source_download=source_download, clip_cutter=clip_cutter)
+    return pipeline.run(youtube_url, top_n=top_n, time_range=time_range, generate_titles=generate_titles,
+                        region_weights=region_weights)
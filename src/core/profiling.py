@@ -0,0 +1,134 @@
+"""
+Optional per-stage profiling for pipeline runs.
+
+Two modes are supported:
+  - 'sample': a background thread samples the stage's Python stack every few
+    milliseconds and writes collapsed stacks (<stage>.folded) that
+    flamegraph.pl, speedscope or inferno can render directly.
+  - 'cprofile': deterministic cProfile output (<stage>.prof) for snakeviz,
+    flameprof or pstats.
+
+Profiling is requested per job, or for every job with the YSG_PROFILE
+environment variable ('sample', 'cprofile', or '1' for sampling).
+"""
+
+import os
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_MODES = ('sample', 'cprofile')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# cProfile can only be active once per interpreter on newer Pythons
+_cprofile_lock = threading.Lock()
+
+def normalize_profile_mode(value):
+    """
+    Map a request/env value to a profile mode or None.
+
+    Raises:
+        ValueError: If the value is not a recognised mode
+    """
+    if value in (None, '', False, 0, '0', 'false', 'off', 'none'):
+        return None
+    if value in (True, 1, '1', 'true', 'on'):
+        return 'sample'
+    if value in PROFILE_MODES:
+        return value
+    raise ValueError(f"Unknown profile mode '{value}'. Use one of: {', '.join(PROFILE_MODES)}")
+
+def profile_mode_from_env():
+    return normalize_profile_mode(os.environ.get('YSG_PROFILE', '').strip().lower())
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack into a Counter of collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+class StageProfiler:
+    """
+    Profiles pipeline stages and writes the results to output_dir.
+
+    Args:
+        output_dir (str): Directory for .folded / .prof files
+        mode (str): 'sample' or 'cprofile'
+        interval (float): Sampling interval in seconds for 'sample' mode
+    """
+
+    def __init__(self, output_dir, mode='sample', interval=DEFAULT_SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.mode = normalize_profile_mode(mode)
+        self.interval = interval
+        self.files = []
+        self._runs = Counter()
+
+    def _output_path(self, stage, extension):
+        self._runs[stage] += 1
+        suffix = f"_{self._runs[stage]}" if self._runs[stage] > 1 else ""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{stage}{suffix}.{extension}")
+        self.files.append(path)
+        return path
+
+    @contextmanager
+    def profile(self, stage):
+        if self.mode == 'cprofile' and _cprofile_lock.acquire(blocking=False):
+            try:
+                yield from self._profile_deterministic(stage)
+            finally:
+                _cprofile_lock.release()
+        else:
+            if self.mode == 'cprofile':
+                print(f"cProfile busy in another job; sampling stage '{stage}' instead")
+            yield from self._profile_sampling(stage)
+
+    def _profile_deterministic(self, stage):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self._output_path(stage, 'prof'))
+
+    def _profile_sampling(self, stage):
+        sampler = _StackSampler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path = self._output_path(stage, 'folded')
+            with open(path, 'w') as f:
+                f.write(f"# stage={stage} wall_seconds={time.perf_counter() - started:.3f} "
+                        f"interval={self.interval}\n")
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
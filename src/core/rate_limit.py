@@ -0,0 +1,123 @@
+"""
+Thread-safe token-bucket rate limiting, keyed by remote host.
+
+Batch jobs share one HostRateLimiter so that however many workers are
+running, each remote service only sees the request rate configured for it.
+AdaptiveTokenBucket additionally slows down when the service answers with
+429s and speeds back up while requests succeed. Waits are recorded as
+'sleep' spans when a tracer is active.
+"""
+
+import time
+import threading
+from tracing import span
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `burst`.
+
+    Args:
+        rate (float): Tokens added per second
+        burst (int): Bucket capacity
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token, returning how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Block until a token is available. Returns the seconds spent waiting."""
+        wait = self._reserve()
+        if wait > 0:
+            with span('rate limit wait', 'sleep', seconds=round(wait, 3)):
+                time.sleep(wait)
+        return wait
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    TokenBucket that backs off when the remote service pushes back.
+
+    throttle() halves the rate (never below min_rate) and can hold every
+    caller for a Retry-After pause; recover() adds back a fixed fraction of
+    the starting rate after each success, so the rate settles just under
+    what the service tolerates.
+
+    Args:
+        rate (float): Starting and maximum tokens per second
+        burst (int): Bucket capacity
+        min_rate (float, optional): Floor for the rate; defaults to rate / 16
+        increase (float): Fraction of the starting rate restored per success
+    """
+
+    def __init__(self, rate, burst=1, min_rate=None, increase=0.02):
+        super().__init__(rate, burst)
+        self.max_rate = self.rate
+        self.min_rate = min_rate or self.rate / 16
+        self.increase = increase
+        self.throttles = 0
+
+    def _set_rate(self, rate, pause=0.0):
+        with self._lock:
+            # Credit tokens earned at the old rate before switching
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.rate = rate
+            if pause > 0:
+                # A negative balance makes the next caller wait at least `pause`
+                self._tokens = min(self._tokens, -pause * self.rate)
+
+    def throttle(self, pause=0.0):
+        """Halve the rate after a 429, optionally pausing all callers for `pause` seconds"""
+        self.throttles += 1
+        self._set_rate(max(self.min_rate, self.rate / 2), pause)
+
+    def recover(self):
+        """Step the rate back towards its maximum after a successful request"""
+        if self.rate < self.max_rate:
+            self._set_rate(min(self.max_rate, self.rate + self.max_rate * self.increase))
+
+class HostRateLimiter:
+    """
+    One TokenBucket per host.
+
+    Args:
+        rates (dict, optional): host -> requests per second
+        default_rate (float, optional): Rate for hosts not in rates; None means unlimited
+        burst (int): Bucket capacity for every host
+    """
+
+    def __init__(self, rates=None, default_rate=None, burst=1):
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rates.get(host, self.default_rate)
+                self._buckets[host] = TokenBucket(rate, self.burst) if rate else None
+            return self._buckets[host]
+
+    def acquire(self, host):
+        """Block until a request to host is allowed. Returns the seconds spent waiting."""
+        bucket = self.bucket(host)
+        return bucket.acquire() if bucket else 0.0
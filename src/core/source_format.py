@@ -0,0 +1,170 @@
+"""
+Source rendition selection for the download stage.
+
+The reframe stage (adjust_aspect.vf_filter) crops the source to 4:3 and pads
+it to 9:16, so a short is min(width, height * 4/3) pixels wide whatever the
+source resolution. Anything wider is scaled away after it has been
+downloaded and decoded. Instead of yt-dlp's 'best', the source is therefore
+the smallest rendition whose reframed width still reaches the target output
+width, with codecs that decode cheaply on CPU preferred among renditions of
+the same size:
+
+    avc1 (H.264)  <  vp9  <  hevc  <  av01
+
+When no rendition is wide enough, the widest one is used. Separate video and
+audio streams get an AAC track when there is one, so sections can be stream
+copied into mp4.
+
+Compare the policy with yt-dlp's 'best' and default 'bv*+ba' on format
+metadata (yt-dlp -J <url>, or benchmarks/format_fixtures.json):
+    python source_format.py info.json [--width 720]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Width of the finished short (720 x 1280); 1080 for full HD shorts
+OUTPUT_WIDTH = int(os.environ.get('SHORTS_WIDTH', 720))
+# Relative CPU decode cost per pixel by codec family; unknown codecs sort last
+CODEC_COST = {'avc1': 1.0, 'h264': 1.0, 'vp8': 1.3, 'vp9': 1.5, 'vp09': 1.5,
+              'hev1': 1.8, 'hvc1': 1.8, 'hevc': 1.8, 'av01': 2.5}
+UNKNOWN_CODEC_COST = 3.0
+# Audio bitrate (kbit/s) aimed for when picking a separate audio stream
+AUDIO_BITRATE = 128
+
+def codec_cost(codec):
+    """Decode cost of a yt-dlp codec string such as 'avc1.64001F' or 'vp09.00.40.08'"""
+    if not codec or codec == 'none':
+        return UNKNOWN_CODEC_COST
+    return CODEC_COST.get(codec.split('.')[0].lower(), UNKNOWN_CODEC_COST)
+
+def reframed_width(width, height):
+    """Width of the short rendered from a width x height source; mirrors vf_filter"""
+    return min(width, height * 4 / 3)
+
+def _has_video(fmt):
+    return fmt.get('vcodec') not in (None, 'none') and fmt.get('width') and fmt.get('height')
+
+def _has_audio(fmt):
+    return fmt.get('acodec') not in (None, 'none')
+
+def select_source_format(formats, target_width=OUTPUT_WIDTH):
+    """
+    Pick the source rendition for a target output width.
+
+    Args:
+        formats (list): yt-dlp format dictionaries ('format_id', 'vcodec',
+            'acodec', 'width', 'height', 'tbr', 'abr', ...)
+        target_width (int): Width of the finished short
+
+    Returns:
+        tuple: (video_format, audio_format); audio_format is None when the video
+            format carries audio. (None, None) if there is no usable video format.
+    """
+    videos = [fmt for fmt in formats if _has_video(fmt)]
+    if not videos:
+        return None, None
+    wide_enough = [fmt for fmt in videos if reframed_width(fmt['width'], fmt['height']) >= target_width]
+    if wide_enough:
+        # Smallest frame first, then the cheaper codec, then the lower bitrate;
+        # a rendition with its own audio saves a second stream at equal cost
+        video = min(wide_enough, key=lambda fmt: (
+            fmt['width'] * fmt['height'], codec_cost(fmt.get('vcodec')),
+            not _has_audio(fmt), fmt.get('tbr') or float('inf')
+        ))
+    else:
+        video = max(videos, key=lambda fmt: (
+            reframed_width(fmt['width'], fmt['height']), -codec_cost(fmt.get('vcodec')),
+            _has_audio(fmt), -(fmt.get('tbr') or float('inf'))
+        ))
+    if _has_audio(video):
+        return video, None
+
+    audios = [fmt for fmt in formats if _has_audio(fmt) and not _has_video(fmt)]
+    if not audios:
+        return video, None
+    audio = min(audios, key=lambda fmt: (
+        not (fmt.get('acodec') or '').startswith('mp4a'),
+        abs((fmt.get('abr') or fmt.get('tbr') or 0) - AUDIO_BITRATE)
+    ))
+    return video, audio
+
+def ydl_format(target_width=OUTPUT_WIDTH):
+    """
+    yt-dlp 'format' option that applies select_source_format.
+
+    Returns:
+        callable: Format selector yielding the chosen rendition, merged with its
+            audio stream when they are separate
+    """
+    def selector(ctx):
+        video, audio = select_source_format(ctx.get('formats') or [], target_width)
+        if video is None:
+            return
+        if audio is None:
+            yield video
+            return
+        yield {
+            'format_id': f"{video['format_id']}+{audio['format_id']}",
+            'ext': video.get('ext') or 'mp4',
+            'requested_formats': [video, audio],
+            'protocol': f"{video.get('protocol')}+{audio.get('protocol')}"
+        }
+    return selector
+
+def source_format_params(target_width=OUTPUT_WIDTH):
+    """Fingerprint parameters of the selection policy, for the download stage"""
+    return {'policy': 'smallest-fit', 'width': target_width, 'codecs': CODEC_COST}
+
+def _best_format(formats):
+    """yt-dlp's 'best': the largest rendition carrying both video and audio"""
+    combined = [fmt for fmt in formats if _has_video(fmt) and _has_audio(fmt)]
+    return max(combined, key=lambda fmt: (fmt['width'] * fmt['height'], fmt.get('tbr') or 0), default=None), None
+
+def _default_format(formats):
+    """yt-dlp's default 'bv*+ba': the largest video stream and the best audio stream"""
+    videos = [fmt for fmt in formats if _has_video(fmt)]
+    video = max(videos, key=lambda fmt: (fmt['width'] * fmt['height'], fmt.get('tbr') or 0), default=None)
+    if video is None or _has_audio(video):
+        return video, None
+    audios = [fmt for fmt in formats if _has_audio(fmt) and not _has_video(fmt)]
+    return video, max(audios, key=lambda fmt: fmt.get('abr') or fmt.get('tbr') or 0, default=None)
+
+def describe(video, audio):
+    """One-line summary of a chosen rendition and its total bitrate"""
+    if video is None:
+        return 'no video format', 0.0
+    tbr = (video.get('tbr') or 0) + ((audio.get('abr') or audio.get('tbr') or 0) if audio else 0)
+    name = f"{video['format_id']} {video['width']}x{video['height']} {video.get('vcodec')}"
+    if audio:
+        name += f" + {audio['format_id']} {audio.get('acodec')}"
+    return name, tbr
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the source format policy with yt-dlp's own choices")
+    parser.add_argument('info', nargs='+', help='yt-dlp -J output, or a JSON list of such objects')
+    parser.add_argument('--width', type=int, default=OUTPUT_WIDTH, help='Output width of the short')
+    args = parser.parse_args(argv)
+
+    for path in args.info:
+        with open(path, 'r', encoding='utf-8') as f:
+            infos = json.load(f)
+        for info in infos if isinstance(infos, list) else [infos]:
+            formats = info.get('formats') or []
+            print(f"{info.get('id') or info.get('title') or path} (output width {args.width}):")
+            chosen = select_source_format(formats, args.width)
+            _, chosen_tbr = describe(*chosen)
+            for label, (video, audio) in (('policy', chosen), ('best', _best_format(formats)),
+                                          ('bv*+ba', _default_format(formats))):
+                name, tbr = describe(video, audio)
+                width = reframed_width(video['width'], video['height']) if video else 0
+                cost = video['width'] * video['height'] * codec_cost(video.get('vcodec')) / 1e6 if video else 0
+                change = f", policy {100 * (chosen_tbr - tbr) / tbr:+.1f}% bitrate" if tbr and label != 'policy' else ''
+                print(f"  {label:7} {name}: {tbr:.0f} kbit/s, short {width:.0f} px wide, "
+                      f"decode cost {cost:.2f}{change}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
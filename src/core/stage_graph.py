@@ -0,0 +1,123 @@
+"""
+Fingerprinted stage graph for incremental pipeline runs.
+
+Each stage declares its parameters and the stages it depends on. A stage's
+fingerprint hashes its own parameters together with the fingerprints of its
+dependencies, so changing one parameter only invalidates the stages
+downstream of it. Stages with a loader are looked up by fingerprint before
+they are recomputed.
+
+A stage whose result can change while its parameters stay the same (trend
+scores that expire, for example) declares a content function. Its
+dependents then hash the content of its result instead of its parameters,
+so they are recomputed whenever the result itself changes.
+"""
+
+from artifact_cache import fingerprint
+
+class Stage:
+    """
+    A node in the stage graph.
+
+    Args:
+        name (str): Stage name, also used for instrumentation
+        func (callable): Called with the results of deps as keyword arguments
+        deps (tuple): Names of the stages this one consumes
+        params (dict): Parameters that affect the stage output
+        load (callable, optional): load(fingerprint) -> result or None
+        store (callable, optional): store(fingerprint, result) -> result to use downstream
+        content (callable, optional): content(result) -> JSON-serialisable summary of
+            the result that dependents fingerprint in place of this stage's parameters
+    """
+
+    def __init__(self, name, func, deps=(), params=None, load=None, store=None, content=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.load = load
+        self.store = store
+        self.content = content
+
+class StageGraph:
+    """
+    Resolves stages on demand, reusing stored results whose fingerprint is unchanged.
+
+    Args:
+        run_stage (callable, optional): Wrapper used as run_stage(name, func, **kwargs)
+            when a stage has to be recomputed
+    """
+
+    def __init__(self, run_stage=None):
+        self.stages = {}
+        self.results = {}
+        self.status = {}
+        self._fingerprints = {}
+        self._run_stage = run_stage or (lambda name, func, **kwargs: func(**kwargs))
+
+    def add(self, name, func, deps=(), params=None, load=None, store=None, content=None):
+        for dep in deps:
+            if dep not in self.stages:
+                raise KeyError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name, func, deps, params, load, store, content)
+        return self.stages[name]
+
+    def fingerprint(self, name):
+        """Fingerprint of a stage's parameters and everything upstream of it"""
+        if name not in self._fingerprints:
+            stage = self.stages[name]
+            self._fingerprints[name] = fingerprint({
+                'stage': name,
+                'params': stage.params,
+                'deps': {dep: self._dep_fingerprint(dep) for dep in stage.deps}
+            })
+        return self._fingerprints[name]
+
+    def _dep_fingerprint(self, name):
+        """What dependents hash for a stage: its result's content when it declares one"""
+        stage = self.stages[name]
+        if stage.content is None:
+            return self.fingerprint(name)
+        result = self.get(name)
+        if result is None:
+            return self.fingerprint(name)
+        return fingerprint({'stage': name, 'content': stage.content(result)})
+
+    def get(self, name):
+        """Return a stage result, loading or computing it and its dependencies as needed"""
+        if name in self.results:
+            return self.results[name]
+
+        stage = self.stages[name]
+        stage_fp = self.fingerprint(name)
+
+        result = stage.load(stage_fp) if stage.load else None
+        if result is not None:
+            self.status[name] = 'reused'
+        else:
+            inputs = {dep: self.get(dep) for dep in stage.deps}
+            result = self._run_stage(name, stage.func, **inputs)
+            if result is not None and stage.store:
+                result = stage.store(stage_fp, result)
+            self.status[name] = 'computed'
+
+        self.results[name] = result
+        return result
+
+    def cached(self, name):
+        """Stored result of a stage whose fingerprint is unchanged, or None; never computes"""
+        if name in self.results:
+            return self.results[name]
+        stage = self.stages[name]
+        result = stage.load(self.fingerprint(name)) if stage.load else None
+        if result is not None:
+            self.status[name] = 'reused'
+            self.results[name] = result
+        return result
+
+    def manifest(self):
+        """Fingerprint and reuse status of every stage resolved so far"""
+        return {
+            name: {'fingerprint': self.fingerprint(name), 'status': self.status[name]}
+            for name in self.status
+        }
@@ -1,11 +1,192 @@
 import pandas as pd
+import numpy as np
 import sys
 import os
-from moviepy.video.io.VideoFileClip import VideoFileClip
-import yt_dlp
+import bisect
+from urllib.parse import urlparse
 from caption_extractor import extract_video_id
+from tracing import span, run_command
+from transcript_store import load_transcript, build_word_index, TranscriptStore
+from trend_analyzer import mix_region_scores
+from source_format import ydl_format
+from clip_cutter import normalize_cutter, cut_clips, probe_media
 
-def process_video(youtube_url, time_range=15, output_dir='clips', keywords_csv='output.csv', captions_json='output.json', top_n=5):
+# Seconds of source kept on each side of a clip window when only sections are downloaded
+SECTION_PADDING = 2.0
+# A downloaded section may fall short of its requested length by the end padding
+# (past the end of the video) plus this many seconds before it counts as broken
+SECTION_TOLERANCE = 1.0
+# Direct links to these files are cut as they are, without asking yt-dlp for a stream URL
+MEDIA_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.webm')
+
+def snap_to_captions(starts, lower_bounds, upper_bounds):
+    """
+    Widen windows to caption boundaries.
+
+    Each lower bound moves back to the latest caption start at or before it,
+    and each upper bound forward to the earliest caption start at or after it.
+    Bounds with no such caption are kept as they are.
+
+    Args:
+        starts (ndarray): Caption start times, in any order
+        lower_bounds, upper_bounds (ndarray): Window bounds, one per window
+
+    Returns:
+        tuple: (lower_bounds, upper_bounds) float arrays
+    """
+    starts = np.asarray(starts, dtype=float)
+    if len(starts) and np.any(starts[1:] < starts[:-1]):
+        starts = np.sort(starts)
+    lower_bounds = np.asarray(lower_bounds, dtype=float)
+    upper_bounds = np.asarray(upper_bounds, dtype=float)
+    if not len(starts):
+        return lower_bounds, upper_bounds
+
+    floor = np.searchsorted(starts, lower_bounds, side='right') - 1
+    ceil = np.searchsorted(starts, upper_bounds, side='left')
+    snapped_lower = np.where(floor >= 0, starts[np.maximum(floor, 0)], lower_bounds)
+    snapped_upper = np.where(ceil < len(starts), starts[np.minimum(ceil, len(starts) - 1)], upper_bounds)
+    return snapped_lower, snapped_upper
+
+def compute_adjusted_timestamps(keywords_df, transcript, time_range=15, top_n=5, region_weights=None):
+    """
+    Pick the top_n densest, non-overlapping clip windows around the top keywords
+
+    Every spoken occurrence of each of the top_n keywords is a candidate: a
+    time_range window centred on it, widened to caption boundaries. A
+    candidate scores the trend-weighted keyword occurrences per second of its
+    nominal window, before snapping, summed with prefix sums over the
+    occurrence timeline. Every candidate is thus scored over the same length:
+    caption widening does not add weight, and a window cut short at the start
+    of the video is not favoured for being short. Candidates are taken best first and any candidate overlapping
+    a window already taken is dropped, so no second clip covering the same
+    seconds is rendered. The keywords of a taken window are only those spoken
+    inside it.
+    
+    Args:
+        keywords_df (DataFrame): Keyword scores with 'Item' and 'Value' columns, and
+            optionally 'Forms' listing the surface forms that count as the keyword
+        transcript (TranscriptStore or list): Caption entries with 'text', 'start' and 'duration'
+        time_range (int): Time range in seconds to capture around keywords
+        top_n (int): Number of top keywords to consider, and of windows to return
+        region_weights (dict, optional): region -> weight used to rank keywords by a
+            mix of their per-region scores instead of the stored Value
+    
+    Returns:
+        list: Adjusted timestamp dictionaries, best first, with word, original_start,
+            lower_bound, upper_bound, score, keywords (space-separated keywords in the
+            window, by weight) and clip (name of the clip file, <word>_clip_<n>).
+            original_start is the interpolated time of the word itself, not of its caption line.
+    """
+    # Get top words
+    keywords_df = mix_region_scores(keywords_df, region_weights)
+    top_keywords = keywords_df.nlargest(top_n, 'Value')
+    top_words = top_keywords['Item'].tolist()
+    print(f"Processing clips for top {top_n} keywords: {top_words}")
+    if 'Forms' in top_keywords:
+        forms = dict(zip(top_words, top_keywords['Forms'].fillna('').str.split()))
+    else:
+        forms = {}
+
+    # Trend weight of each keyword, relative to the best; without usable scores all weigh the same
+    values = np.nan_to_num(top_keywords['Value'].to_numpy(dtype=float), nan=0.0).clip(min=0)
+    weights = values / values.max() if len(values) and values.max() > 0 else np.ones(len(values))
+
+    word_index = build_word_index(transcript)
+    if isinstance(transcript, TranscriptStore):
+        starts = transcript.start
+    else:
+        starts = np.array([float(entry['start']) for entry in transcript], dtype=float)
+
+    # Timeline of every occurrence of every form of the top keywords
+    times = []
+    keyword_ids = []
+    for k, word in enumerate(top_words):
+        for form in dict.fromkeys(forms.get(word) or [word]):
+            _, occurrence_times = word_index.occurrences(form)
+            times.append(occurrence_times)
+            keyword_ids.append(np.full(len(occurrence_times), k))
+    if not times or not sum(len(t) for t in times):
+        return []
+    times = np.round(np.concatenate(times), 3)
+    keyword_ids = np.concatenate(keyword_ids)
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    keyword_ids = keyword_ids[order]
+    prefix = np.concatenate(([0.0], np.cumsum(weights[keyword_ids])))
+
+    # One candidate per occurrence, scored over its nominal window
+    half_range = time_range / 2
+    nominal_lower = np.maximum(0, times - half_range)
+    nominal_upper = times + half_range
+    scores = (
+        prefix[np.searchsorted(times, nominal_upper, side='right')]
+        - prefix[np.searchsorted(times, nominal_lower, side='left')]
+    ) / max(time_range, 1e-9)
+
+    # Then all snapped to caption boundaries in one batched call
+    lower_bounds, upper_bounds = snap_to_captions(starts, nominal_lower, nominal_upper)
+    first = np.searchsorted(times, lower_bounds, side='left')
+    last = np.searchsorted(times, upper_bounds, side='right')
+
+    # Best first; ties go to the stronger keyword, then the earlier moment
+    ranking = np.lexsort((times, -weights[keyword_ids], -scores))
+    taken_lower = []
+    taken_upper = []
+    taken = []
+    for i in ranking.tolist():
+        if len(taken) == top_n:
+            break
+        lower_bound, upper_bound = float(lower_bounds[i]), float(upper_bounds[i])
+        if upper_bound <= lower_bound:
+            continue
+        # Taken windows never overlap, so sorted by lower bound their upper bounds are sorted too
+        position = bisect.bisect_left(taken_lower, lower_bound)
+        if (position < len(taken_lower) and taken_lower[position] < upper_bound) or \
+           (position > 0 and taken_upper[position - 1] > lower_bound):
+            continue
+        taken_lower.insert(position, lower_bound)
+        taken_upper.insert(position, upper_bound)
+        taken.append(i)
+
+    adjusted_timestamps = []
+    clip_counts = {}
+    for i in taken:
+        word = top_words[keyword_ids[i]]
+        clip_counts[word] = clip_counts.get(word, 0) + 1
+        inside = np.unique(keyword_ids[first[i]:last[i]])
+        inside = inside[np.argsort(-weights[inside], kind='stable')]
+        adjusted_timestamps.append({
+            'word': word,
+            'original_start': float(times[i]),
+            'lower_bound': float(lower_bounds[i]),
+            'upper_bound': float(upper_bounds[i]),
+            'score': round(float(scores[i]), 4),
+            'keywords': ' '.join(top_words[k] for k in inside.tolist()),
+            'clip': f"{word}_clip_{clip_counts[word]}"
+        })
+    
+    return adjusted_timestamps
+
+def group_timestamps_by_word(adjusted_timestamps):
+    """
+    Group adjusted timestamps by keyword, preserving order
+    
+    Args:
+        adjusted_timestamps (list): Output of compute_adjusted_timestamps
+    
+    Returns:
+        dict: Mapping of word to its list of timestamp entries
+    """
+    grouped_timestamps = {}
+    for entry in adjusted_timestamps:
+        word = entry['word']
+        if word not in grouped_timestamps:
+            grouped_timestamps[word] = []
+        grouped_timestamps[word].append(entry)
+    return grouped_timestamps
+
+def process_video(youtube_url, time_range=15, output_dir='clips', keywords_csv='output.csv', captions_json='output.json', top_n=5, workspace='.output'):
     """
     Process a YouTube video to create clips around keywords
     
@@ -16,6 +197,7 @@ def process_video(youtube_url, time_range=15, output_dir='clips', keywords_csv='
         keywords_csv (str): Path to keywords CSV file
         captions_json (str): Path to captions JSON file
         top_n (int): Number of top keywords to process
+        workspace (str): Job workspace directory that receives adjusted_timestamps.csv
     """
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
@@ -24,44 +206,17 @@ def process_video(youtube_url, time_range=15, output_dir='clips', keywords_csv='
     # Load data files
     try:
         df = pd.read_csv(keywords_csv)
-        df_json = pd.read_json(captions_json)
+        transcript = load_transcript(captions_json)
     except Exception as e:
         print(f"Error loading data files: {str(e)}")
         return False
     
-    # Get top words
-    top_words = df.nlargest(top_n, 'Value')['Item']
-    print(f"Processing clips for top {top_n} keywords: {list(top_words)}")
-    
-    # Find first occurrence of each top word
-    word_occurrences = {}
-    for word in top_words:
-        match = df_json[df_json['text'].str.contains(word, case=False, na=False)].head(1)
-        if not match.empty:
-            word_occurrences[word] = match[['text', 'start', 'duration']].to_dict('records')
-    
-    # Calculate adjusted timestamps
-    adjusted_timestamps = []
-    for word, occurrences in word_occurrences.items():
-        for occurrence in occurrences:
-            start_time = occurrence['start']
-            half_range = time_range / 2
-            lower_bound = max(0, start_time - half_range)
-            upper_bound = start_time + half_range
-    
-            nearest_floor = df_json[df_json['start'] <= lower_bound]['start'].max() if not df_json[df_json['start'] <= lower_bound].empty else lower_bound
-            nearest_ceil = df_json[df_json['start'] >= upper_bound]['start'].min() if not df_json[df_json['start'] >= upper_bound].empty else upper_bound
-    
-            adjusted_timestamps.append({
-                'word': word,
-                'original_start': start_time,
-                'lower_bound': nearest_floor,
-                'upper_bound': nearest_ceil
-            })
+    adjusted_timestamps = compute_adjusted_timestamps(df, transcript, time_range, top_n)
     
     # Save adjusted timestamps to a CSV file
     timestamps_df = pd.DataFrame(adjusted_timestamps)
-    timestamps_csv_path = os.path.join('.output', 'adjusted_timestamps.csv')
+    os.makedirs(workspace, exist_ok=True)
+    timestamps_csv_path = os.path.join(workspace, 'adjusted_timestamps.csv')
     timestamps_df.to_csv(timestamps_csv_path, index=False)
     print(f"Adjusted timestamps saved to {timestamps_csv_path}")
     
@@ -71,12 +226,7 @@ def process_video(youtube_url, time_range=15, output_dir='clips', keywords_csv='
         return False
     
     # Group adjusted timestamps by word
-    grouped_timestamps = {}
-    for entry in adjusted_timestamps:
-        word = entry['word']
-        if word not in grouped_timestamps:
-            grouped_timestamps[word] = []
-        grouped_timestamps[word].append(entry)
+    grouped_timestamps = group_timestamps_by_word(adjusted_timestamps)
     
     # Create the trimmed videos
     success = create_trimmed_videos(source_path, grouped_timestamps, output_dir)
@@ -90,13 +240,16 @@ def process_video(youtube_url, time_range=15, output_dir='clips', keywords_csv='
     
     return success
 
-def download_youtube_video(url, output_dir='.'):
+def download_youtube_video(url, output_dir='.', on_progress=None, format_selector=None):
     """
     Download a YouTube video
     
     Args:
         url (str): YouTube URL or ID
         output_dir (str): Directory to save the video
+        on_progress (callable, optional): Called as on_progress(downloaded_bytes, total_bytes)
+        format_selector (str or callable, optional): yt-dlp format; defaults to the
+            smallest rendition that fills the short (see source_format)
     
     Returns:
         str: Path to the downloaded video file
@@ -107,10 +260,19 @@ def download_youtube_video(url, output_dir='.'):
         url = f"https://www.youtube.com/watch?v={video_id}"
     
     print(f"Downloading video from {url}...")
+    import yt_dlp
     ydl_opts = {
-        'format': 'best',
+        'format': format_selector or ydl_format(),
+        # Separate video and audio streams are merged into one mp4
+        'merge_output_format': 'mp4',
         'outtmpl': os.path.join(output_dir, 'source_video.%(ext)s')
     }
+    if on_progress:
+        def progress_hook(d):
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if d.get('status') == 'downloading' and total:
+                on_progress(d.get('downloaded_bytes', 0), total)
+        ydl_opts['progress_hooks'] = [progress_hook]
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
@@ -123,33 +285,168 @@ def download_youtube_video(url, output_dir='.'):
         traceback.print_exc()
         return None
 
-def create_trimmed_videos(source_path, timestamps_dict, output_dir='.'):
+def merge_sections(timestamps, padding=SECTION_PADDING):
+    """Padded clip windows merged into sorted, non-overlapping (start, end) sections"""
+    intervals = sorted(
+        (max(0.0, float(entry['lower_bound']) - padding), float(entry['upper_bound']) + padding)
+        for entry in timestamps
+    )
+    sections = []
+    for start, end in intervals:
+        if sections and start <= sections[-1][1]:
+            sections[-1][1] = max(sections[-1][1], end)
+        else:
+            sections.append([start, end])
+    return [(start, end) for start, end in sections]
+
+def resolve_media_urls(url, format_selector=None):
+    """
+    Stream URLs ffmpeg can read a video from, without downloading it
+    
+    Args:
+        url (str): YouTube URL or ID, or a direct link to a media file
+        format_selector (str or callable, optional): yt-dlp format; defaults to the
+            smallest rendition that fills the short (see source_format)
+    
+    Returns:
+        tuple: (urls, headers) with one URL for a combined stream or a video and an
+            audio URL, and the HTTP headers to send with them
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in ('http', 'https') and os.path.splitext(parsed.path)[1].lower() in MEDIA_EXTENSIONS:
+        return [url], {}
+    video_id = extract_video_id(url)
+    if video_id:
+        url = f"https://www.youtube.com/watch?v={video_id}"
+    import yt_dlp
+    with yt_dlp.YoutubeDL({'format': format_selector or ydl_format(), 'quiet': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    formats = info.get('requested_formats') or [info]
+    headers = formats[0].get('http_headers') or info.get('http_headers') or {}
+    return [fmt['url'] for fmt in formats], headers
+
+def download_video_sections(url, timestamps, output_dir='.', padding=SECTION_PADDING, format_selector=None,
+                            on_progress=None):
+    """
+    Download only the parts of a video that the clip windows need
+    
+    Each window is padded and overlapping ones are merged. ffmpeg then reads every
+    section from the media URL with stream copy, seeking by HTTP range requests,
+    so only those bytes are transferred. Sections keep their start at time 0.
+    
+    Args:
+        url (str): YouTube URL or ID, or a direct link to a media file
+        timestamps (list): Clip windows with 'lower_bound' and 'upper_bound'
+        output_dir (str): Directory to save the sections
+        padding (float): Seconds kept on each side of a window
+        format_selector (str or callable, optional): yt-dlp format; see resolve_media_urls
+        on_progress (callable, optional): Called as on_progress(sections_done, sections_total)
+    
+    Returns:
+        list: Sections as {'path', 'start', 'end'} in source time, or None when the
+            media URL cannot be resolved or cut, or a section comes back without video
+            or too short; use download_youtube_video then
+    """
+    sections = merge_sections(timestamps, padding)
+    if not sections:
+        return None
+    try:
+        urls, headers = resolve_media_urls(url, format_selector)
+    except Exception as e:
+        print(f"Could not resolve a media URL for {url}: {str(e)}")
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    header_args = ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in headers.items())] if headers else []
+    downloaded = []
+    for i, (start, end) in enumerate(sections):
+        path = os.path.join(output_dir, f"section_{i + 1}.mp4")
+        cmd = ['ffmpeg', '-loglevel', 'error', '-y']
+        for media_url in urls:
+            cmd += header_args + ['-ss', f"{start:.3f}", '-t', f"{end - start:.3f}", '-i', media_url]
+        if len(urls) > 1:
+            cmd += ['-map', '0:v:0', '-map', '1:a:0']
+        cmd += ['-c', 'copy', path]
+        result = run_command(cmd, name='ffmpeg section', capture_output=True, text=True)
+        if result.returncode != 0 or not os.path.exists(path):
+            print(f"Error downloading section {start:.1f}-{end:.1f}s: {result.stderr.strip()}")
+            return None
+        # A server without range support can leave ffmpeg "succeeding" with an empty file
+        media = probe_media(path)
+        if not media['codec']:
+            print(f"Section {start:.1f}-{end:.1f}s has no video stream")
+            return None
+        if media['duration'] < end - start - padding - SECTION_TOLERANCE:
+            print(f"Section {start:.1f}-{end:.1f}s is only {media['duration']:.1f}s long")
+            return None
+        downloaded.append({'path': path, 'start': start, 'end': end})
+        if on_progress:
+            on_progress(i + 1, len(sections))
+    print(f"Downloaded {len(downloaded)} sections ({sum(end - start for start, end in sections):.1f}s of video)")
+    return downloaded
+
+def locate_window(source, lower_bound, upper_bound):
+    """
+    File that holds a clip window, and the window in that file's time
+    
+    Args:
+        source (str or list): Path to the full source video, or the sections
+            returned by download_video_sections
+        lower_bound, upper_bound (float): Window in source time
+    
+    Returns:
+        tuple: (path, lower_bound, upper_bound)
+    """
+    if isinstance(source, str):
+        return source, lower_bound, upper_bound
+    for section in source:
+        if section['start'] <= lower_bound + 1e-6 and upper_bound <= section['end'] + 1e-6:
+            return section['path'], lower_bound - section['start'], upper_bound - section['start']
+    raise ValueError(f"No downloaded section covers {lower_bound}-{upper_bound}s")
+
+def create_trimmed_videos(source_path, timestamps_dict, output_dir='.', on_progress=None, cutter=None):
     """
     Create trimmed video clips from a source video
     
     Args:
-        source_path (str): Path to the source video
+        source_path (str or list): Path to the source video, or the sections
+            returned by download_video_sections
         timestamps_dict (dict): Dictionary of timestamps for each keyword
         output_dir (str): Directory to save the clips
+        on_progress (callable, optional): Called as on_progress(clips_done, clips_total)
+        cutter (str, optional): 'copy' (keyframe-aware stream copy, see clip_cutter)
+            or 'moviepy'; defaults to CLIP_CUTTER
     
     Returns:
         bool: True if successful, False otherwise
     """
+    if normalize_cutter(cutter) == 'copy':
+        return cut_clips(source_path, timestamps_dict, output_dir, on_progress)
+    
+    # moviepy is only needed when clips are actually cut
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    videos = {}
     try:
-        video = VideoFileClip(source_path)
+        total = sum(len(timestamps) for timestamps in timestamps_dict.values())
+        done = 0
         for word, timestamps in timestamps_dict.items():
             for i, timestamp in enumerate(timestamps):
-                start_time = timestamp['lower_bound']
-                end_time = timestamp['upper_bound']
+                path, start_time, end_time = locate_window(source_path, timestamp['lower_bound'], timestamp['upper_bound'])
                 output_file = os.path.join(output_dir, f"{word}_clip_{i + 1}.mp4")
+                if path not in videos:
+                    videos[path] = VideoFileClip(path)
     
-                trimmed_video = video.subclipped(start_time, end_time)
-                trimmed_video.write_videofile(output_file, codec="libx264", audio_codec="aac")
-                trimmed_video.close()
+                trimmed_video = videos[path].subclipped(start_time, end_time)
+                # moviepy encodes through an ffmpeg child process
+                with span('ffmpeg trim', 'ffmpeg', clip=os.path.basename(output_file)):
+                    trimmed_video.write_videofile(output_file, codec="libx264", audio_codec="aac")
+                # Not closed: a subclip shares the source's readers, which video.close() releases
                 
                 print(f"Created {output_file}")
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
         
-        video.close()
         return True
     
     except Exception as e:
@@ -157,6 +454,9 @@ def create_trimmed_videos(source_path, timestamps_dict, output_dir='.'):
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        for video in videos.values():
+            video.close()
 
 if __name__ == "__main__":
     # Default values
@@ -166,6 +466,7 @@ if __name__ == "__main__":
     keywords_csv = 'output.csv'
     captions_json = 'output.json'
     top_n = 5
+    workspace = '.output'
     
     # Parse command line arguments
     if len(sys.argv) > 1:
@@ -186,5 +487,7 @@ if __name__ == "__main__":
             top_n = int(sys.argv[6])
         except ValueError:
             print(f"Invalid top_n: {sys.argv[6]}. Using default: 5 keywords")
+    if len(sys.argv) > 7:
+        workspace = sys.argv[7]
     
-    process_video(youtube_url, time_range, output_dir, keywords_csv, captions_json, top_n)
\ No newline at end of file
+    process_video(youtube_url, time_range, output_dir, keywords_csv, captions_json, top_n, workspace)
\ No newline at end of file
@@ -6,6 +6,39 @@ import os
 import sys
 from collections import Counter
 from pymongo import MongoClient
+from transcript_store import load_transcript
+
+def extract_caption(captions_data, lower_bound=None, upper_bound=None):
+    """
+    Concatenates 'text' fields from in-memory transcript entries to form a caption.
+    If lower_bound and upper_bound are provided, only includes entries within that time range.
+    """
+    if hasattr(captions_data, 'window_text'):
+        # Memory-mapped transcript store: binary search instead of a full scan
+        if lower_bound is not None and upper_bound is not None:
+            return captions_data.window_text(lower_bound, upper_bound)
+        return ' '.join(captions_data.texts())
+
+    if lower_bound is not None and upper_bound is not None:
+        # Filter entries by timestamp if bounds are provided
+        filtered_entries = []
+        for entry in captions_data:
+            # Calculate end time by adding start + duration
+            if 'start' in entry and 'duration' in entry:
+                start_time = float(entry['start'])
+                end_time = start_time + float(entry['duration'])
+                
+                # Check if the entry falls within the bounds
+                # Use overlap logic: entry starts before upper_bound AND ends after lower_bound
+                if start_time <= upper_bound and end_time >= lower_bound:
+                    filtered_entries.append(entry)
+        
+        texts = [entry.get('text', '') for entry in filtered_entries if 'text' in entry]
+    else:
+        # If no bounds provided, use all entries
+        texts = [entry.get('text', '') for entry in captions_data if 'text' in entry]
+        
+    return ' '.join(texts)
 
 def extract_caption_from_json(file_path, lower_bound=None, upper_bound=None):
     """
@@ -16,28 +49,7 @@ def extract_caption_from_json(file_path, lower_bound=None, upper_bound=None):
     try:
         with open(file_path, 'r') as file:
             data = json.load(file)
-            
-            if lower_bound is not None and upper_bound is not None:
-                # Filter entries by timestamp if bounds are provided
-                filtered_entries = []
-                for entry in data:
-                    # Calculate end time by adding start + duration
-                    if 'start' in entry and 'duration' in entry:
-                        start_time = float(entry['start'])
-                        end_time = start_time + float(entry['duration'])
-                        
-                        # Check if the entry falls within the bounds
-                        # Use overlap logic: entry starts before upper_bound AND ends after lower_bound
-                        if start_time <= upper_bound and end_time >= lower_bound:
-                            filtered_entries.append(entry)
-                
-                texts = [entry.get('text', '') for entry in filtered_entries if 'text' in entry]
-            else:
-                # If no bounds provided, use all entries
-                texts = [entry.get('text', '') for entry in data if 'text' in entry]
-                
-            caption = ' '.join(texts)
-            return caption
+        return extract_caption(data, lower_bound, upper_bound)
     except FileNotFoundError:
         print(f"Error: The file {file_path} was not found.")
         return ""
@@ -75,7 +87,7 @@ def extract_frequent_names(transcript, min_mentions=2):
 
 def load_adjusted_timestamps(csv_path):
     """
-    Loads word, lower_bound, and upper_bound from the adjusted_timestamps.csv file.
+    Loads word, lower_bound, upper_bound and, when present, clip from the adjusted_timestamps.csv file.
     Returns a list of dictionaries containing this information.
     """
     try:
@@ -87,8 +99,9 @@ def load_adjusted_timestamps(csv_path):
             print(f"Error: Missing columns in timestamps CSV: {missing}")
             return []
             
-        # Convert DataFrame to list of dictionaries
-        timestamp_data = df[required_columns].to_dict('records')
+        # Convert DataFrame to list of dictionaries, keeping the clip names when present
+        columns = required_columns + (['clip'] if 'clip' in df.columns else [])
+        timestamp_data = df[columns].to_dict('records')
         return timestamp_data
     except FileNotFoundError:
         print(f"Error: The file {csv_path} was not found.")
@@ -229,11 +242,8 @@ def generate_youtube_metadata(caption, trending_words, frequent_names, word):
 def process_clips_and_generate_metadata(timestamps_csv, json_path, trending_csv, output_dir="clip_metadata"):
     """
     Processes each clip from the adjusted_timestamps.csv, extracts the relevant caption portion,
-    and generates metadata for each clip with naming convention word_clip_1.
+    and generates metadata for each clip, named like its clip file (word_clip_<n>).
     """
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
     # Load timestamp data
     timestamp_data = load_adjusted_timestamps(timestamps_csv)
     
@@ -241,25 +251,44 @@ def process_clips_and_generate_metadata(timestamps_csv, json_path, trending_csv,
         print("No timestamp data found. Exiting.")
         return
     
+    try:
+        captions_data = load_transcript(json_path)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error loading captions from {json_path}: {e}")
+        return
+    
     # Extract trending words from CSV
     trending_words = extract_trending_words(trending_csv)
     
+    return generate_metadata_for_clips(timestamp_data, captions_data, trending_words, output_dir)
+
+def generate_metadata_for_clips(timestamp_data, captions_data, trending_words, output_dir="clip_metadata", on_progress=None):
+    """
+    Generates metadata for each clip window using in-memory timestamps, transcript
+    entries and trending words, saving one JSON file per clip plus a combined file.
+    Calls on_progress(clips_done, clips_total) after each clip when given.
+    """
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    
     # Process each clip
     all_metadata = {}
     
-    for _, clip_data in enumerate(timestamp_data):
+    for clip_index, clip_data in enumerate(timestamp_data):
+        if on_progress:
+            on_progress(clip_index, len(timestamp_data))
         word = clip_data['word']
         lower_bound = clip_data['lower_bound']
         upper_bound = clip_data['upper_bound']
         
-        # Always use "_1" at the end of the clip ID
-        clip_id = f"{word}_clip_1"
+        # Same name as the clip file, so every clip of a word gets its own metadata
+        clip_id = clip_data.get('clip') or f"{word}_clip_1"
         
         print(f"Processing clip: {clip_id}")
         print(f"Time range: {lower_bound} to {upper_bound}")
         
         # Extract caption for this specific time range
-        caption = extract_caption_from_json(json_path, lower_bound, upper_bound)
+        caption = extract_caption(captions_data, lower_bound, upper_bound)
         
         if not caption:
             print(f"Warning: No caption extracted for clip {clip_id}. Skipping.")
@@ -0,0 +1,121 @@
+"""
+Span-based timeline tracing exported in the Chrome trace-event format.
+
+A Tracer collects complete ("X") events for stage functions, every ffmpeg
+child process, trend API requests and deliberate sleeps. The tracer for a
+job is activated in the worker running it, so the stage modules can call
+span() and run_command() without passing it around; outside an active
+tracer they behave like the plain operations they wrap.
+
+Open the resulting trace.json in chrome://tracing or https://ui.perfetto.dev
+to see where stages serialize and where the worker sits idle.
+"""
+
+import os
+import json
+import time
+import threading
+import subprocess
+import contextvars
+from contextlib import contextmanager
+
+_current_tracer = contextvars.ContextVar('ysg_tracer', default=None)
+
+class Tracer:
+    """
+    Records trace events for one job.
+
+    Args:
+        name (str): Shown as the process name in the trace viewer
+    """
+
+    def __init__(self, name='pipeline'):
+        self.name = name
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._threads = {}
+
+    def _now_us(self):
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    def _tid(self):
+        thread = threading.current_thread()
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads[thread.ident] = (len(self._threads) + 1, thread.name)
+            return self._threads[thread.ident][0]
+
+    def add_complete(self, name, cat, start_us, end_us, args=None):
+        event = {
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': 1, 'tid': self._tid(),
+            'ts': round(start_us, 3), 'dur': round(end_us - start_us, 3)
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, cat='function', **args):
+        start = self._now_us()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = repr(e)
+            raise
+        finally:
+            self.add_complete(name, cat, start, self._now_us(), args)
+
+    def to_dict(self):
+        with self._lock:
+            metadata = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': self.name}}]
+            for tid, thread_name in self._threads.values():
+                metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': thread_name}})
+            return {'traceEvents': metadata + sorted(self.events, key=lambda e: e['ts']), 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        return path
+
+@contextmanager
+def activate(tracer):
+    """Make tracer the current tracer for code running in this context"""
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+def current_tracer():
+    return _current_tracer.get()
+
+@contextmanager
+def span(name, cat='function', **args):
+    """Record a span on the current tracer, or do nothing when none is active"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, cat, **args) as span_args:
+        yield span_args
+
+def run_command(cmd, name=None, **kwargs):
+    """
+    subprocess.run() that records the child process as an 'ffmpeg'/'subprocess' span.
+
+    Args:
+        cmd (list): Command and arguments
+        name (str, optional): Span name; defaults to the program name
+        **kwargs: Passed through to subprocess.run
+
+    Returns:
+        subprocess.CompletedProcess
+    """
+    program = os.path.basename(cmd[0])
+    cat = 'ffmpeg' if program.startswith('ff') else 'subprocess'
+    with span(name or program, cat, argv=' '.join(cmd)) as span_args:
+        result = subprocess.run(cmd, **kwargs)
+        span_args['returncode'] = result.returncode
+    return result
@@ -0,0 +1,176 @@
+"""
+Batch transcript ingestion for many videos.
+
+Fetches transcripts for a list of URLs or IDs concurrently on a bounded
+worker pool, rate limited per remote host, and writes each one into the
+artifact cache under the same key the pipeline's captions stage uses. Jobs
+on those videos then start with their transcript already cached.
+
+Usage:
+    python transcript_batch.py urls.txt [--workers 8] [--rate 2] [--refresh]
+    python transcript_batch.py urls.txt --fetcher-url http://localhost:8000/transcripts
+    python caption_extractor.py --batch urls.txt
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from caption_extractor import resolve_video_id, YouTubeTranscriptFetcher, HttpTranscriptFetcher
+from artifact_cache import ArtifactCache, cache_from_env
+from rate_limit import HostRateLimiter
+from stage_graph import StageGraph
+from transcript_store import write_transcript_store, STORE_SUFFIX
+
+TRANSCRIPT_LANGUAGES = ['en']
+DEFAULT_WORKERS = 4
+# Requests per second allowed against each transcript host
+DEFAULT_HOST_RATES = {YouTubeTranscriptFetcher.host: 2.0}
+
+def captions_stage_params(video_key, languages=TRANSCRIPT_LANGUAGES):
+    """Parameters of the pipeline's 'captions' stage, shared so both write the same cache key"""
+    return {'video': video_key, 'languages': list(languages)}
+
+def transcript_fingerprint(video_key, languages=TRANSCRIPT_LANGUAGES):
+    graph = StageGraph()
+    graph.add('captions', None, params=captions_stage_params(video_key, languages))
+    return graph.fingerprint('captions')
+
+def ingest_transcript(video_url, cache, fetcher, rate_limiter, languages=TRANSCRIPT_LANGUAGES, refresh=False):
+    """
+    Fetch one transcript into the cache unless it is already there.
+
+    Returns:
+        dict: input, video_id, status ('cached', 'fetched' or 'failed') and details
+    """
+    result = {'input': video_url, 'video_id': resolve_video_id(video_url)}
+    video_id = result['video_id']
+    if not video_id:
+        return {**result, 'status': 'failed', 'error': 'Could not determine the video ID'}
+
+    params = {'fingerprint': transcript_fingerprint(video_id, languages)}
+    filename = 'transcript' + STORE_SUFFIX
+    if not refresh:
+        path = cache.get(video_id, 'transcript', params, filename)
+        if path:
+            return {**result, 'status': 'cached', 'path': path}
+
+    waited = rate_limiter.acquire(fetcher.host)
+    started = time.perf_counter()
+    try:
+        transcript = fetcher.fetch(video_id, languages=languages)
+    except Exception as e:
+        return {**result, 'status': 'failed', 'error': str(e), 'rate_limit_wait': round(waited, 3)}
+    if not transcript:
+        return {**result, 'status': 'failed', 'error': 'Empty transcript'}
+
+    staging = os.path.join(cache.root, video_id)
+    os.makedirs(staging, exist_ok=True)
+    tmp_path = os.path.join(staging, f".transcript-{uuid.uuid4().hex}{STORE_SUFFIX}")
+    write_transcript_store(transcript, tmp_path)
+    path = cache.put(video_id, 'transcript', params, tmp_path, filename=filename, move=True)
+    return {
+        **result, 'status': 'fetched', 'entries': len(transcript), 'path': path,
+        'fetch_seconds': round(time.perf_counter() - started, 3), 'rate_limit_wait': round(waited, 3)
+    }
+
+def ingest_transcripts(video_urls, cache, fetcher=None, max_workers=DEFAULT_WORKERS, rate_limiter=None,
+                       languages=TRANSCRIPT_LANGUAGES, refresh=False, on_progress=None):
+    """
+    Fetch transcripts for many videos concurrently and store them in the cache.
+
+    Args:
+        video_urls (list): YouTube URLs or video IDs; inputs naming the same video
+            (youtu.be/X, watch?v=X&t=1, X) are fetched once
+        cache (ArtifactCache): Cache that receives the transcripts
+        fetcher (optional): Object with a host attribute and fetch(video_id, languages);
+            defaults to YouTube
+        max_workers (int): Number of concurrent fetches
+        rate_limiter (HostRateLimiter, optional): Shared per-host limits;
+            defaults to DEFAULT_HOST_RATES
+        languages (list): Language codes to try, in order of preference
+        refresh (bool): Fetch again even when a transcript is cached
+        on_progress (callable, optional): Called as on_progress(done, total)
+
+    Returns:
+        list: One result dictionary per distinct video, in input order; 'input' is
+            the first input naming it. Inputs without a video ID are kept as given.
+    """
+    fetcher = fetcher or YouTubeTranscriptFetcher()
+    rate_limiter = rate_limiter or HostRateLimiter(DEFAULT_HOST_RATES)
+    # Key on the parsed video ID so different URL forms of one video share a fetch
+    inputs = {}
+    for url in (url.strip() for url in video_urls):
+        if url:
+            inputs.setdefault(resolve_video_id(url) or url, url)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcripts') as pool:
+        futures = {
+            pool.submit(ingest_transcript, url, cache, fetcher, rate_limiter, languages, refresh): key
+            for key, url in inputs.items()
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_progress:
+                on_progress(len(results), len(inputs))
+    return [results[key] for key in inputs]
+
+def read_url_list(path):
+    """Read URLs/IDs one per line from path ('-' for stdin), skipping blanks and # comments"""
+    handle = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        return [line.strip() for line in handle if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch transcripts for many videos into the artifact cache')
+    parser.add_argument('urls', nargs='+', help="Files with one URL or video ID per line ('-' for stdin)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent fetches')
+    parser.add_argument('--rate', type=float, help='Requests per second allowed against the transcript host')
+    parser.add_argument('--languages', default=','.join(TRANSCRIPT_LANGUAGES), help='Comma-separated language codes')
+    parser.add_argument('--fetcher-url', help='Fetch from an HTTP transcript service instead of YouTube')
+    parser.add_argument('--cache-dir', help='Artifact cache directory (default: ARTIFACT_CACHE_DIR)')
+    parser.add_argument('--refresh', action='store_true', help='Refetch transcripts that are already cached')
+    parser.add_argument('--output', help='Write the per-video results as JSON')
+    args = parser.parse_args(argv)
+
+    cache = ArtifactCache(args.cache_dir) if args.cache_dir else cache_from_env()
+    if cache is None:
+        print("Error: the artifact cache is disabled; set ARTIFACT_CACHE_DIR or pass --cache-dir")
+        return 1
+
+    fetcher = HttpTranscriptFetcher(args.fetcher_url) if args.fetcher_url else YouTubeTranscriptFetcher()
+    rates = dict(DEFAULT_HOST_RATES)
+    if args.rate:
+        rates[fetcher.host] = args.rate
+    video_urls = [url for path in args.urls for url in read_url_list(path)]
+
+    started = time.perf_counter()
+    results = ingest_transcripts(
+        video_urls, cache, fetcher=fetcher, max_workers=args.workers,
+        rate_limiter=HostRateLimiter(rates), languages=args.languages.split(','), refresh=args.refresh,
+        on_progress=lambda done, total: print(f"[{done}/{total}]", end='\r', flush=True)
+    )
+    elapsed = time.perf_counter() - started
+
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        if result['status'] == 'failed':
+            print(f"Failed {result['input']}: {result['error']}")
+    print(f"Ingested {len(results)} videos in {elapsed:.1f}s: "
+          + ', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if counts.get('failed') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
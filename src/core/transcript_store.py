@@ -0,0 +1,329 @@
+"""
+Compact binary transcript store with memory-mapped access.
+
+A transcript is written once as a single .ysgt file holding a small JSON
+header followed by 64-byte aligned numpy sections:
+
+    start, duration   float64 per entry
+    text_offsets      int64, len + 1 byte offsets into text
+    text              UTF-8 blob with every entry's text
+    token_offsets     int64, len + 1 offsets into token_ids
+    token_ids         int32 index into vocab for each lowercase word of each entry
+    vocab             sorted fixed-width unicode array of distinct lowercase words
+
+Opening a store parses only the header and maps the file, so it takes the
+same time for a two-minute clip as for a multi-hour stream. Sections are
+views on the mapping and pages are read when they are touched. A store
+behaves like the list of {'text', 'start', 'duration'} dictionaries that
+download_captions returns, so stages accept either.
+
+WordIndex is an inverted index over the token table: it maps each
+normalized word to every occurrence, with a word-level time interpolated
+inside the caption entry, so keyword lookups are dictionary hits rather than
+scans of the transcript text.
+"""
+
+import os
+import re
+import json
+import mmap
+import uuid
+import numpy as np
+
+MAGIC = b'YSGT\x00\x01\x00\x00'
+ALIGN = 64
+STORE_SUFFIX = '.ysgt'
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def tokenize(text):
+    """Lowercase whitespace tokens, the same split the keyword stages use"""
+    return [word.lower() for word in text.split()]
+
+def normalize_word(word):
+    """Strip punctuation and lowercase, matching how trend keywords are cleaned"""
+    return re.sub(r'[^\w]', '', word).lower()
+
+def _encode_tokens(transcript):
+    """Token table for entries: (token_offsets, token_ids, vocab array)"""
+    entry_tokens = [tokenize(entry['text']) for entry in transcript]
+    vocab_list = sorted({token for tokens in entry_tokens for token in tokens})
+    vocab_index = {token: i for i, token in enumerate(vocab_list)}
+    token_offsets = np.zeros(len(entry_tokens) + 1, dtype='<i8')
+    np.cumsum([len(tokens) for tokens in entry_tokens], out=token_offsets[1:])
+    token_ids = np.array([vocab_index[token] for tokens in entry_tokens for token in tokens], dtype='<i4')
+    width = max((len(token) for token in vocab_list), default=1)
+    return token_offsets, token_ids, np.array(vocab_list, dtype=f'<U{width}')
+
+def write_transcript_store(transcript, path):
+    """
+    Encode transcript entries into a .ysgt file at path.
+
+    Args:
+        transcript (list): Entries with 'text', 'start' and 'duration'
+        path (str): Destination file; written atomically
+
+    Returns:
+        str: path
+    """
+    start = np.array([float(entry['start']) for entry in transcript], dtype='<f8')
+    duration = np.array([float(entry['duration']) for entry in transcript], dtype='<f8')
+
+    encoded = [entry['text'].encode('utf-8') for entry in transcript]
+    text_offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(chunk) for chunk in encoded], out=text_offsets[1:])
+    text = np.frombuffer(b''.join(encoded), dtype='u1')
+
+    token_offsets, token_ids, vocab = _encode_tokens(transcript)
+
+    sections = [
+        ('start', start), ('duration', duration),
+        ('text_offsets', text_offsets), ('text', text),
+        ('token_offsets', token_offsets), ('token_ids', token_ids),
+        ('vocab', vocab),
+    ]
+    layout = {}
+    offset = 0
+    for name, array in sections:
+        layout[name] = {'dtype': array.dtype.str, 'count': int(array.size), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({
+        'count': len(transcript),
+        'sorted': bool(np.all(np.diff(start) >= 0)),
+        'max_duration': float(duration.max()) if len(duration) else 0.0,
+        'sections': layout
+    }).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in sections:
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        # Pad to the end of the last section so empty trailing sections stay in bounds
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return path
+
+class TranscriptStore:
+    """
+    Read-only, memory-mapped view of a .ysgt transcript.
+
+    Args:
+        path (str): File written by write_transcript_store
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._word_index = None
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a transcript store")
+        header_size = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], 'little')
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[header_start:header_start + header_size])
+        data_start = _align(header_start + header_size)
+        self._sections = {
+            name: np.frombuffer(self._mmap, dtype=spec['dtype'], count=spec['count'],
+                                offset=data_start + spec['offset'])
+            for name, spec in self.header['sections'].items()
+        }
+
+    def __len__(self):
+        return self.header['count']
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('transcript index out of range')
+        return {'text': self.text(index), 'start': float(self.start[index]), 'duration': float(self.duration[index])}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def start(self):
+        return self._sections['start']
+
+    @property
+    def duration(self):
+        return self._sections['duration']
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+    @property
+    def vocabulary(self):
+        """Sorted array of the distinct lowercase words in the transcript"""
+        return self._sections['vocab']
+
+    def text(self, index):
+        offsets = self._sections['text_offsets']
+        return self._sections['text'][offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+
+    def texts(self, indices=None):
+        indices = range(len(self)) if indices is None else indices
+        return [self.text(i) for i in indices]
+
+    def tokens(self, index):
+        offsets = self._sections['token_offsets']
+        return self.vocabulary[self._sections['token_ids'][offsets[index]:offsets[index + 1]]].tolist()
+
+    def word_id(self, word):
+        """Index of word in the vocabulary, or None if it never occurs"""
+        vocab = self.vocabulary
+        position = int(np.searchsorted(vocab, word))
+        if position < len(vocab) and vocab[position] == word:
+            return position
+        return None
+
+    def entries_with_token(self, word):
+        """Sorted indices of the entries that contain word as a whole token"""
+        word_id = self.word_id(word.lower())
+        if word_id is None:
+            return np.empty(0, dtype=np.int64)
+        positions = np.flatnonzero(self._sections['token_ids'] == word_id)
+        entries = np.searchsorted(self._sections['token_offsets'], positions, side='right') - 1
+        return np.unique(entries)
+
+    def window(self, lower_bound, upper_bound):
+        """Indices of entries overlapping [lower_bound, upper_bound], in transcript order"""
+        start = self.start
+        if self.header['sorted']:
+            hi = int(np.searchsorted(start, upper_bound, side='right'))
+            lo = int(np.searchsorted(start, lower_bound - self.header['max_duration'], side='left'))
+            return lo + np.flatnonzero(start[lo:hi] + self.duration[lo:hi] >= lower_bound)
+        return np.flatnonzero((start <= upper_bound) & (self.end >= lower_bound))
+
+    def window_text(self, lower_bound, upper_bound):
+        return ' '.join(self.texts(self.window(lower_bound, upper_bound)))
+
+    def word_index(self):
+        """Inverted word index for this transcript, built on first use"""
+        if self._word_index is None:
+            self._word_index = WordIndex(
+                self.start, self.duration, self._sections['token_offsets'],
+                self._sections['token_ids'], self.vocabulary
+            )
+        return self._word_index
+
+    def to_list(self):
+        return list(self)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({'text': self.texts(), 'start': self.start, 'duration': self.duration})
+
+def load_transcript(path):
+    """
+    Load a transcript from a .ysgt store or a JSON file.
+
+    Returns:
+        TranscriptStore or list: Either can be passed to the stage functions
+    """
+    if path.endswith(STORE_SUFFIX):
+        return TranscriptStore(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class WordIndex:
+    """
+    Inverted index from normalized word to its occurrences.
+
+    Each occurrence carries the caption entry it is in and an estimated
+    onset time, interpolated across the entry's start/duration by the
+    character position of the word in the line. Occurrences of a word are
+    kept in transcript order.
+
+    Args:
+        start, duration (ndarray): Per-entry timing
+        token_offsets (ndarray): len + 1 offsets into token_ids
+        token_ids (ndarray): Vocabulary index of every token
+        vocab (ndarray): Token strings
+    """
+
+    def __init__(self, start, duration, token_offsets, token_ids, vocab):
+        counts = np.diff(token_offsets)
+        token_entry = np.repeat(np.arange(len(counts)), counts)
+
+        # Interpolate each token's onset by its character position within the entry
+        token_chars = np.char.str_len(vocab)[token_ids] + 1 if len(vocab) else np.zeros(0, dtype=np.int64)
+        chars_before = np.concatenate(([0], np.cumsum(token_chars)))
+        entry_chars = chars_before[token_offsets]
+        line_chars = np.maximum(entry_chars[1:] - entry_chars[:-1] - 1, 1)
+        offset_in_line = chars_before[:-1] - entry_chars[:-1][token_entry]
+        token_time = start[token_entry] + duration[token_entry] * (offset_in_line / line_chars[token_entry])
+
+        # Group tokens by normalized word, keeping transcript order inside each group
+        words, vocab_word = np.unique([normalize_word(token) for token in vocab.tolist()], return_inverse=True)
+        token_word = vocab_word.reshape(-1)[token_ids] if len(token_ids) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(token_word, kind='stable')
+        self.entries = token_entry[order]
+        self.times = token_time[order]
+        bounds = np.searchsorted(token_word[order], np.arange(len(words) + 1))
+        self._words = words.tolist()
+        self._bounds = bounds
+        self._slices = {
+            word: (int(bounds[i]), int(bounds[i + 1]))
+            for i, word in enumerate(words.tolist()) if word
+        }
+
+    @classmethod
+    def from_entries(cls, transcript):
+        """Build an index for an in-memory list of transcript entries"""
+        start = np.array([float(entry['start']) for entry in transcript], dtype=float)
+        duration = np.array([float(entry['duration']) for entry in transcript], dtype=float)
+        token_offsets, token_ids, vocab = _encode_tokens(transcript)
+        return cls(start, duration, token_offsets, token_ids, vocab)
+
+    def __contains__(self, word):
+        return normalize_word(word) in self._slices
+
+    def __len__(self):
+        return len(self._slices)
+
+    def words(self):
+        return list(self._slices)
+
+    def occurrence_words(self):
+        """
+        Columnar view of the index for vectorized scoring.
+
+        Returns:
+            tuple: (words, word_ids) where words lists every normalized word
+                ('' for punctuation-only tokens) and word_ids[i] is the index in
+                words of the occurrence at entries[i] / times[i]
+        """
+        return self._words, np.repeat(np.arange(len(self._words)), np.diff(self._bounds))
+
+    def count(self, word):
+        lo, hi = self._slices.get(normalize_word(word), (0, 0))
+        return hi - lo
+
+    def occurrences(self, word):
+        """(entry_indices, onset_times) arrays for word, in transcript order"""
+        lo, hi = self._slices.get(normalize_word(word), (0, 0))
+        return self.entries[lo:hi], self.times[lo:hi]
+
+    def first(self, word):
+        """(entry_index, onset_time) of the first occurrence, or None"""
+        lo, hi = self._slices.get(normalize_word(word), (0, 0))
+        if lo == hi:
+            return None
+        return int(self.entries[lo]), float(self.times[lo])
+
+def build_word_index(transcript):
+    """Word index for a store (cached on it) or a list of entries"""
+    if isinstance(transcript, TranscriptStore):
+        return transcript.word_index()
+    return WordIndex.from_entries(transcript)
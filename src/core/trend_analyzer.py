@@ -1,36 +1,188 @@
 import pandas as pd
-from pytrends.request import TrendReq
-import time
 import json
 import os
-import sys
 import re
-import spacy
-from spacy.lang.en.stop_words import STOP_WORDS
+import sys
+import bisect
+import threading
+from collections import Counter
+from trend_backends import make_trend_backend, parse_regions, parse_timeframes, DEFAULT_REGIONS, DEFAULT_TIMEFRAMES
+from trend_fetcher import fetch_trend_scores, cache_series
+from keyword_ranker import rank_keywords, load_background, DEFAULT_TOP_K
+from transcript_store import normalize_word, build_word_index
+
+# spaCy and pytrends are imported on first use so importing this module stays cheap
+_nlp = None
+_nlp_lock = threading.Lock()
+# Keyword extraction needs POS tags, lemmas and entities, not the dependency parse
+SPACY_EXCLUDE = ['parser', 'senter']
+SPACY_BATCH_SIZE = 1000
+# Transcripts with at least this many entries are tagged in several processes
+SPACY_PARALLEL_MIN_ENTRIES = 2000
+# One process by default: forking spaCy workers from the threaded web server
+# is fragile and multiplies memory per job. CLI entry points opt in with
+# enable_parallel_tagging().
+SPACY_N_PROCESS = int(os.environ.get('SPACY_N_PROCESS', 1))
+PARALLEL_N_PROCESS = max(1, min(4, (os.cpu_count() or 1) // 2))
+# Parts of speech worth a trend query
+KEYWORD_POS = {'NOUN', 'PROPN', 'VERB', 'ADJ'}
+# Per-region score columns of the keyword table are named region:<code>
+REGION_PREFIX = 'region:'
+# keywords_df.attrs['trend_status']: every query answered, some chunks failed, had
+# no usable anchor or were skipped by the budget, or no trend data at all (local
+# ranking only)
+TREND_COMPLETE, TREND_PARTIAL, TREND_FALLBACK = 'complete', 'partial', 'fallback'
+
+def region_columns(keywords_df):
+    """region code -> column name for the per-region scores in a keyword table"""
+    return {
+        column[len(REGION_PREFIX):]: column
+        for column in keywords_df.columns if str(column).startswith(REGION_PREFIX)
+    }
+
+def mix_region_scores(keywords_df, region_weights=None):
+    """
+    Re-rank a keyword table by a weighted mix of its per-region scores.
+
+    Args:
+        keywords_df (DataFrame): Output of analyze_trends
+        region_weights (dict, optional): region -> weight; regions left out weigh 0.
+            None keeps the stored Value (an equal-weight mix).
 
-def analyze_trends(json_path='output.json', custom_stop_words_path='custom_stop_words.txt', output_path='output.csv'):
+    Returns:
+        DataFrame: Copy with Value replaced by the weighted mean over the regions
+            each keyword has scores for, sorted by it
+    """
+    columns = region_columns(keywords_df)
+    if not region_weights or not columns:
+        return keywords_df
+    weights = pd.Series({columns[region]: float(weight) for region, weight in region_weights.items() if region in columns})
+    if weights.empty or not weights.sum():
+        return keywords_df
+    scores = keywords_df[weights.index]
+    present = scores.notna().astype(float) * weights
+    mixed = (scores.fillna(0) * weights).sum(axis=1) / present.sum(axis=1).where(lambda total: total > 0)
+    mixed_df = keywords_df.copy()
+    mixed_df['Value'] = mixed
+    return mixed_df.dropna(subset=['Value']).sort_values('Value', ascending=False, kind='stable').reset_index(drop=True)
+
+def enable_parallel_tagging():
+    """Tag long transcripts in PARALLEL_N_PROCESS processes unless SPACY_N_PROCESS is set"""
+    global SPACY_N_PROCESS
+    if 'SPACY_N_PROCESS' not in os.environ:
+        SPACY_N_PROCESS = PARALLEL_N_PROCESS
+
+def load_nlp():
+    """Load the trimmed spaCy English pipeline once per process and return it"""
+    global _nlp
+    with _nlp_lock:
+        if _nlp is None:
+            import spacy
+            _nlp = spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDE)
+    return _nlp
+
+def extract_keywords(texts, nlp, stop_words, min_length=4):
+    """
+    Tag transcript lines in batches and group candidate words by lemma.
+
+    Args:
+        texts (list): Transcript line texts
+        nlp: spaCy pipeline from load_nlp
+        stop_words (set): Words never used as keywords
+        min_length (int): Shortest word kept
+
+    Returns:
+        tuple: (forms, entities) where forms maps each keyword to the normalized
+            surface forms it covers, most frequent first, and entities is the set
+            of keywords seen inside named entities. A keyword is its most frequent
+            surface form, so it can be looked up in the transcript.
+
+    Surface forms are the normalized whitespace tokens the word index is keyed
+    on, not spaCy's tokens: "Google's" and "e-mail" are one spaCy token each
+    for "Google" and "mail" but are indexed as "googles" and "email".
+    """
+    n_process = SPACY_N_PROCESS if len(texts) >= SPACY_PARALLEL_MIN_ENTRIES else 1
+    lemma_forms = {}
+    entity_lemmas = set()
+    for doc in nlp.pipe(texts, batch_size=SPACY_BATCH_SIZE, n_process=n_process):
+        # Group spaCy tokens by the whitespace token they fall in
+        spans = [match.span() for match in re.finditer(r'\S+', doc.text)]
+        span_starts = [start for start, _ in spans]
+        groups = {}
+        for token in doc:
+            if not token.is_space:
+                groups.setdefault(bisect.bisect_right(span_starts, token.idx) - 1, []).append(token)
+        for span, tokens in groups.items():
+            # Untagged pipelines (no tagger/lemmatizer) fall back to the word itself
+            if not any(not token.pos_ or token.pos_ in KEYWORD_POS for token in tokens):
+                continue
+            start, end = spans[span]
+            form = normalize_word(doc.text[start:end])
+            # Lemma of the word without punctuation and possessive endings: "Google's" -> google
+            lemma = normalize_word(''.join(
+                token.lemma_ for token in tokens if not token.is_punct and token.tag_ != 'POS'
+            )) or form
+            if len(form) < min_length or lemma in stop_words or form in stop_words:
+                continue
+            lemma_forms.setdefault(lemma, Counter())[form] += 1
+            if any(token.ent_type_ for token in tokens):
+                entity_lemmas.add(lemma)
+
+    forms = {}
+    entities = set()
+    for lemma, counts in lemma_forms.items():
+        ordered = [form for form, _ in counts.most_common()]
+        forms[ordered[0]] = ordered
+        if lemma in entity_lemmas:
+            entities.add(ordered[0])
+    return forms, entities
+
+def analyze_trends(json_path='output.json', custom_stop_words_path='custom_stop_words.txt', output_path='output.csv', caption_data=None, on_progress=None, trend_cache=None,
+                   backend=None, budget=None, rate_limiter=None, top_k=DEFAULT_TOP_K, regions=None, timeframes=None):
     """
     Analyze trends from caption data
     
     Args:
         json_path (str): Path to the caption JSON file
         custom_stop_words_path (str): Path to custom stop words file
-        output_path (str): Path to save the output CSV
+        output_path (str, optional): Path to save the output CSV. If None, nothing is written.
+        caption_data (list, optional): Transcript entries already in memory. When given,
+            json_path is not read.
+        on_progress (callable, optional): Called as on_progress(chunks_done, chunks_total)
+        trend_cache (TrendCache, optional): Persistent per-keyword scores; only keywords
+            missing from it are queried, and fresh scores are written back
+        backend (optional): Trend backend to query (see trend_backends); defaults to
+            TREND_BACKEND. Only cacheable (live) backends read and fill trend_cache.
+        budget (TrendBudget, optional): Request/time allowance for this call;
+            defaults to TREND_MAX_REQUESTS / TREND_TIME_BUDGET
+        rate_limiter (AdaptiveTokenBucket, optional): Defaults to the bucket shared
+            by all jobs using the same backend
+        top_k (int): Only the top_k candidates by local rank are sent to the backend
+        regions (list, optional): Google Trends geo codes; defaults to TREND_REGIONS
+        timeframes (list, optional): Trends timeframes; defaults to TREND_TIMEFRAMES.
+            A region's score is the mean over its timeframes.
+    
+    Returns:
+        DataFrame: Keywords sorted by score with 'Item', 'Value' (equal-weight mix of
+            the regions), 'Forms' (space-separated surface forms of the keyword's
+            lemma) and one 'region:<code>' score column per region. attrs['trend_status']
+            is TREND_COMPLETE, TREND_PARTIAL or TREND_FALLBACK.
     """
     # Load the caption data
-    with open(json_path, 'r') as file:
-        caption_data = json.load(file)
+    if caption_data is None:
+        with open(json_path, 'r') as file:
+            caption_data = json.load(file)
 
-    # Extract unique words from the JSON content
-    keywords = list(set(word.lower() for entry in caption_data if 'text' in entry for word in entry['text'].split()))
-    
-    # Set up regions for trend analysis
-    regions = ["IN"]
-    timeframe = "now 7-d"
+    # Set up regions and timeframes for trend analysis
+    regions = parse_regions(regions or DEFAULT_REGIONS)
+    timeframes = parse_timeframes(timeframes or DEFAULT_TIMEFRAMES)
+    all_series = [(region, timeframe) for region in regions for timeframe in timeframes]
 
     # Load spaCy for text processing
-    nlp = spacy.load("en_core_web_sm")
-    stop_words = STOP_WORDS
+    from spacy.lang.en.stop_words import STOP_WORDS
+    nlp = load_nlp()
+    # Copy so custom words never leak into spaCy's shared set across runs
+    stop_words = set(STOP_WORDS)
 
     # Load custom stop words
     if os.path.exists(custom_stop_words_path):
@@ -38,90 +190,95 @@ def analyze_trends(json_path='output.json', custom_stop_words_path='custom_stop_
             custom_stop_words = set(word.strip() for word in file.readlines())
         stop_words.update(custom_stop_words)
 
-    # Clean keywords
-    def clean_keyword(keyword):
-        keyword = re.sub(r'[^\w\s]', '', keyword)
-        keyword = keyword.lower()
-        if keyword in stop_words or len(keyword) <= 3:
-            return None
-        return keyword
-
-    keywords = {clean_keyword(kw) for kw in keywords if clean_keyword(kw)}
-    keywords = [k for k in keywords if k]  # Remove None values
-
-    # Function to chunk keywords for API requests
-    def chunk_keywords(keywords, chunk_size):
-        for i in range(0, len(keywords), chunk_size):
-            yield list(keywords)[i:i + chunk_size]
-
-    # Analyze search trends
-    def analyze_search_trends(keywords, regions, timeframe):
-        pytrends = TrendReq(hl='en-US', tz=360)
-        all_data = {}
-
-        keyword_chunks = list(chunk_keywords(keywords, chunk_size=4))
-        
-        flag = 0
-
-        for region in regions:
-            for chunk in keyword_chunks:
-                try:
-                    pytrends.build_payload(chunk, cat=0, timeframe=timeframe, geo=region, gprop='youtube')
-                    data = pytrends.interest_over_time()
-                    if not data.empty:
-                        if region not in all_data:
-                            all_data[region] = data
-                        else:
-                            all_data[region] = all_data[region].join(data, how='outer', rsuffix='_dup')
-                    
-                    time.sleep(5)
-                
-                except Exception as e:
-                    print(f"Error fetching data for {region} with keywords {chunk}: {e}")
-                    time.sleep(10)
-
-                finally:
-                    flag += 1
-                    if flag == 6:
-                        break
-        
-        return all_data
-
-    # Run the analysis
-    print(f"Analyzing trends for {len(keywords)} keywords...")
-    
-    # Limit to a reasonable number to avoid excessive API calls
-    if len(keywords) > 1000:
-        print(f"Limiting analysis to first 100 keywords out of {len(keywords)}")
-        keywords_list = list(keywords)[:1000]
+    # Lemmatize and POS-filter the transcript in batches so inflections share one query
+    if hasattr(caption_data, 'texts'):
+        texts = caption_data.texts()
     else:
-        keywords_list = list(keywords)
+        texts = [entry['text'] for entry in caption_data if 'text' in entry]
+    forms, entities = extract_keywords(texts, nlp, stop_words)
+    # Every keyword must be found in the transcript, or it can never get a clip
+    index = build_word_index(caption_data)
+    missing = [keyword for keyword in forms if keyword not in index]
+    if missing:
+        print(f"Dropping {len(missing)} keywords missing from the word index: {', '.join(sorted(missing)[:10])}")
+        forms = {keyword: word_forms for keyword, word_forms in forms.items() if keyword in index}
+
+    # Rank candidates locally so the trend budget goes to the most promising ones
+    ranked = rank_keywords(caption_data, forms, top_k=top_k, background=load_background(), entities=entities)
+    local_scores = dict(ranked)
+    keywords_list = [keyword for keyword, _ in ranked]
+    print(f"Analyzing trends for the top {len(keywords_list)} of {len(forms)} keywords...")
     
-    trend_data = analyze_search_trends(keywords_list, regions, timeframe)
+    backend = backend or make_trend_backend()
+    if not backend.cacheable:
+        trend_cache = None
+
+    # Reuse cached scores and only query the misses; cached scores share the anchor's scale
+    series_scores = {series: {} for series in all_series}
+    if trend_cache is not None:
+        for region, timeframe in all_series:
+            series_scores[(region, timeframe)] = trend_cache.get_many(keywords_list, region, cache_series(timeframe))
+    misses = {series: [k for k in keywords_list if k not in series_scores[series]] for series in all_series}
+    if trend_cache is not None:
+        cached_count = sum(len(scores) for scores in series_scores.values())
+        print(f"Trend cache: {cached_count} hits, {sum(len(m) for m in misses.values())} misses")
+
+    # Every region and timeframe is fetched concurrently through the shared rate limiter
+    fetched = fetch_trend_scores(
+        misses, backend, rate_limiter=rate_limiter, budget=budget, on_progress=on_progress
+    )
+    print(f"Trend requests ({backend.name}): {fetched['requests']} in {fetched['seconds']:.1f}s, "
+          f"{fetched['throttled']} rate limited, {fetched['failed']} failed chunks")
+    if fetched['unanchored']:
+        print(f"{fetched['unanchored']} chunks returned no usable anchor score and were dropped")
+    if fetched['stopped']:
+        skipped = sum(len(words) for words in fetched['skipped'].values())
+        print(f"Trend budget ({fetched['stopped']}) reached: {skipped} keyword queries were skipped")
+
+    for (region, timeframe), fresh_scores in fetched['scores'].items():
+        if not fresh_scores:
+            continue
+        series_scores[(region, timeframe)].update(fresh_scores)
+        if trend_cache is not None:
+            trend_cache.put_many(fresh_scores, region, cache_series(timeframe))
     
-    if not trend_data:
+    if not any(series_scores.values()):
         print("No trend data was retrieved.")
-        # Create a sample output for testing purposes
-        sorted_df = pd.DataFrame(
-            [(k, i) for i, k in enumerate(reversed(keywords_list[:20]), 1)],
-            columns=['Item', 'Value']
-        )
-        sorted_df.to_csv(output_path, index=False)
-        return
+        # Fall back to the local ranking
+        sorted_df = pd.DataFrame(ranked[:20], columns=['Item', 'Value'])
+        sorted_df['Forms'] = sorted_df['Item'].map(lambda keyword: ' '.join(forms[keyword]))
+        sorted_df.attrs['trend_status'] = TREND_FALLBACK
+        if output_path:
+            sorted_df.to_csv(output_path, index=False)
+        return sorted_df
     
-    # Process the trend data
-    df = pd.concat(trend_data.values(), keys=trend_data.keys(), names=["Region", "Date"])
+    # Keyword x (region, timeframe) table built once, then averaged over timeframes per region
+    table = pd.DataFrame({series: scores for series, scores in series_scores.items() if scores})
+    table.columns = pd.MultiIndex.from_tuples(table.columns, names=['region', 'timeframe'])
+    region_table = table.T.groupby(level='region').mean().T
+    region_table = region_table[[region for region in regions if region in region_table.columns]]
 
-    # Calculate the average of each column and store in a dictionary
-    average_dict = df.mean(numeric_only=True).to_dict()
-    sorted_average_dict = dict(sorted(average_dict.items(), key=lambda item: item[1], reverse=True))
-
-    # Convert the dictionary to a DataFrame
-    sorted_df = pd.DataFrame(sorted_average_dict.items(), columns=['Item', 'Value'])
+    sorted_df = pd.DataFrame({
+        'Item': region_table.index,
+        # Equal-weight mix over the regions each keyword has data for
+        'Value': region_table.mean(axis=1).round(3).to_numpy(),
+        'Forms': [' '.join(forms.get(keyword, [keyword])) for keyword in region_table.index],
+        'Local': [local_scores.get(keyword, 0) for keyword in region_table.index],
+    })
+    for region in region_table.columns:
+        sorted_df[REGION_PREFIX + region] = region_table[region].round(3).to_numpy()
+    # Equal trend scores are ordered by local rank
+    sorted_df = sorted_df.sort_values(['Value', 'Local'], ascending=False, kind='stable')
+    sorted_df = sorted_df.drop(columns=['Local']).reset_index(drop=True)
+    incomplete = fetched['failed'] or fetched['unanchored'] or fetched['stopped']
+    sorted_df.attrs['trend_status'] = TREND_PARTIAL if incomplete else TREND_COMPLETE
     
     # Export the DataFrame to a CSV file
-    sorted_df.to_csv(output_path, index=False)
-    print(f"Saved trend analysis to {output_path}")
+    if output_path:
+        sorted_df.to_csv(output_path, index=False)
+        print(f"Saved trend analysis to {output_path}")
+    
+    return sorted_df
 
 if __name__ == "__main__":
     json_path = 'output.json'
@@ -135,4 +292,5 @@ if __name__ == "__main__":
     if len(sys.argv) > 3:
         output_path = sys.argv[3]
     
+    enable_parallel_tagging()
     analyze_trends(json_path, custom_stop_words_path, output_path)
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Sources of keyword interest scores for the trend stage.
+
+A backend answers one request: the interest in up to a handful of keywords
+for one region and timeframe, as a keyword -> score dictionary. Keywords it
+has no data for are left out. It also declares how fast and how
+concurrently it may be called, which the trend fetcher uses to size its
+worker pool and rate limiter, and whether its scores belong in the shared
+trend cache. A backend signals that the service is rate limiting it by
+raising TrendsRateLimited.
+
+    pytrends    Google Trends through pytrends
+    replay      Scores recorded from earlier runs (see RecordingTrendsBackend)
+    synthetic   Deterministic hash-based scores with optional simulated
+                latency and 429s, for tests and load runs
+
+Backends are chosen per job by name (make_trend_backend) or with the
+TREND_BACKEND environment variable. Setting TREND_RECORD_PATH appends every
+live response to a replay file, so a run against Google can later be
+replayed offline.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+
+# Project root is 2 levels up from src/core/
+DEFAULT_REPLAY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "trend_replay.jsonl"
+)
+
+DEFAULT_REGIONS = os.environ.get('TREND_REGIONS', 'IN').split(',')
+DEFAULT_TIMEFRAMES = os.environ.get('TREND_TIMEFRAMES', 'now 7-d').split(',')
+# Google Trends geo codes: country, optionally with a subdivision (US-CA)
+_REGION_PATTERN = re.compile(r'^[A-Z]{2}(-[A-Z0-9]{1,3})?$')
+
+def parse_regions(value):
+    """
+    Normalize a region list given as a list or comma-separated string.
+    Raises ValueError for codes Google Trends would not accept.
+    """
+    items = value.split(',') if isinstance(value, str) else list(value)
+    regions = list(dict.fromkeys(str(item).strip().upper() for item in items if str(item).strip()))
+    if not regions:
+        raise ValueError("At least one region is required")
+    for region in regions:
+        if not _REGION_PATTERN.match(region):
+            raise ValueError(f"Invalid region code '{region}'")
+    return regions
+
+def parse_timeframes(value):
+    """Normalize a timeframe list given as a list or comma-separated string"""
+    items = value.split(',') if isinstance(value, str) else list(value)
+    timeframes = list(dict.fromkeys(str(item).strip() for item in items if str(item).strip()))
+    if not timeframes:
+        raise ValueError("At least one timeframe is required")
+    return timeframes
+
+class TrendsRateLimited(Exception):
+    """
+    Raised by a backend when the trends service answered 429.
+
+    Args:
+        retry_after (float, optional): Seconds the service asked us to wait
+    """
+
+    def __init__(self, message='Trends service rate limit exceeded', retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class PytrendsBackend:
+    """
+    Google Trends interest over time, averaged per keyword.
+
+    Args:
+        hl (str): Interface language sent to Google
+        tz (int): Timezone offset in minutes
+        gprop (str): Google property to search ('youtube', '' for web search)
+        rate (float): Requests per second to start at
+        max_concurrency (int): Requests in flight at once
+    """
+
+    name = 'pytrends'
+    host = 'trends.google.com'
+    cacheable = True
+
+    def __init__(self, hl='en-US', tz=360, gprop='youtube', rate=0.5, max_concurrency=2):
+        self.hl = hl
+        self.tz = tz
+        self.gprop = gprop
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        # TrendReq keeps per-payload state, so each worker thread gets its own
+        self._local = threading.local()
+
+    def _client(self):
+        if getattr(self._local, 'client', None) is None:
+            from pytrends.request import TrendReq
+            self._local.client = TrendReq(hl=self.hl, tz=self.tz)
+        return self._local.client
+
+    def interest(self, keywords, region, timeframe):
+        from pytrends.exceptions import ResponseError
+        client = self._client()
+        try:
+            client.build_payload(list(keywords), cat=0, timeframe=timeframe, geo=region, gprop=self.gprop)
+            data = client.interest_over_time()
+        except ResponseError as e:
+            response = getattr(e, 'response', None)
+            if response is not None and response.status_code == 429:
+                retry_after = response.headers.get('Retry-After')
+                raise TrendsRateLimited(str(e), float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise
+        if data.empty:
+            return {}
+        # isPartial flags incomplete periods and is not a keyword
+        data = data.drop(columns=['isPartial'], errors='ignore')
+        return data.mean(numeric_only=True).dropna().to_dict()
+
+class SyntheticTrendsBackend:
+    """
+    Deterministic local stand-in for Google Trends.
+
+    Scores are a stable hash of keyword and region, so repeated runs rank
+    keywords the same way. Each call sleeps for `latency`; when more than
+    `max_rate` calls arrive within one second the call raises
+    TrendsRateLimited, like Google's 429s.
+
+    Args:
+        latency (float): Seconds each request takes
+        max_rate (float, optional): Requests per second tolerated before 429s; None never limits
+        retry_after (float, optional): Retry-After hint attached to simulated 429s
+        rate (float): Requests per second the fetcher starts at
+        max_concurrency (int): Requests in flight at once
+    """
+
+    name = 'synthetic'
+    host = 'synthetic'
+    cacheable = False
+
+    def __init__(self, latency=0.0, max_rate=None, retry_after=None, rate=20.0, max_concurrency=4):
+        self.latency = latency
+        self.max_rate = max_rate
+        self.retry_after = retry_after
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.rejected = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def score(keyword, region):
+        digest = hashlib.sha1(f"{region}:{keyword}".encode('utf-8')).digest()
+        return round(int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF * 100, 2)
+
+    def interest(self, keywords, region, timeframe):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if self.max_rate is not None and len(self._recent) >= self.max_rate:
+                self.rejected += 1
+                raise TrendsRateLimited(retry_after=self.retry_after)
+            self._recent.append(now)
+        time.sleep(self.latency)
+        return {keyword: self.score(keyword, region) for keyword in keywords}
+
+class ReplayTrendsBackend:
+    """
+    Serves scores recorded by RecordingTrendsBackend.
+
+    The replay file holds one JSON response per line; the latest score for
+    each (keyword, region, timeframe) wins, regardless of which keywords it
+    was requested with. Keywords never recorded get no score.
+
+    Args:
+        path (str): Replay file (JSON lines)
+        max_concurrency (int): Requests in flight at once
+    """
+
+    name = 'replay'
+    host = 'replay'
+    cacheable = False
+    rate = 1000.0
+
+    def __init__(self, path=DEFAULT_REPLAY_PATH, max_concurrency=4):
+        self.path = path
+        self.max_concurrency = max_concurrency
+        self.scores = {}
+        if not os.path.exists(path):
+            raise ValueError(f"Trend replay file not found: {path}")
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                response = json.loads(line)
+                for keyword, score in response['scores'].items():
+                    self.scores[(keyword, response['region'], response['timeframe'])] = score
+
+    def interest(self, keywords, region, timeframe):
+        return {
+            keyword: self.scores[(keyword, region, timeframe)]
+            for keyword in keywords if (keyword, region, timeframe) in self.scores
+        }
+
+class RecordingTrendsBackend:
+    """
+    Wraps a backend and appends each of its responses to a replay file.
+
+    Args:
+        backend: Backend whose responses are recorded
+        path (str): Replay file to append to
+    """
+
+    def __init__(self, backend, path=DEFAULT_REPLAY_PATH):
+        self.backend = backend
+        self.path = path
+        self.name = backend.name
+        self.host = backend.host
+        self.cacheable = backend.cacheable
+        self.rate = backend.rate
+        self.max_concurrency = backend.max_concurrency
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def interest(self, keywords, region, timeframe):
+        scores = self.backend.interest(keywords, region, timeframe)
+        line = json.dumps({
+            'keywords': list(keywords), 'region': region, 'timeframe': timeframe,
+            'scores': scores, 'recorded_at': time.time()
+        })
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+        return scores
+
+def record_replay(responses, path=DEFAULT_REPLAY_PATH):
+    """
+    Write a replay file from (region, timeframe, {keyword: score}) tuples,
+    e.g. to build offline fixtures.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for region, timeframe, scores in responses:
+            f.write(json.dumps({
+                'keywords': list(scores), 'region': region, 'timeframe': timeframe, 'scores': scores
+            }) + '\n')
+    return path
+
+TREND_BACKENDS = {
+    'pytrends': PytrendsBackend,
+    'replay': ReplayTrendsBackend,
+    'synthetic': SyntheticTrendsBackend,
+}
+
+def normalize_trend_backend(value):
+    """Validate a backend name; None and '' mean the default from the environment"""
+    if value is None or value == '':
+        return None
+    name = str(value).strip().lower()
+    if name not in TREND_BACKENDS:
+        raise ValueError(f"Unknown trend backend '{value}'; expected one of: {', '.join(TREND_BACKENDS)}")
+    return name
+
+def make_trend_backend(name=None, **options):
+    """
+    Build a backend by name. None uses TREND_BACKEND (default 'pytrends').
+    The replay backend reads TREND_REPLAY_PATH unless a path is given, and
+    TREND_RECORD_PATH wraps the backend in a RecordingTrendsBackend.
+    """
+    name = normalize_trend_backend(name) or normalize_trend_backend(os.environ.get('TREND_BACKEND')) or 'pytrends'
+    if name == 'replay':
+        options.setdefault('path', os.environ.get('TREND_REPLAY_PATH') or DEFAULT_REPLAY_PATH)
+    backend = TREND_BACKENDS[name](**options)
+    record_path = os.environ.get('TREND_RECORD_PATH')
+    if record_path and name != 'replay':
+        backend = RecordingTrendsBackend(backend, record_path)
+    return backend
@@ -0,0 +1,108 @@
+"""
+Persistent cache of Google Trends interest scores.
+
+Scores are stored per (keyword, region, timeframe) in a SQLite database, so
+common words that appear in many videos are only queried once per TTL
+instead of once per job. The database runs in WAL mode and can be shared by
+several worker threads and processes. Hit and miss counters are kept per
+process and exported on /metrics.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+DEFAULT_TTL = 24 * 3600
+# Project root is 2 levels up from src/core/
+DEFAULT_TREND_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "trends.sqlite"
+)
+# SQLite's default limit on host parameters is 999
+_QUERY_BATCH = 500
+
+class TrendCache:
+    """
+    Args:
+        path (str): SQLite database file, created if missing
+        ttl (float): Seconds after which a stored score is treated as a miss
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS trend_scores ("
+                " keyword TEXT NOT NULL, region TEXT NOT NULL, timeframe TEXT NOT NULL,"
+                " score REAL NOT NULL, fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (keyword, region, timeframe))"
+            )
+
+    def get_many(self, keywords, region, timeframe):
+        """
+        Look up fresh scores for keywords.
+
+        Returns:
+            dict: keyword -> score for every hit; missing keywords are misses
+        """
+        keywords = list(dict.fromkeys(keywords))
+        cutoff = time.time() - self.ttl
+        found = {}
+        with self._lock:
+            for i in range(0, len(keywords), _QUERY_BATCH):
+                batch = keywords[i:i + _QUERY_BATCH]
+                rows = self._conn.execute(
+                    "SELECT keyword, score FROM trend_scores"
+                    " WHERE region = ? AND timeframe = ? AND fetched_at >= ?"
+                    f" AND keyword IN ({','.join('?' * len(batch))})",
+                    [region, timeframe, cutoff] + batch
+                )
+                found.update(rows)
+            self.hits += len(found)
+            self.misses += len(keywords) - len(found)
+        return found
+
+    def put_many(self, scores, region, timeframe):
+        """Store keyword -> score for one region and timeframe"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO trend_scores (keyword, region, timeframe, score, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(keyword, region, timeframe, float(score), now) for keyword, score in scores.items()]
+            )
+
+    def purge_expired(self):
+        """Delete scores older than the TTL. Returns the number of rows removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM trend_scores WHERE fetched_at < ?", (time.time() - self.ttl,))
+            return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM trend_scores").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'entries': entries
+            }
+
+def trend_cache_from_env():
+    """
+    Build the trend cache from TREND_CACHE_PATH / TREND_CACHE_TTL.
+    Setting TREND_CACHE_PATH to an empty string disables it.
+    """
+    path = os.environ.get('TREND_CACHE_PATH', DEFAULT_TREND_CACHE_PATH)
+    if not path:
+        return None
+    return TrendCache(path, ttl=float(os.environ.get('TREND_CACHE_TTL', DEFAULT_TTL)))
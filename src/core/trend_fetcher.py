@@ -0,0 +1,259 @@
+"""
+Concurrent, rate-limited trend score fetching under a per-job budget.
+
+Keywords are split into payload-sized chunks per (region, timeframe) series
+and fetched on a small worker pool sized by the backend's max_concurrency. All workers draw from one
+AdaptiveTokenBucket per backend host, shared by every job in the process,
+which halves its rate when the service answers 429 and creeps back up while
+requests succeed. A rate-limited chunk is retried after the backoff.
+
+Each job gets a TrendBudget: a cap on requests (retries included) and on
+wall-clock seconds. Once it is spent the remaining chunks are not queried
+and their keywords are reported as skipped, instead of being silently
+dropped after a fixed number of chunks.
+
+Google Trends scales every payload on its own (its top keyword is 100), so
+raw scores from different chunks are not comparable. Every payload therefore
+also carries a fixed anchor keyword, and each chunk is rescaled so the anchor
+scores ANCHOR_SCORE. Scores are then relative to the anchor's interest and
+comparable across chunks, jobs and the trend cache. The anchor is a
+mid-volume term: next to a very popular one, long-tail transcript keywords
+round to 0 or 1 and their ranking collapses into ties. A chunk whose anchor
+is missing or scores below ANCHOR_MIN has no scale, so like a failed chunk
+its scores are dropped rather than mixed with scaled ones. Results are written into
+preallocated (chunk x slot) arrays as they arrive and normalized in one
+vectorized pass at the end.
+"""
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import zip_longest
+
+from rate_limit import AdaptiveTokenBucket
+from trend_backends import TrendsRateLimited
+from tracing import span
+
+# Google Trends compares at most five keywords per payload: four plus the anchor
+CHUNK_SIZE = 4
+# Keyword sent with every payload to put chunks on one scale; '' disables anchoring
+DEFAULT_ANCHOR = os.environ.get('TREND_ANCHOR', 'podcast')
+ANCHOR_SCORE = 100.0
+# Google rounds interest to integers, so an anchor averaging under 1 gives no usable scale
+ANCHOR_MIN = 1.0
+DEFAULT_MAX_REQUESTS = 30
+DEFAULT_TIME_BUDGET = 60.0
+# Retries of a chunk that was answered with 429
+MAX_RETRIES = 3
+# Seconds every worker pauses after a 429 that carries no Retry-After
+DEFAULT_BACKOFF = 10.0
+
+class TrendBudget:
+    """
+    Request and time allowance for the trend queries of one job.
+
+    Args:
+        max_requests (int, optional): Requests allowed, retries included; None for no limit
+        max_seconds (float, optional): Wall-clock seconds allowed; None for no limit
+    """
+
+    def __init__(self, max_requests=DEFAULT_MAX_REQUESTS, max_seconds=DEFAULT_TIME_BUDGET):
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+        self.requests = 0
+        self._started = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Reset the counters; called when a fetch begins"""
+        with self._lock:
+            self.requests = 0
+            self._started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self._started if self._started is not None else 0.0
+
+    def exhausted(self):
+        """'requests' or 'time' once that limit is reached, otherwise None"""
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            return 'requests'
+        if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+            return 'time'
+        return None
+
+    def take(self):
+        """Count one request. Returns False, counting nothing, when the budget is spent."""
+        with self._lock:
+            if self.exhausted():
+                return False
+            self.requests += 1
+            return True
+
+    def to_dict(self):
+        return {'max_requests': self.max_requests, 'max_seconds': self.max_seconds}
+
+def _limit(value, cast):
+    """Parse a budget limit; empty, zero or negative means no limit"""
+    if value is None or value == '':
+        return None
+    value = cast(value)
+    return value if value > 0 else None
+
+def trend_budget_from_env(max_requests=None, max_seconds=None):
+    """
+    Build a TrendBudget from TREND_MAX_REQUESTS / TREND_TIME_BUDGET.
+    Explicit arguments override the environment.
+    """
+    if max_requests is None:
+        max_requests = os.environ.get('TREND_MAX_REQUESTS', DEFAULT_MAX_REQUESTS)
+    if max_seconds is None:
+        max_seconds = os.environ.get('TREND_TIME_BUDGET', DEFAULT_TIME_BUDGET)
+    return TrendBudget(_limit(max_requests, int), _limit(max_seconds, float))
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def shared_rate_limiter(backend):
+    """The adaptive bucket for backend's host, shared by every job in this process"""
+    with _rate_limiters_lock:
+        if backend.host not in _rate_limiters:
+            _rate_limiters[backend.host] = AdaptiveTokenBucket(backend.rate)
+        return _rate_limiters[backend.host]
+
+def cache_series(timeframe, anchor=DEFAULT_ANCHOR):
+    """Trend cache timeframe key; scores normalized to different anchors are kept apart"""
+    return f"{timeframe}|anchor={anchor}" if anchor else timeframe
+
+def chunk_keywords(keywords, chunk_size=CHUNK_SIZE):
+    keywords = list(keywords)
+    return [keywords[i:i + chunk_size] for i in range(0, len(keywords), chunk_size)]
+
+def fetch_trend_scores(keywords_by_series, backend, rate_limiter=None, budget=None,
+                       chunk_size=CHUNK_SIZE, backoff=DEFAULT_BACKOFF, max_retries=MAX_RETRIES,
+                       anchor=DEFAULT_ANCHOR, on_progress=None):
+    """
+    Query interest scores for keywords in each region and timeframe within a budget.
+
+    Args:
+        keywords_by_series (dict): (region, timeframe) -> keywords to score, e.g.
+            {('IN', 'now 7-d'): [...], ('US', 'now 7-d'): [...]}
+        backend: Trend backend (see trend_backends)
+        rate_limiter (AdaptiveTokenBucket, optional): Defaults to the shared bucket for the backend
+        budget (TrendBudget, optional): Defaults to trend_budget_from_env()
+        chunk_size (int): Keywords per request
+        backoff (float): Pause after a 429 without Retry-After
+        max_retries (int): Retries of a rate-limited chunk
+        anchor (str, optional): Keyword added to every payload to normalize chunks;
+            None or '' leaves scores as the backend returned them
+        on_progress (callable, optional): Called as on_progress(chunks_done, chunks_total)
+
+    Returns:
+        dict: scores ((region, timeframe) -> keyword -> score), skipped ((region,
+            timeframe) -> keywords not queried), requests, throttled, failed (chunk count), unanchored (fetched
+            chunks without a usable anchor score, whose scores are dropped), stopped ('requests',
+            'time' or None) and seconds
+    """
+    # numpy is imported here so the web app can import the budget helpers without it
+    import numpy as np
+    rate_limiter = rate_limiter or shared_rate_limiter(backend)
+    budget = budget or trend_budget_from_env()
+    budget.start()
+
+    # The anchor is in every payload, so it is never queried as a keyword of its own
+    anchored_series = {series for series, keywords in keywords_by_series.items() if anchor and anchor in keywords}
+    keywords_by_series = {
+        series: [keyword for keyword in keywords if keyword != anchor]
+        for series, keywords in keywords_by_series.items()
+    }
+
+    # Interleave series so a tight budget is spread over all regions and timeframes
+    per_series = [[(series, chunk) for chunk in chunk_keywords(keywords, chunk_size)]
+                  for series, keywords in keywords_by_series.items()]
+    tasks = [task for group in zip_longest(*per_series) for task in group if task]
+
+    result = {
+        'scores': {series: {} for series in keywords_by_series},
+        'skipped': {series: [] for series in keywords_by_series},
+        'requests': 0, 'throttled': 0, 'failed': 0, 'unanchored': 0, 'stopped': None, 'seconds': 0.0
+    }
+    if not tasks:
+        return result
+    counts_lock = threading.Lock()
+
+    # Columnar buffers, one row per chunk: raw scores by slot and the chunk's anchor score
+    raw = np.full((len(tasks), chunk_size), np.nan)
+    anchor_raw = np.full(len(tasks), np.nan)
+    fetched = np.zeros(len(tasks), dtype=bool)
+
+    def fetch_chunk(series, chunk):
+        region, timeframe = series
+        payload = [anchor] + chunk if anchor else chunk
+        for attempt in range(max_retries + 1):
+            if budget.exhausted():
+                return 'skipped', None
+            rate_limiter.acquire()
+            if not budget.take():
+                return 'skipped', None
+            try:
+                with span('trends request', 'network', backend=backend.name, region=region,
+                          timeframe=timeframe, keywords=payload, attempt=attempt):
+                    scores = backend.interest(payload, region, timeframe)
+            except TrendsRateLimited as e:
+                with counts_lock:
+                    result['throttled'] += 1
+                rate_limiter.throttle(e.retry_after or backoff)
+                continue
+            except Exception as e:
+                print(f"Error fetching data for {region} with keywords {payload}: {e}")
+                return 'failed', None
+            rate_limiter.recover()
+            return 'fetched', scores
+        print(f"Giving up on {region} keywords {payload} after {max_retries + 1} rate-limited attempts")
+        return 'failed', None
+
+    with ThreadPoolExecutor(max_workers=max(1, backend.max_concurrency), thread_name_prefix='trends') as pool:
+        # Copy the context per task so spans land on the job's tracer
+        futures = {
+            pool.submit(contextvars.copy_context().run, fetch_chunk, series, chunk): row
+            for row, (series, chunk) in enumerate(tasks)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            row = futures[future]
+            series, chunk = tasks[row]
+            status, scores = future.result()
+            if status == 'fetched':
+                fetched[row] = True
+                raw[row, :len(chunk)] = [scores.get(keyword, np.nan) for keyword in chunk]
+                if anchor:
+                    anchor_raw[row] = scores.get(anchor, np.nan)
+            elif status == 'skipped':
+                result['skipped'][series].extend(chunk)
+            else:
+                result['failed'] += 1
+            if on_progress:
+                on_progress(done, len(tasks))
+
+    # Rescale every chunk so its anchor scores ANCHOR_SCORE, all at once; a chunk
+    # without a usable anchor (missing, or rounded to about 0) is dropped
+    has_anchor = ~np.isnan(anchor_raw) & (np.nan_to_num(anchor_raw) >= ANCHOR_MIN)
+    scale = np.ones(len(tasks))
+    scale[has_anchor] = ANCHOR_SCORE / anchor_raw[has_anchor]
+    if anchor:
+        scale[~has_anchor] = np.nan
+    normalized = raw * scale[:, None]
+    result['unanchored'] = int(np.count_nonzero(fetched & ~has_anchor)) if anchor else 0
+
+    for row, slot in zip(*np.nonzero(~np.isnan(normalized))):
+        series, chunk = tasks[row]
+        result['scores'][series][chunk[slot]] = round(float(normalized[row, slot]), 3)
+    for series in anchored_series:
+        if any(has_anchor[row] for row, (task_series, _) in enumerate(tasks) if task_series == series):
+            result['scores'][series][anchor] = ANCHOR_SCORE
+
+    result['requests'] = budget.requests
+    result['seconds'] = round(budget.elapsed(), 3)
+    if any(result['skipped'].values()):
+        result['stopped'] = budget.exhausted()
+    return result
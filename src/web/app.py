@@ -1,19 +1,25 @@
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, abort
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, abort, Response
 from flask_cors import CORS
 import os
 import subprocess
 import sys
 import json
-import pandas as pd
-import glob
 import zipfile
-import shutil
 from datetime import datetime
-import threading
-import time
 
-# Add the src directory to the Python path
+# Add the src and src/core directories to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+# Only lightweight modules are imported at boot; the pipeline and its heavy
+# libraries (pandas, spaCy, moviepy, OpenCV, pytrends) load in the workers
+from artifact_cache import cache_from_env
+from trend_cache import trend_cache_from_env
+from trend_fetcher import trend_budget_from_env
+from trend_backends import normalize_trend_backend, parse_regions, parse_timeframes
+from profiling import normalize_profile_mode
+from metrics import REGISTRY
+from web.jobs import JobManager
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
@@ -23,30 +29,22 @@ CORS(app)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 UPLOAD_FOLDER = os.path.join(PROJECT_ROOT, 'uploads')
 OUTPUT_FOLDER = os.path.join(PROJECT_ROOT, '.output')
+JOBS_FOLDER = os.path.join(OUTPUT_FOLDER, 'jobs')
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', 2))
+# Seconds between SSE keep-alive comments and the upper bound for long-poll waits
+EVENTS_KEEPALIVE = 15
+LONG_POLL_MAX_WAIT = 30
+# Import the pipeline on the worker pool right after boot (PRELOAD_PIPELINE=0 to disable)
+PRELOAD_PIPELINE = os.environ.get('PRELOAD_PIPELINE', '1') != '0'
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Global variable to track processing status
-processing_status = {
-    'is_processing': False,
-    'current_step': '',
-    'progress': 0,
-    'message': '',
-    'error': None
-}
-
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def clean_output_directory():
-    """Clean the output directory before processing"""
-    if os.path.exists(OUTPUT_FOLDER):
-        shutil.rmtree(OUTPUT_FOLDER)
-    os.makedirs(OUTPUT_FOLDER)
-
 def check_ollama_available():
     """Check if Ollama is available for title generation"""
     try:
@@ -56,162 +54,42 @@ def check_ollama_available():
     except:
         return False
 
-def process_youtube_shorts(youtube_url, top_n, time_range):
-    """Main processing function that runs the YouTube shorts generation workflow"""
-    global processing_status
-    
-    try:
-        processing_status['is_processing'] = True
-        processing_status['error'] = None
-        processing_status['progress'] = 0
-        
-        # Step 1: Extract captions
-        processing_status['current_step'] = 'Extracting captions...'
-        processing_status['progress'] = 10
-        caption_output = os.path.join(OUTPUT_FOLDER, "captions.txt")
-        
-        result = subprocess.run([
-            sys.executable, "src/core/caption_extractor.py", 
-            youtube_url, caption_output
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Caption extraction failed: {result.stderr}")
-        
-        # Step 2: Create custom stop words if not exists
-        processing_status['current_step'] = 'Setting up analysis...'
-        processing_status['progress'] = 20
-        custom_stop_words_path = os.path.join(PROJECT_ROOT, "config", "custom_stop_words.txt")
-        if not os.path.exists(custom_stop_words_path):
-            with open(custom_stop_words_path, 'w') as f:
-                default_stop_words = [
-                    "the", "and", "a", "to", "of", "in", "is", "it", "that", "you", 
-                    "for", "on", "with", "as", "are", "be", "this", "was", "have", "by",
-                    "um", "uh", "ah", "oh", "mm", "hmm", "gonna", "wanna", "like", "just"
-                ]
-                f.write("\n".join(default_stop_words))
-        
-        # Step 3: Analyze trends
-        processing_status['current_step'] = 'Analyzing keyword trends...'
-        processing_status['progress'] = 30
-        json_path = os.path.join(OUTPUT_FOLDER, "captions.txt.json")
-        output_csv = os.path.join(OUTPUT_FOLDER, "keywords.csv")
-        
-        result = subprocess.run([
-            sys.executable, "src/core/trend_analyzer.py",
-            json_path, custom_stop_words_path, output_csv
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Trend analysis failed: {result.stderr}")
-        
-        # Step 4: Process video segments
-        processing_status['current_step'] = 'Processing video segments...'
-        processing_status['progress'] = 50
-        clips_dir = os.path.join(OUTPUT_FOLDER, "clips")
-        
-        result = subprocess.run([
-            sys.executable, "src/core/timestamp.py",
-            youtube_url, str(time_range), clips_dir,
-            output_csv, json_path, str(top_n)
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Video processing failed: {result.stderr}")
-        
-        # Step 5: Reframe clips to meme-style
-        processing_status['current_step'] = 'Reframing video clips...'
-        processing_status['progress'] = 70
-        process_all_clips(clips_dir)
-        
-        # Step 6: Add captions to clips
-        processing_status['current_step'] = 'Adding captions to clips...'
-        processing_status['progress'] = 80
-        result = subprocess.run([sys.executable, "src/core/captions.py"], 
-                              capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            print(f"Captioning failed: {result.stderr}")
-        
-        # Step 7: Generate titles and metadata (only if Ollama is available)
-        if check_ollama_available():
-            processing_status['current_step'] = 'Generating titles and metadata...'
-            processing_status['progress'] = 90
-            adjusted_timestamps_csv = os.path.join(OUTPUT_FOLDER, "adjusted_timestamps.csv")
-            metadata_dir = os.path.join(OUTPUT_FOLDER, "metadata")
-            
-            result = subprocess.run([
-                sys.executable, "src/core/title_generation.py",
-                adjusted_timestamps_csv, json_path, output_csv, metadata_dir
-            ], capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                print(f"Title generation failed: {result.stderr}")
-        else:
-            processing_status['current_step'] = 'Skipping metadata generation (Ollama not available)...'
-            processing_status['progress'] = 90
-            # Create a simple metadata directory with basic info
-            metadata_dir = os.path.join(OUTPUT_FOLDER, "metadata")
-            os.makedirs(metadata_dir, exist_ok=True)
-            
-            # Create basic metadata files for clips
-            clips_dir = os.path.join(OUTPUT_FOLDER, "clips")
-            if os.path.exists(clips_dir):
-                for clip_file in os.listdir(clips_dir):
-                    if clip_file.endswith('.mp4'):
-                        clip_name = clip_file.replace('.mp4', '')
-                        metadata = {
-                            "title": f"YouTube Short - {clip_name.replace('_', ' ').title()}",
-                            "description": f"Generated YouTube Short from {clip_name}",
-                            "tags": ["youtube shorts", "generated", clip_name.lower()]
-                        }
-                        
-                        metadata_file = os.path.join(metadata_dir, f"{clip_name}_metadata.json")
-                        with open(metadata_file, 'w') as f:
-                            json.dump(metadata, f, indent=2)
-        
-        processing_status['current_step'] = 'Processing complete!'
-        processing_status['progress'] = 100
-        processing_status['message'] = 'YouTube shorts generation completed successfully!'
-        
-    except Exception as e:
-        processing_status['error'] = str(e)
-        processing_status['message'] = f'Error: {str(e)}'
-    finally:
-        processing_status['is_processing'] = False
-
-def process_all_clips(folder):
-    """Process all mp4 files in the given folder by applying scaling and padding filter"""
-    vf_filter = (
-        "scale='if(gt(a,4/3),ih*4/3,iw)':'if(lt(a,4/3),iw*3/4,ih)',"
-        "pad=w=iw:h=iw*16/9:x=0:y=(oh-ih)/2:color=black"
-    )
-    
-    mp4_files = glob.glob(os.path.join(folder, "*.mp4"))
-    if not mp4_files:
-        print("No mp4 files found in the folder to process for reframing.")
-        return
-    
-    for file_path in mp4_files:
-        directory, filename = os.path.split(file_path)
-        name, ext = os.path.splitext(filename)
-        temp_output = os.path.join(directory, f"{name}_temp{ext}")
-        
-        cmd = [
-            "ffmpeg",
-            "-i", file_path,
-            "-vf", vf_filter,
-            "-c:a", "copy",
-            temp_output
-        ]
-        
-        try:
-            subprocess.run(cmd, capture_output=True, text=True, check=True)
-            os.replace(temp_output, file_path)
-        except subprocess.CalledProcessError as e:
-            print(f"Error during reframing {file_path}: {e}")
-        except Exception as e:
-            print(f"Error replacing file {file_path}: {str(e)}")
+# Transcripts, keyword scores and source videos shared by all jobs
+artifact_cache = cache_from_env()
+# Per-keyword trend scores shared by all jobs and videos
+trend_cache = trend_cache_from_env()
+
+def process_youtube_shorts(job, on_progress):
+    """Run the YouTube shorts generation workflow for a job inside its workspace"""
+    from pipeline import Pipeline
+    params = job.params
+    trend_budget = trend_budget_from_env(params.get('trend_max_requests'), params.get('trend_time_budget'))
+    pipeline = Pipeline(job.workspace, on_progress=on_progress, cache=artifact_cache,
+                        profile=params.get('profile'), trend_cache=trend_cache, trend_budget=trend_budget,
+                        trend_backend=params.get('trend_backend'), trend_regions=params.get('trend_regions'),
+                        trend_timeframes=params.get('trend_timeframes'))
+    pipeline.run(params['youtube_url'], top_n=params['top_n'], time_range=params['time_range'],
+                 generate_titles=check_ollama_available(), region_weights=params.get('region_weights'))
+
+def warm_up_workers():
+    """Pay the pipeline import and spaCy model load once, off the request path"""
+    from pipeline import warm_up
+    warm_up()
+
+job_manager = JobManager(JOBS_FOLDER, process_youtube_shorts, max_workers=MAX_CONCURRENT_JOBS,
+                         warm_up=warm_up_workers if PRELOAD_PIPELINE else None)
+
+def get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+def get_latest_job_or_404():
+    job = job_manager.latest()
+    if job is None:
+        abort(404)
+    return job
 
 @app.route('/')
 def index():
@@ -221,11 +99,6 @@ def index():
 @app.route('/process', methods=['POST'])
 def process_video():
     """Handle video processing request"""
-    global processing_status
-    
-    if processing_status['is_processing']:
-        return jsonify({'error': 'Already processing a video. Please wait.'}), 400
-    
     data = request.get_json()
     youtube_url = data.get('youtube_url', '').strip()
     top_n = int(data.get('top_n', 5))
@@ -233,36 +106,117 @@ def process_video():
     
     if not youtube_url:
         return jsonify({'error': 'YouTube URL is required'}), 400
+
+    # Optional per-job profiling and trend backend; None falls back to YSG_PROFILE / TREND_BACKEND
+    try:
+        profile = normalize_profile_mode(data['profile']) if 'profile' in data else None
+        trend_backend = normalize_trend_backend(data.get('trend_backend'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Optional per-job trend budget; unset values fall back to TREND_MAX_REQUESTS / TREND_TIME_BUDGET
+    try:
+        trend_max_requests = int(data['trend_max_requests']) if data.get('trend_max_requests') is not None else None
+        trend_time_budget = float(data['trend_time_budget']) if data.get('trend_time_budget') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'trend_max_requests and trend_time_budget must be numbers'}), 400
+
+    # Optional regions and timeframes to score keywords in, and how to weigh the regions
+    # when picking clips; unset values fall back to TREND_REGIONS / TREND_TIMEFRAMES
+    try:
+        trend_regions = parse_regions(data['regions']) if data.get('regions') else None
+        trend_timeframes = parse_timeframes(data['timeframes']) if data.get('timeframes') else None
+        region_weights = data.get('region_weights') or None
+        if region_weights is not None:
+            if not isinstance(region_weights, dict):
+                raise ValueError('region_weights must map region codes to numbers')
+            region_weights = {parse_regions([region])[0]: float(weight) for region, weight in region_weights.items()}
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Clean output directory
-    clean_output_directory()
-    
-    # Start processing in a separate thread
-    thread = threading.Thread(
-        target=process_youtube_shorts,
-        args=(youtube_url, top_n, time_range)
-    )
-    thread.daemon = True
-    thread.start()
+    job = job_manager.submit({
+        'youtube_url': youtube_url,
+        'top_n': top_n,
+        'time_range': time_range,
+        'profile': profile,
+        'trend_backend': trend_backend,
+        'trend_max_requests': trend_max_requests,
+        'trend_time_budget': trend_time_budget,
+        'trend_regions': trend_regions,
+        'trend_timeframes': trend_timeframes,
+        'region_weights': region_weights
+    })
     
-    return jsonify({'message': 'Processing started successfully'})
+    return jsonify({'message': 'Processing started successfully', 'job_id': job.id})
+
+@app.route('/jobs')
+def list_jobs():
+    """List all known jobs, oldest first"""
+    return jsonify([job.to_dict() for job in job_manager.list_jobs()])
 
 @app.route('/status')
 def get_status():
-    """Get current processing status"""
-    return jsonify(processing_status)
+    """Get processing status of the most recent job"""
+    job = job_manager.latest()
+    if job is None:
+        return jsonify({'is_processing': False, 'current_step': '', 'progress': 0, 'message': '', 'error': None})
+    return jsonify(job.to_dict())
+
+@app.route('/status/<job_id>')
+def get_job_status(job_id):
+    """
+    Get processing status of a job. With ?since=<version> the request is held
+    (long-poll) until the status changes or ?timeout= seconds pass.
+    """
+    job = get_job_or_404(job_id)
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(job.to_dict())
+    timeout = min(request.args.get('timeout', LONG_POLL_MAX_WAIT, type=float), LONG_POLL_MAX_WAIT)
+    snapshot = job_manager.wait_for_change(job, since, timeout=timeout)
+    return jsonify(snapshot or job.to_dict())
+
+@app.route('/events/<job_id>')
+def job_events(job_id):
+    """Server-Sent Events stream that pushes a job's status whenever it changes"""
+    job = get_job_or_404(job_id)
+    
+    def stream():
+        snapshot = job.to_dict()
+        while True:
+            yield f"id: {snapshot['version']}\ndata: {json.dumps(snapshot)}\n\n"
+            if not snapshot['is_processing']:
+                return
+            version = snapshot['version']
+            snapshot = None
+            while snapshot is None:
+                snapshot = job_manager.wait_for_change(job, version, timeout=EVENTS_KEEPALIVE)
+                if snapshot is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/download')
 def download_results():
-    """Download the generated clips as a ZIP file"""
-    clips_dir = os.path.join(OUTPUT_FOLDER, "clips")
+    """Download the clips of the most recent job as a ZIP file"""
+    return download_job_results(get_latest_job_or_404().id)
+
+@app.route('/download/<job_id>')
+def download_job_results(job_id):
+    """Download the generated clips of a job as a ZIP file"""
+    job = get_job_or_404(job_id)
+    clips_dir = job.clips_dir
     
     if not os.path.exists(clips_dir):
         return jsonify({'error': 'No clips found. Please process a video first.'}), 404
     
     # Create a temporary ZIP file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    zip_filename = f"youtube_shorts_{timestamp}.zip"
+    zip_filename = f"youtube_shorts_{job.id}_{timestamp}.zip"
     zip_path = os.path.join(UPLOAD_FOLDER, zip_filename)
     
     with zipfile.ZipFile(zip_path, 'w') as zipf:
@@ -276,9 +230,15 @@ def download_results():
 
 @app.route('/results')
 def view_results():
-    """View the generated results"""
-    clips_dir = os.path.join(OUTPUT_FOLDER, "clips")
-    metadata_dir = os.path.join(OUTPUT_FOLDER, "metadata")
+    """View the results of the most recent job"""
+    return view_job_results(get_latest_job_or_404().id)
+
+@app.route('/results/<job_id>')
+def view_job_results(job_id):
+    """View the generated results of a job"""
+    job = get_job_or_404(job_id)
+    clips_dir = job.clips_dir
+    metadata_dir = job.metadata_dir
     
     clips = []
     if os.path.exists(clips_dir):
@@ -298,12 +258,12 @@ def view_results():
                     'path': os.path.join(metadata_dir, file)
                 })
     
-    return render_template('results.html', clips=clips, metadata_files=metadata_files)
+    return render_template('results.html', job_id=job.id, clips=clips, metadata_files=metadata_files)
 
-@app.route('/clip/<filename>')
-def serve_clip(filename):
-    """Serve a specific clip file from the output directory with HTTP Range support."""
-    clips_dir = os.path.join(OUTPUT_FOLDER, 'clips')
+@app.route('/clip/<job_id>/<filename>')
+def serve_clip(job_id, filename):
+    """Serve a specific clip file from a job workspace with HTTP Range support."""
+    clips_dir = get_job_or_404(job_id).clips_dir
     file_path = os.path.join(clips_dir, filename)
     if not os.path.isfile(file_path):
         abort(404)
@@ -315,9 +275,9 @@ def serve_clip(filename):
         conditional=True
     )
 
-@app.route('/metadata/<filename>')
-def serve_metadata(filename):
-    metadata_dir = os.path.join(OUTPUT_FOLDER, 'metadata')
+@app.route('/metadata/<job_id>/<filename>')
+def serve_metadata(job_id, filename):
+    metadata_dir = get_job_or_404(job_id).metadata_dir
     file_path = os.path.join(metadata_dir, filename)
     if not os.path.isfile(file_path):
         abort(404)
@@ -325,6 +285,59 @@ def serve_metadata(filename):
         data = json.load(f)
     return jsonify(data)
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-stage timing and resource metrics in Prometheus text format"""
+    job_states = {}
+    for job in job_manager.list_jobs():
+        job_states[job.state] = job_states.get(job.state, 0) + 1
+    extra_gauges = {
+        'ysg_jobs': ('Number of known jobs by state', {
+            (('state', state),): job_states.get(state, 0)
+            for state in ('queued', 'running', 'completed', 'failed')
+        })
+    }
+    if trend_cache is not None:
+        trend_stats = trend_cache.stats()
+        extra_gauges['ysg_trend_cache_hits'] = ('Trend score lookups served from the cache', {None: trend_stats['hits']})
+        extra_gauges['ysg_trend_cache_misses'] = ('Trend score lookups that had to query Google Trends', {None: trend_stats['misses']})
+        extra_gauges['ysg_trend_cache_entries'] = ('Keyword scores stored in the trend cache', {None: trend_stats['entries']})
+    return Response(REGISTRY.render_prometheus(extra_gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/<job_id>')
+def job_metrics(job_id):
+    """Per-stage metrics recorded for a single job"""
+    metrics_path = os.path.join(get_job_or_404(job_id).workspace, 'metrics.json')
+    if not os.path.isfile(metrics_path):
+        return jsonify({'error': 'No metrics recorded yet for this job.'}), 404
+    with open(metrics_path, 'r', encoding='utf-8') as f:
+        return jsonify(json.load(f))
+
+@app.route('/trace/<job_id>')
+def job_trace(job_id):
+    """Chrome trace-event timeline of a job's stages, ffmpeg calls and waits"""
+    workspace = get_job_or_404(job_id).workspace
+    if not os.path.isfile(os.path.join(workspace, 'trace.json')):
+        return jsonify({'error': 'No trace recorded yet for this job.'}), 404
+    return send_from_directory(workspace, 'trace.json', as_attachment=True,
+                               download_name=f'trace_{job_id}.json')
+
+@app.route('/profiles/<job_id>')
+def list_profiles(job_id):
+    """List the stage profiles written for a job"""
+    profiles_dir = os.path.join(get_job_or_404(job_id).workspace, 'profiles')
+    if not os.path.isdir(profiles_dir):
+        return jsonify([])
+    return jsonify(sorted(os.listdir(profiles_dir)))
+
+@app.route('/profiles/<job_id>/<filename>')
+def serve_profile(job_id, filename):
+    """Download a collapsed-stack (.folded) or cProfile (.prof) file for a job"""
+    profiles_dir = os.path.join(get_job_or_404(job_id).workspace, 'profiles')
+    if not os.path.isfile(os.path.join(profiles_dir, filename)):
+        abort(404)
+    return send_from_directory(profiles_dir, filename, as_attachment=True)
+
 @app.route('/demo')
 def demo():
     """Demo page showing the interface without requiring Ollama"""
@@ -0,0 +1,174 @@
+"""
+Job manager for the web interface.
+
+Each submitted video becomes a Job with its own ID and workspace directory
+under the output folder. Jobs run on a bounded thread pool so several videos
+can be processed at once without sharing intermediate files.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+class Job:
+    """State for a single processing request"""
+
+    def __init__(self, job_id, workspace, params):
+        self.id = job_id
+        self.workspace = workspace
+        self.params = params
+        self.state = 'queued'
+        self.current_step = 'Waiting for a free worker...'
+        self.progress = 0
+        self.message = ''
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Incremented on every visible change so listeners can wait for updates
+        self.version = 0
+
+    @property
+    def is_processing(self):
+        return self.state in ('queued', 'running')
+
+    @property
+    def clips_dir(self):
+        return os.path.join(self.workspace, 'clips')
+
+    @property
+    def metadata_dir(self):
+        return os.path.join(self.workspace, 'metadata')
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'version': self.version,
+            'state': self.state,
+            'is_processing': self.is_processing,
+            'current_step': self.current_step,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'params': self.params,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class JobManager:
+    """
+    Runs jobs concurrently, each in an isolated workspace.
+
+    Args:
+        root (str): Directory under which per-job workspaces are created
+        runner (callable): Called as runner(job, on_progress) to do the work
+        max_workers (int): Number of jobs allowed to run at the same time
+        max_retained_jobs (int): Finished jobs kept on disk before the oldest are removed
+        warm_up (callable, optional): Run once on the pool at startup to preload
+            what jobs need, so the first job does not pay for it
+    """
+
+    def __init__(self, root, runner, max_workers=2, max_retained_jobs=50, warm_up=None):
+        self.root = root
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_retained_jobs = max_retained_jobs
+        self._jobs = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        os.makedirs(root, exist_ok=True)
+        if warm_up:
+            self._executor.submit(self._warm_up, warm_up)
+
+    def submit(self, params):
+        """Create a job with its own workspace and queue it for execution"""
+        job_id = uuid.uuid4().hex[:12]
+        workspace = os.path.join(self.root, job_id)
+        os.makedirs(workspace)
+        job = Job(job_id, workspace, params)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._order.append(job_id)
+        self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self):
+        """Return the most recently submitted job, if any"""
+        with self._lock:
+            if not self._order:
+                return None
+            return self._jobs[self._order[-1]]
+
+    def list_jobs(self):
+        with self._lock:
+            return [self._jobs[job_id] for job_id in self._order]
+
+    def update(self, job, **fields):
+        """Apply field changes and wake listeners if anything actually changed"""
+        with self._lock:
+            changed = False
+            for key, value in fields.items():
+                if getattr(job, key) != value:
+                    setattr(job, key, value)
+                    changed = True
+            if changed:
+                job.version += 1
+                self._changed.notify_all()
+
+    def wait_for_change(self, job, since_version, timeout=None):
+        """
+        Block until job.version differs from since_version or timeout expires.
+
+        Returns:
+            dict: Snapshot of the job, or None if nothing changed before the timeout
+        """
+        with self._lock:
+            changed = self._changed.wait_for(lambda: job.version != since_version, timeout=timeout)
+            return job.to_dict() if changed else None
+
+    def _warm_up(self, warm_up):
+        started = time.perf_counter()
+        try:
+            warm_up()
+            print(f"Workers warmed up in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            print(f"Worker warm-up failed: {str(e)}")
+
+    def _run(self, job):
+        self.update(job, state='running', started_at=time.time(), current_step='Starting...')
+
+        def on_progress(step, progress):
+            self.update(job, current_step=step, progress=progress)
+
+        try:
+            self.runner(job, on_progress)
+            final = {
+                'state': 'completed', 'progress': 100,
+                'message': 'YouTube shorts generation completed successfully!'
+            }
+        except Exception as e:
+            final = {'state': 'failed', 'error': str(e), 'message': f'Error: {str(e)}'}
+        # Publish the terminal state in one update so listeners see it atomically
+        self.update(job, finished_at=time.time(), **final)
+
+    def _prune(self):
+        """Remove the workspaces of the oldest finished jobs beyond the retention limit"""
+        with self._lock:
+            finished = [job_id for job_id in self._order if not self._jobs[job_id].is_processing]
+            excess = len(finished) - self.max_retained_jobs
+            removed = finished[:excess] if excess > 0 else []
+            for job_id in removed:
+                self._order.remove(job_id)
+                job = self._jobs.pop(job_id)
+                shutil.rmtree(job.workspace, ignore_errors=True)